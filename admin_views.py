@@ -1,9 +1,6 @@
 from flask import Blueprint, render_template, jsonify, current_app, request, redirect, url_for, flash
 from forms import AdminUserCreateForm, AdminUserEditForm
 from datetime import datetime, date
-import json
-import sqlite3
-from tinydb import TinyDB
 import redis
 # Importações do sistema
 # import os
@@ -17,6 +14,12 @@ def is_admin(user):
         return False
     return user.get('role') == 'admin'
 
+# Função auxiliar para ler o filtro ?types=A,B das rotas do Event Store
+def _event_types_arg():
+    types = request.args.get('types', '')
+    event_types = [t.strip() for t in types.split(',') if t.strip()]
+    return event_types or None
+
 @admin_bp.route('/')
 def admin_home():
     """Página inicial da administração"""
@@ -48,22 +51,19 @@ def view_event_store():
         flash('Você não tem permissão para acessar esta página.', 'danger')
         return redirect(url_for('dashboard'))
     """Visualiza os eventos no Event Store"""
+    before = request.args.get('before', type=int)
+    limit = max(1, min(request.args.get('limit', 100, type=int), 500))
+    event_types = _event_types_arg()
     try:
-        conn = sqlite3.connect('events.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM events ORDER BY timestamp DESC LIMIT 100")
-        events = []
-        for row in cursor.fetchall():
-            event = dict(row)
-            event['data'] = json.loads(event['data'])
-            events.append(event)
-        conn.close()
+        event_store = current_app.config.get('EVENT_STORE')
+        events, next_position = event_store.read_all_backwards(before, limit, event_types)
     except Exception as e:
-        events = []
+        events, next_position = [], None
         print(f"Erro ao acessar o Event Store: {e}")
 
-    return render_template('admin/event_store.html', events=events)
+    return render_template('admin/event_store.html', events=events,
+                           next_position=next_position, limit=limit,
+                           event_types=','.join(event_types or []))
 
 @admin_bp.route('/read-model')
 def view_read_model():
@@ -80,9 +80,9 @@ def view_read_model():
         return redirect(url_for('dashboard'))
     """Visualiza os dados no Read Model"""
     try:
-        db = TinyDB('readmodel.json')
-        users = db.table('users').all()
-        items = db.table('items').all()
+        read_model = current_app.config.get('READ_MODEL')
+        users = read_model.get_users()
+        items = read_model.get_items()
     except Exception as e:
         users = []
         items = []
@@ -393,35 +393,79 @@ def admin_delete_user(user_id):
 
 @admin_bp.route('/api/events')
 def api_events():
-    """API para obter eventos em formato JSON"""
+    """API para obter eventos em formato JSON
+
+    Sem parâmetros retorna, como antes da paginação, a lista dos eventos mais
+    recentes (o cursor da próxima página vai no cabeçalho X-Next-Position).
+    ?before=<position> pagina para trás e ?after=<position> lê o log em ordem
+    crescente (catch-up); com eles a resposta é {events, next_position, direction}.
+    """
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    limit = max(1, min(request.args.get('limit', 100, type=int), 500))
+    event_types = _event_types_arg()
     try:
-        conn = sqlite3.connect('events.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM events ORDER BY timestamp DESC LIMIT 100")
-        events = []
-        for row in cursor.fetchall():
-            event = dict(row)
-            event['data'] = json.loads(event['data'])
-            events.append(event)
-        conn.close()
+        event_store = current_app.config.get('EVENT_STORE')
+        if after is not None:
+            events, next_position = event_store.read_all(after, limit, event_types)
+        else:
+            events, next_position = event_store.read_all_backwards(before, limit, event_types)
     except Exception as e:
-        events = []
+        events, next_position = [], None
         print(f"Erro ao acessar o Event Store: {e}")
 
-    return jsonify(events)
+    if after is None and before is None:
+        # Clientes existentes esperam uma lista simples
+        response = jsonify(events)
+        if next_position is not None:
+            response.headers['X-Next-Position'] = str(next_position)
+        return response
+
+    return jsonify({
+        'events': events,
+        'next_position': next_position,
+        'direction': 'forward' if after is not None else 'backward'
+    })
 
 @admin_bp.route('/api/read-model')
 def api_read_model():
     """API para obter dados do Read Model em formato JSON"""
     try:
-        db = TinyDB('readmodel.json')
+        read_model = current_app.config.get('READ_MODEL')
         data = {
-            'users': db.table('users').all(),
-            'items': db.table('items').all()
+            'users': read_model.get_users(),
+            'items': read_model.get_items()
         }
     except Exception as e:
         data = {'users': [], 'items': []}
         print(f"Erro ao acessar o Read Model: {e}")
 
     return jsonify(data)
+
+@admin_bp.route('/api/outbox')
+def api_outbox():
+    """API com o atraso do outbox: eventos pendentes, idade do mais antigo e contadores do relay"""
+    outbox_relay = current_app.config.get('OUTBOX_RELAY')
+    if outbox_relay is None:
+        return jsonify({'enabled': False})
+    try:
+        stats = outbox_relay.get_stats()
+    except Exception as e:
+        stats = {}
+        print(f"Erro ao acessar o outbox: {e}")
+
+    return jsonify(dict(stats, enabled=True))
+
+@admin_bp.route('/api/compaction')
+def api_compaction():
+    """API com os totais da compactação de agregados excluídos e o espaço recuperado"""
+    compactor = current_app.config.get('COMPACTOR')
+    if compactor is None:
+        return jsonify({'enabled': False})
+    try:
+        stats = compactor.get_stats()
+    except Exception as e:
+        stats = {}
+        print(f"Erro ao acessar a compactação: {e}")
+
+    return jsonify(dict(stats, enabled=True))
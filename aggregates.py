@@ -0,0 +1,167 @@
+import json
+import queue
+import threading
+from collections import OrderedDict
+
+def apply_event(state, event):
+    """Aplica um evento ao estado de um agregado (usuário ou item) e retorna o novo estado"""
+    event_type = event['event_type']
+    data = event['data']
+    # Eventos recém-gravados ou vindos do barramento trazem data serializado
+    if isinstance(data, str):
+        data = json.loads(data)
+
+    if event_type.endswith('_CREATED'):
+        state = dict(data)
+        state['id'] = event['aggregate_id']
+    elif event_type.endswith('_UPDATED') or event_type == 'USER_PASSWORD_CHANGED':
+        # Atualizações são parciais, assim como no Read Model
+        state = dict(state or {})
+        state.update(data)
+        state['id'] = event['aggregate_id']
+    elif event_type.endswith('_DELETED'):
+        state = None
+
+    return state
+
+class AggregateLoader:
+    """Reconstrói agregados a partir do snapshot mais recente mais os eventos posteriores
+
+    Mantém um cache LRU de aggregate_id -> (versão, estado) limitado a
+    cache_size entradas; o cache avança com cada evento passado a record().
+    """
+
+    def __init__(self, event_store, snapshot_every=50, cache_size=1000):
+        self.event_store = event_store
+        self.snapshot_every = snapshot_every
+        self.queue = queue.Queue()
+        self.running = False
+        self.thread = None
+
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Agregados sendo lidos do store; True se um evento chegou durante a leitura
+        self._loading = {}
+
+    def load(self, aggregate_id):
+        """Retorna (versão, estado) de um agregado; versão 0 se ele não existir"""
+        with self.cache_lock:
+            entry = self.cache.get(aggregate_id)
+            if entry is not None:
+                self.cache.move_to_end(aggregate_id)
+                self.hits += 1
+                version, state = entry
+                return version, dict(state) if state is not None else None
+            self.misses += 1
+            self._loading[aggregate_id] = False
+
+        version, state = self._load_from_store(aggregate_id)
+
+        with self.cache_lock:
+            # Se um evento chegou durante a leitura o resultado pode estar desatualizado
+            stale = self._loading.pop(aggregate_id, True)
+            if version and not stale and self.cache_size:
+                self.cache[aggregate_id] = (version, state)
+                self.cache.move_to_end(aggregate_id)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        return version, dict(state) if state is not None else None
+
+    def record(self, event):
+        """Avança (ou invalida) o agregado em cache com um evento gravado ou recebido do barramento"""
+        aggregate_id = event['aggregate_id']
+        with self.cache_lock:
+            if aggregate_id in self._loading:
+                self._loading[aggregate_id] = True
+
+            entry = self.cache.get(aggregate_id)
+            if entry is None:
+                return
+            version, state = entry
+            event_version = event.get('version')
+
+            if event_version is not None and event_version <= version:
+                # Evento já aplicado (ex.: nosso próprio append ecoado pelo barramento)
+                return
+            if event_version == version + 1:
+                self.cache[aggregate_id] = (event_version, apply_event(state, event))
+            else:
+                # Lacuna de versões: recarregar do store na próxima leitura
+                del self.cache[aggregate_id]
+
+    def get_stats(self):
+        """Retorna estatísticas do cache de agregados"""
+        with self.cache_lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.cache),
+                'max_size': self.cache_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+    def _load_from_store(self, aggregate_id):
+        """Lê o agregado do Event Store: snapshot mais recente mais eventos posteriores"""
+        version = 0
+        state = None
+
+        # Backends sem suporte a snapshots (ex.: LogEventStore) sempre fazem replay completo
+        get_snapshot = getattr(self.event_store, 'get_snapshot', None)
+        snapshot = get_snapshot(aggregate_id) if get_snapshot else None
+        if snapshot:
+            version = snapshot['version']
+            state = snapshot['state']
+
+        for event in self.event_store.iter_events(aggregate_id, from_version=version + 1):
+            state = apply_event(state, event)
+            version = event['version']
+
+        return version, state
+
+    def maybe_snapshot(self, event):
+        """Agenda um snapshot quando o agregado atinge um múltiplo de snapshot_every eventos
+
+        Registrado como handler de append do Event Store, e não do barramento,
+        para que apenas o processo que gravou o evento grave o snapshot.
+        """
+        if self.snapshot_every and event.get('version', 0) % self.snapshot_every == 0:
+            self.queue.put(event['aggregate_id'])
+
+    def snapshot(self, aggregate_id):
+        """Grava imediatamente o snapshot do estado atual de um agregado"""
+        if not hasattr(self.event_store, 'save_snapshot'):
+            return
+        version, state = self._load_from_store(aggregate_id)
+        if version:
+            self.event_store.save_snapshot(aggregate_id, version, state)
+
+    def start(self):
+        """Inicia a thread que grava os snapshots em segundo plano"""
+        self.running = True
+
+        def worker():
+            # Processa os snapshots pendentes até receber o sinal de parada (None)
+            while True:
+                aggregate_id = self.queue.get()
+                if aggregate_id is None:
+                    break
+                try:
+                    self.snapshot(aggregate_id)
+                except Exception as e:
+                    print(f"Erro ao gravar snapshot de {aggregate_id}: {e}")
+
+        self.thread = threading.Thread(target=worker)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Para a thread de snapshots"""
+        self.running = False
+        self.queue.put(None)
+        if self.thread:
+            self.thread.join(timeout=1.0)
@@ -17,6 +17,7 @@ load_dotenv()
 
 # Importar componentes de Event Sourcing
 from event_sourcing_config import setup_event_sourcing
+from event_store import ConcurrencyError
 from user_service import UserService
 from item_service import ItemService
 from admin_views import admin_bp
@@ -36,18 +37,31 @@ app.config['GOOGLE_OAUTH_CLIENT_ID'] = os.environ.get('GOOGLE_OAUTH_CLIENT_ID',
 app.config['GOOGLE_OAUTH_CLIENT_SECRET'] = os.environ.get('GOOGLE_OAUTH_CLIENT_SECRET', '')
 
 # Configurar Event Sourcing
-es_components = setup_event_sourcing()
+# Backends configuráveis: EVENT_STORE_BACKEND=sqlite|sharded|log|memory, READ_MODEL_BACKEND=sqlite|tinydb|memory
+es_components = setup_event_sourcing(
+    event_store_backend=os.environ.get('EVENT_STORE_BACKEND', 'sqlite'),
+    read_model_backend=os.environ.get('READ_MODEL_BACKEND', 'sqlite'),
+    event_store_shards=int(os.environ.get('EVENT_STORE_SHARDS', 4)),
+    # Dias após a exclusão para compactar o histórico de um agregado; 0 (padrão) desativa
+    compact_after_days=int(os.environ.get('COMPACT_DELETED_AFTER_DAYS', 0)) or None
+)
 event_store = es_components['event_store']
 read_model = es_components['read_model']
 event_bus = es_components['event_bus']
+# Com outbox, os serviços publicam pelo relay: a requisição termina logo após o commit
+publisher = es_components['publisher']
 
-# Armazenar o Event Bus na configuração da aplicação para acesso pelo painel de administração
+# Armazenar o Event Bus e o Event Store na configuração da aplicação para acesso pelo painel de administração
 app.config['EVENT_BUS'] = event_bus
+app.config['EVENT_STORE'] = event_store
+app.config['READ_MODEL'] = read_model
+app.config['OUTBOX_RELAY'] = es_components['outbox_relay']
+app.config['COMPACTOR'] = es_components['compactor']
 
 # Inicializar serviços
-user_service = UserService(event_store, event_bus, read_model)
-item_service = ItemService(event_store, event_bus, read_model)
-auth_service = AuthService(event_store, event_bus, read_model)
+user_service = UserService(event_store, publisher, read_model)
+item_service = ItemService(event_store, publisher, read_model)
+auth_service = AuthService(event_store, publisher, read_model)
 
 # Armazenar o Auth Service na configuração da aplicação
 app.config['AUTH_SERVICE'] = auth_service
@@ -335,7 +349,7 @@ def get_current_user():
                 )
 
                 # Publicar evento
-                event_bus.publish(event)
+                publisher.publish(event)
 
                 # Obter usuário atualizado
                 user = read_model.get_user(user_id)
@@ -467,7 +481,7 @@ def google_logged_in(blueprint, token):
         )
 
         # Publicar evento
-        event_bus.publish(event)
+        publisher.publish(event)
 
     # Salvar ID do usuário na sessão
     session.permanent = True
@@ -849,8 +863,18 @@ def api_create_item():
         'user_id': user.get('id')
     }
 
+    # Retentativas com o mesmo cabeçalho Idempotency-Key retornam o item já criado.
+    # A chave é prefixada pelo usuário para que clientes diferentes não colidam.
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key:
+        idempotency_key = f"{user.get('id')}:{idempotency_key}"
+
     # Criar item usando o serviço
-    item_id = item_service.create_item(item_data)
+    try:
+        item_id = item_service.create_item(item_data, idempotency_key=idempotency_key)
+    except ConcurrencyError:
+        # O id derivado da chave já existe: a chave expirou e foi reutilizada
+        return jsonify({'error': 'Idempotency-Key already used'}), 409
 
     return jsonify({'id': item_id, 'message': 'Item created successfully'}), 201
 
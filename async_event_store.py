@@ -0,0 +1,82 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from event_store import EventStore
+
+class AsyncEventStore:
+    """Interface asyncio para um Event Store síncrono
+
+    As chamadas bloqueantes ao banco rodam fora do event loop: as escritas
+    em uma única thread dedicada, que as enfileira e executa em ordem, e as
+    leituras em um pequeno pool de threads (cada uma com sua conexão
+    persistente). Assim muitas corrotinas podem gravar e ler ao mesmo
+    tempo sem bloquear o loop. Com group commit no Event Store as escritas
+    usam tantas threads quanto as leituras, para que cheguem juntas ao
+    lote da thread de escrita do próprio Event Store.
+    """
+
+    def __init__(self, event_store=None, read_workers=4):
+        self.event_store = event_store if event_store is not None else EventStore()
+        write_workers = read_workers if getattr(self.event_store, 'group_commit', False) else 1
+        self._writer = ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix='event-store-writer')
+        self._readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix='event-store-reader')
+
+    async def _run(self, executor, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, *args)
+
+    async def save_event(self, aggregate_id, event_type, data, expected_version=None,
+                         idempotency_key=None):
+        """Salva um novo evento"""
+        return await self._run(self._writer, self.event_store.save_event,
+                               aggregate_id, event_type, data, expected_version, idempotency_key)
+
+    async def save_events(self, events):
+        """Salva vários eventos (aggregate_id, event_type, data) em uma única transação"""
+        return await self._run(self._writer, self.event_store.save_events, list(events))
+
+    async def get_events(self, aggregate_id=None):
+        """Obtém eventos, opcionalmente filtrados por aggregate_id"""
+        return await self._run(self._readers, self.event_store.get_events, aggregate_id)
+
+    async def read_all(self, after_position=None, limit=100, event_types=None):
+        """Lê uma página do log global em ordem crescente: (eventos, next_position)"""
+        return await self._run(self._readers, self.event_store.read_all,
+                               after_position, limit, event_types)
+
+    async def get_snapshot(self, aggregate_id):
+        """Obtém o snapshot mais recente de um agregado, ou None"""
+        return await self._run(self._readers, self.event_store.get_snapshot, aggregate_id)
+
+    def _read_batch(self, aggregate_id, from_position, from_version, batch_size):
+        # O gerador é criado e descartado na mesma thread que usa o cursor
+        events = self.event_store.iter_events(aggregate_id, from_position=from_position,
+                                              from_version=from_version)
+        try:
+            return list(islice(events, batch_size))
+        finally:
+            events.close()
+
+    async def iter_events(self, aggregate_id=None, from_position=None, from_version=None,
+                          batch_size=500):
+        """Itera de forma assíncrona sobre os eventos, lendo lotes de batch_size no pool"""
+        while True:
+            batch = await self._run(self._readers, self._read_batch,
+                                    aggregate_id, from_position, from_version, batch_size)
+            for event in batch:
+                yield event
+            if len(batch) < batch_size:
+                return
+            # Continuar a partir do evento seguinte ao último lido
+            last = batch[-1]
+            if aggregate_id:
+                from_version = last['version'] + 1
+            else:
+                from_position = last['position'] + 1
+
+    async def close(self):
+        """Aguarda as operações pendentes e fecha o Event Store"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._writer.shutdown)
+        await loop.run_in_executor(None, self._readers.shutdown)
+        self.event_store.close()
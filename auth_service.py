@@ -332,23 +332,17 @@ class AuthService:
         return True, None
 
     def _find_user_by_username(self, username):
-        """Encontra um usuário pelo nome de usuário"""
-        users = self.read_model.get_users()
-        print(f"_find_user_by_username: Procurando usuário com username '{username}' entre {len(users)} usuários")
-        for user in users:
-            if user.get('username') == username:
-                print(f"_find_user_by_username: Usuário encontrado: {user}")
-                return user
-        print(f"_find_user_by_username: Usuário não encontrado")
-        return None
+        """Encontra um usuário pelo nome de usuário (índice do Read Model)"""
+        user = self.read_model.get_user_by_username(username)
+        if user:
+            print(f"_find_user_by_username: Usuário encontrado: {user.get('id')}")
+        else:
+            print(f"_find_user_by_username: Usuário '{username}' não encontrado")
+        return user
 
     def _find_user_by_email(self, email):
-        """Encontra um usuário pelo email"""
-        users = self.read_model.get_users()
-        for user in users:
-            if user.get('email') == email:
-                return user
-        return None
+        """Encontra um usuário pelo email (índice do Read Model)"""
+        return self.read_model.get_user_by_email(email)
 
     def update_user(self, user_id, user_data):
         """Atualiza um usuário existente"""
@@ -0,0 +1,67 @@
+"""Benchmark do AsyncEventStore: appends concorrentes de várias corrotinas e latência do event loop.
+
+Uso:
+    python benchmarks/bench_async_store.py [numero_de_eventos] [corrotinas]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_event_store import AsyncEventStore
+from event_store import EventStore
+
+
+async def heartbeat(stop, lags):
+    # Mede quanto o event loop atrasa para acordar uma corrotina a cada 1ms
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def bench(label, store, count, concurrency):
+    payload = {'title': 'Item de benchmark', 'description': 'x' * 200}
+    stop = asyncio.Event()
+    lags = []
+    monitor = asyncio.create_task(heartbeat(stop, lags))
+
+    async def worker(n):
+        for i in range(n, count, concurrency):
+            await store.save_event(f'aggregate-{i % 100}', 'ITEM_UPDATED', payload)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(n) for n in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    replayed = 0
+    async for _ in store.iter_events():
+        replayed += 1
+    replay_elapsed = time.perf_counter() - start
+
+    stop.set()
+    await monitor
+    print(f"{label:<30} {count / elapsed:>10.0f} appends/s {replayed / replay_elapsed:>12.0f} eventos/s no replay  "
+          f"atraso máximo do loop {max(lags) * 1000:7.2f}ms")
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AsyncEventStore(EventStore(os.path.join(tmp, 'events.db')))
+        await bench('AsyncEventStore', store, count, concurrency)
+        await store.close()
+
+        store = AsyncEventStore(EventStore(os.path.join(tmp, 'events_gc.db'), group_commit=True), read_workers=16)
+        await bench('AsyncEventStore (group commit)', store, count, concurrency)
+        await store.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""Benchmark dos backends em memória contra os backends em disco (Event Store e Read Model).
+
+Uso:
+    python benchmarks/bench_backends.py [numero_de_eventos]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_store import EventStore
+from memory_event_store import InMemoryEventStore
+from read_model import ReadModel, InMemoryReadModel
+from sqlite_read_model import SQLiteReadModel
+
+
+def bench_event_store(label, store, count):
+    payload = {'title': 'Item de benchmark', 'description': 'x' * 200}
+
+    start = time.perf_counter()
+    for i in range(count):
+        store.save_event(f'aggregate-{i % 100}', 'ITEM_UPDATED', payload)
+    append_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    replayed = sum(1 for _ in store.iter_events())
+    replay_elapsed = time.perf_counter() - start
+
+    print(f"{label:<26} {count / append_elapsed:>10.0f} appends/s {replayed / replay_elapsed:>12.0f} eventos/s no replay")
+
+
+def bench_read_model(label, read_model, count):
+    start = time.perf_counter()
+    for i in range(count):
+        read_model.save_item({'id': f'item-{i}', 'title': 'Item', 'user_id': f'user-{i % 10}'})
+    elapsed = time.perf_counter() - start
+    print(f"{label:<26} {count / elapsed:>10.0f} save_item/s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EventStore(os.path.join(tmp, 'events.db'))
+        bench_event_store('Event Store SQLite', store, count)
+        store.close()
+        bench_event_store('Event Store em memória', InMemoryEventStore(), count)
+
+        # save_item do TinyDB é O(n) por chamada; usar menos itens
+        items = min(count, 500)
+        bench_read_model('Read Model TinyDB (JSON)', ReadModel(os.path.join(tmp, 'readmodel.json')), items)
+        bench_read_model('Read Model em memória', InMemoryReadModel(), items)
+        bench_read_model('Read Model SQLite', SQLiteReadModel(os.path.join(tmp, 'readmodel.db')), count)
+
+
+if __name__ == '__main__':
+    main()
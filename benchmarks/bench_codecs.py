@@ -0,0 +1,64 @@
+"""Benchmark dos codecs do Event Store: tamanho em disco e throughput de decodificação.
+
+Uso:
+    python benchmarks/bench_codecs.py [numero_de_eventos]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_codecs import msgpack
+from event_store import EventStore
+
+
+def sample_payload(i):
+    """Payload no formato de um ITEM_DELETED, que embute o item excluído"""
+    return {
+        'deleted_item': {
+            'id': f'item-{i}',
+            'title': f'Item {i}',
+            'description': 'Descrição detalhada do item ' * 20,
+            'user_id': f'user-{i % 100}',
+            'created_at': '2024-01-01T12:00:00',
+            'updated_at': '2024-01-02T12:00:00'
+        },
+        'deleted_at': '2024-01-03T12:00:00',
+        'deletion_type': 'user_requested'
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    configs = [('json', None), ('json', 256)]
+    if msgpack is not None:
+        configs += [('msgpack', None), ('msgpack', 256)]
+    else:
+        print("msgpack não instalado: apenas codecs JSON serão medidos")
+
+    print(f"{'codec':<16} {'tamanho do banco':>17} {'decodificação':>20}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec, threshold in configs:
+            label = codec + ('+zlib' if threshold else '')
+            path = os.path.join(tmp, f'{label}.db')
+            store = EventStore(path, codec=codec, compress_threshold=threshold)
+            for offset in range(0, count, 1000):
+                store.save_events([
+                    (f'item-{i}', 'ITEM_DELETED', sample_payload(i))
+                    for i in range(offset, min(offset + 1000, count))
+                ])
+            store._get_connection().execute("VACUUM")
+
+            start = time.perf_counter()
+            decoded = sum(1 for _ in store.iter_events())
+            elapsed = time.perf_counter() - start
+            store.close()
+
+            size = os.path.getsize(path) / 1024 / 1024
+            print(f"{label:<16} {size:>14.2f} MiB {decoded / elapsed:>13.0f} eventos/s")
+
+
+if __name__ == '__main__':
+    main()
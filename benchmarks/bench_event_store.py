@@ -0,0 +1,103 @@
+"""Benchmark de escrita do Event Store: appends/s por estratégia de gravação.
+
+Uso:
+    python benchmarks/bench_event_store.py [numero_de_eventos]
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_store import EventStore
+
+
+def legacy_save_event(db_path, aggregate_id, event_type, data):
+    """Reproduz o save_event original: uma conexão nova por chamada"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT MAX(version) FROM events WHERE aggregate_id = ?",
+        (aggregate_id,)
+    )
+    version = (cursor.fetchone()[0] or 0) + 1
+    cursor.execute(
+        "INSERT INTO events (id, aggregate_id, event_type, data, timestamp, version) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (str(uuid.uuid4()), aggregate_id, event_type, json.dumps(data),
+         datetime.utcnow().isoformat(), version)
+    )
+    conn.commit()
+    conn.close()
+
+
+def run(label, append, count):
+    payload = {'title': 'Item de benchmark', 'description': 'x' * 200}
+    start = time.perf_counter()
+    for i in range(count):
+        append(f'aggregate-{i % 100}', 'ITEM_UPDATED', payload)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {count:>7} eventos em {elapsed:7.3f}s  ->  {count / elapsed:10.0f} appends/s")
+
+
+def run_threaded(label, append, count, threads=8):
+    payload = {'title': 'Item de benchmark', 'description': 'x' * 200}
+    per_thread = count // threads
+
+    def writer(n):
+        for i in range(per_thread):
+            append(f'aggregate-{n}-{i % 10}', 'ITEM_UPDATED', payload)
+
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    total = per_thread * threads
+    print(f"{label:<28} {total:>7} eventos em {elapsed:7.3f}s  ->  {total / elapsed:10.0f} appends/s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        EventStore(legacy_path).close()
+        run('conexão por chamada (antes)',
+            lambda *args: legacy_save_event(legacy_path, *args), count)
+
+        store = EventStore(os.path.join(tmp, 'persistent.db'))
+        run('conexão persistente (depois)', store.save_event, count)
+        store.close()
+
+        store = EventStore(os.path.join(tmp, 'batch.db'))
+        payload = {'title': 'Item de benchmark', 'description': 'x' * 200}
+        start = time.perf_counter()
+        for offset in range(0, count, 100):
+            store.save_events([
+                (f'aggregate-{i % 100}', 'ITEM_UPDATED', payload)
+                for i in range(offset, min(offset + 100, count))
+            ])
+        elapsed = time.perf_counter() - start
+        print(f"{'save_events em lotes de 100':<28} {count:>7} eventos em {elapsed:7.3f}s  ->  {count / elapsed:10.0f} appends/s")
+        store.close()
+
+        store = EventStore(os.path.join(tmp, 'threaded.db'))
+        run_threaded('8 threads, commit por evento', store.save_event, count)
+        store.close()
+
+        store = EventStore(os.path.join(tmp, 'group.db'), group_commit=True)
+        run_threaded('8 threads, group commit', store.save_event, count)
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Benchmark do LogEventStore contra o EventStore SQLite: appends/s e replay sequencial.
+
+Uso:
+    python benchmarks/bench_log_store.py [numero_de_eventos]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_store import EventStore
+from log_event_store import LogEventStore
+
+
+def bench(label, store, count):
+    payload = {'title': 'Item de benchmark', 'description': 'x' * 200}
+
+    start = time.perf_counter()
+    for i in range(count):
+        store.save_event(f'aggregate-{i % 100}', 'ITEM_UPDATED', payload)
+    append_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    replayed = sum(1 for _ in store.iter_events())
+    replay_elapsed = time.perf_counter() - start
+
+    print(f"{label:<26} {count / append_elapsed:>10.0f} appends/s {replayed / replay_elapsed:>12.0f} eventos/s no replay")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EventStore(os.path.join(tmp, 'events.db'))
+        bench('SQLite (EventStore)', store, count)
+        store.close()
+
+        store = LogEventStore(os.path.join(tmp, 'log_fsync'), fsync=True)
+        bench('Log append-only (fsync)', store, count)
+        store.close()
+
+        store = LogEventStore(os.path.join(tmp, 'log_nofsync'), fsync=False)
+        bench('Log append-only (sem fsync)', store, count)
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
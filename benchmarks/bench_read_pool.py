@@ -0,0 +1,79 @@
+"""Benchmark da latência de escrita com leituras longas em paralelo (pool de leitura + WAL).
+
+Mede a latência de save_event sozinho e enquanto outras threads paginam
+todo o histórico (como o painel de administração) e fazem replays completos.
+
+Uso:
+    python benchmarks/bench_read_pool.py [eventos_no_historico] [escritas]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_store import EventStore
+
+
+def measure_writes(store, writes, label):
+    latencies = []
+    for i in range(writes):
+        start = time.perf_counter()
+        store.save_event(f'writer-{i % 10}', 'ITEM_UPDATED', {'i': i})
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<40} p50 {statistics.median(latencies) * 1000:7.2f}ms  "
+          f"p99 {p99 * 1000:7.2f}ms  máx {latencies[-1] * 1000:7.2f}ms")
+
+
+def main():
+    history = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    writes = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    payload = {'title': 'Item de benchmark', 'description': 'x' * 200}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EventStore(os.path.join(tmp, 'events.db'))
+        for offset in range(0, history, 5000):
+            store.save_events([
+                (f'aggregate-{i % 1000}', 'ITEM_UPDATED', payload)
+                for i in range(offset, min(offset + 5000, history))
+            ])
+
+        measure_writes(store, writes, 'Escritas sem leitores')
+
+        stop = threading.Event()
+        pages = [0]
+
+        def admin_pager():
+            while not stop.is_set():
+                before = None
+                while not stop.is_set():
+                    _, before = store.read_all_backwards(before_position=before, limit=100)
+                    pages[0] += 1
+                    if before is None:
+                        break
+
+        def replayer():
+            while not stop.is_set():
+                for _ in store.iter_events():
+                    if stop.is_set():
+                        break
+
+        readers = [threading.Thread(target=admin_pager) for _ in range(2)]
+        readers += [threading.Thread(target=replayer) for _ in range(2)]
+        for thread in readers:
+            thread.start()
+        measure_writes(store, writes, 'Escritas com 2 paginadores + 2 replays')
+        stop.set()
+        for thread in readers:
+            thread.join()
+        print(f"Páginas lidas pelos paginadores durante as escritas: {pages[0]}")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Benchmark de reidratação de agregados: replay completo x snapshot + eventos posteriores.
+
+Uso:
+    python benchmarks/bench_rehydration.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregates import AggregateLoader, apply_event
+from event_store import EventStore
+
+
+def full_replay(store, aggregate_id):
+    state = None
+    for event in store.iter_events(aggregate_id):
+        state = apply_event(state, event)
+    return state
+
+
+def timed(load, aggregate_id, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        load(aggregate_id)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EventStore(os.path.join(tmp, 'events.db'))
+        loader = AggregateLoader(store, snapshot_every=50)
+
+        print(f"{'histórico':>10} {'replay completo':>18} {'com snapshot':>15}")
+        for history in (10, 100, 1000, 10000):
+            aggregate_id = f'user-{history}'
+            events = (
+                [(aggregate_id, 'USER_CREATED', {'username': aggregate_id, 'role': 'admin'})] +
+                [(aggregate_id, 'USER_UPDATED', {'name': f'Admin {i}', 'bio': 'x' * 200})
+                 for i in range(history - 1)]
+            )
+            # Simula a política: snapshot no último múltiplo de snapshot_every
+            snapshot_at = history - history % loader.snapshot_every
+            store.save_events(events[:snapshot_at])
+            if snapshot_at:
+                loader.snapshot(aggregate_id)
+            store.save_events(events[snapshot_at:])
+
+            print(f"{history:>10} {timed(lambda a: full_replay(store, a), aggregate_id):>15.3f}ms "
+                  f"{timed(loader.load, aggregate_id):>12.3f}ms")
+
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
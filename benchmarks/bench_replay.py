@@ -0,0 +1,51 @@
+"""Benchmark de replay do Event Store: memória de pico e tempo até o primeiro evento.
+
+Uso:
+    python benchmarks/bench_replay.py [numero_de_eventos]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_store import EventStore
+
+
+def measure(label, replay):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_event_at = None
+    count = 0
+    for _ in replay():
+        if first_event_at is None:
+            first_event_at = time.perf_counter() - start
+        count += 1
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<22} {count:>8} eventos em {elapsed:7.3f}s  "
+          f"primeiro evento em {first_event_at * 1000:8.2f}ms  pico {peak / 1024 / 1024:8.2f} MiB")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    payload = {'title': 'Item de benchmark', 'description': 'x' * 200}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EventStore(os.path.join(tmp, 'events.db'))
+        for offset in range(0, count, 1000):
+            store.save_events([
+                (f'aggregate-{i % 1000}', 'ITEM_UPDATED', payload)
+                for i in range(offset, min(offset + 1000, count))
+            ])
+
+        measure('get_events()', store.get_events)
+        measure('iter_events()', store.iter_events)
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
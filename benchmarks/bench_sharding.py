@@ -0,0 +1,75 @@
+"""Benchmark do ShardedEventStore: appends/s com várias escritoras para 1, 2, 4 e 8 shards.
+
+Cada escritora grava em agregados próprios; com mais shards, escritas em
+agregados diferentes disputam menos o lock de escrita de um único arquivo.
+Com threads, o trabalho em Python de cada append disputa o GIL; use
+processos para medir apenas a disputa pelos arquivos (o ganho depende
+de haver núcleos livres).
+
+Uso:
+    python benchmarks/bench_sharding.py [eventos_por_escritora] [escritoras] [threads|processes]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sharded_event_store import ShardedEventStore
+
+PAYLOAD = {'title': 'Item de benchmark', 'description': 'x' * 200}
+
+
+def write(store, n, per_writer):
+    for i in range(per_writer):
+        store.save_event(f'aggregate-{n}-{i % 10}', 'ITEM_UPDATED', PAYLOAD)
+
+
+def write_in_process(db_path, shards, n, per_writer):
+    store = ShardedEventStore(db_path, shards=shards)
+    try:
+        write(store, n, per_writer)
+    finally:
+        store.close()
+
+
+def bench(db_path, shards, per_writer, writers, mode):
+    store = ShardedEventStore(db_path, shards=shards)
+    start = time.perf_counter()
+    if mode == 'processes':
+        with ProcessPoolExecutor(max_workers=writers) as executor:
+            futures = [executor.submit(write_in_process, db_path, shards, n, per_writer) for n in range(writers)]
+            for future in futures:
+                future.result()
+    else:
+        workers = [threading.Thread(target=write, args=(store, n, per_writer)) for n in range(writers)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    replayed = sum(1 for _ in store.iter_events())
+    replay_elapsed = time.perf_counter() - start
+    store.close()
+    return per_writer * writers / elapsed, replayed / replay_elapsed
+
+
+def main():
+    per_writer = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    mode = sys.argv[3] if len(sys.argv) > 3 else 'threads'
+
+    print(f"{writers} escritoras ({mode}), {os.cpu_count()} CPU(s)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for shards in (1, 2, 4, 8):
+            appends, replay = bench(os.path.join(tmp, f'events{shards}.db'), shards, per_writer, writers, mode)
+            print(f"{shards} shard(s): {appends:>10.0f} appends/s  {replay:>10.0f} eventos/s no replay (merge)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Benchmark do verificador de integridade: eventos/s com 1, 2, 4, ... processos.
+
+Grava o log com save_events em lotes e mede verify() com e sem hash
+encadeado, até a quantidade de núcleos da máquina.
+
+Uso:
+    python benchmarks/bench_verify.py [eventos]
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_store import EventStore
+from event_store_verify import verify
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    payload = {'title': 'Item de benchmark', 'description': 'x' * 200}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'events.db')
+        store = EventStore(db_path)
+        for start in range(0, total, 5000):
+            store.save_events([(f'aggregate-{i % 1000}', 'ITEM_UPDATED', payload)
+                               for i in range(start, min(start + 5000, total))])
+        store.close()
+
+        workers = 1
+        while True:
+            for hash_chain in (False, True):
+                report = verify(db_path, workers=workers, block_size=20000, hash_chain=hash_chain)
+                rate = report['events'] / report['elapsed_seconds']
+                label = 'com hash' if hash_chain else 'sem hash'
+                print(f"{workers} processo(s), {label}: {rate:>10.0f} eventos/s ({report['elapsed_seconds']:.2f}s)")
+            if workers >= (os.cpu_count() or 1):
+                break
+            workers *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import threading
+import time
+import uuid
+
+class Compactor:
+    """Compacta em segundo plano os históricos de agregados excluídos há mais de older_than_days dias
+
+    Cada passo (EventStore.compact_deleted_aggregates) trata no máximo
+    batch_size agregados e regrava no máximo um segmento selado, em
+    transações curtas; entre passos a thread faz uma pausa para não
+    disputar o lock de escrita com as requisições. Sem trabalho pendente,
+    a próxima verificação acontece após interval segundos.
+
+    Com vários processos sobre o mesmo Event Store, cada um com o seu
+    Compactor, apenas o dono da concessão (renovada a cada passo, válida
+    por lease segundos) compacta; os demais assumem se ele parar.
+    """
+
+    def __init__(self, event_store, older_than_days=30, interval=3600.0, batch_size=100, pause=0.05,
+                 lease=300.0):
+        self.event_store = event_store
+        self.older_than_days = older_than_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self.running = False
+        self.stopping = False
+        self.thread = None
+        self.wake = threading.Event()
+
+        self.runs = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_run = None
+        self.segment_bytes_reclaimed = 0
+
+    def run_once(self):
+        """Executa passos até não haver trabalho pendente; retorna os totais da execução"""
+        totals = {}
+        while True:
+            step = self.event_store.compact_deleted_aggregates(
+                self.older_than_days, batch_size=self.batch_size, owner=self.owner, lease=self.lease
+            )
+            more = step.pop('more')
+            for key, value in step.items():
+                totals[key] = totals.get(key, 0) + value
+            if not more or self.stopping:
+                break
+            time.sleep(self.pause)
+
+        self.runs += 1
+        self.last_run = totals
+        self.segment_bytes_reclaimed += totals.get('segment_bytes_reclaimed', 0)
+        if totals.get('compacted') or totals.get('segments_rewritten'):
+            print(f"Compactação: {totals['compacted']} agregados excluídos compactados, "
+                  f"{totals['events_removed']} eventos e {totals['bytes_removed']} bytes removidos")
+        return totals
+
+    def start(self):
+        """Inicia a thread de compactação"""
+        self.running = True
+        self.stopping = False
+
+        def worker():
+            while self.running:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = str(e)
+                    print(f"Erro na compactação do Event Store: {e}")
+                self.wake.wait(self.interval)
+                self.wake.clear()
+
+        self.thread = threading.Thread(target=worker)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Para a thread de compactação"""
+        self.running = False
+        self.stopping = True
+        self.wake.set()
+        if self.thread:
+            self.thread.join(timeout=5.0)
+        try:
+            self.event_store.release_compaction_lease(self.owner)
+        except Exception as e:
+            print(f"Erro ao liberar a concessão da compactação: {e}")
+
+    def get_stats(self):
+        """Retorna os totais da compactação e os contadores desta thread"""
+        stats = self.event_store.compaction_stats()
+        stats.update({
+            'running': self.running,
+            'older_than_days': self.older_than_days,
+            'owner': self.owner,
+            'runs': self.runs,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'last_run': self.last_run,
+            'segment_bytes_reclaimed': self.segment_bytes_reclaimed
+        })
+        return stats
@@ -15,6 +15,13 @@ class EventBus:
         """Publica um evento no barramento"""
         self.redis.publish('events', json.dumps(event))
 
+    def publish_many(self, events):
+        """Publica vários eventos em um único round trip ao Redis"""
+        pipe = self.redis.pipeline(transaction=False)
+        for event in events:
+            pipe.publish('events', json.dumps(event))
+        pipe.execute()
+
     def register_handler(self, event_type, handler):
         """Registra um handler para um tipo de evento"""
         if event_type not in self.handlers:
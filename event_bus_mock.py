@@ -20,6 +20,12 @@ class EventBusMock:
         self.queue.put(event)
         print(f"Evento publicado (simulado): {event['event_type']}")
 
+    def publish_many(self, events):
+        """Publica vários eventos no barramento simulado"""
+        for event in events:
+            self.queue.put(event)
+        print(f"{len(events)} eventos publicados (simulado)")
+
     def register_handler(self, event_type, handler):
         """Registra um handler para um tipo de evento"""
         if event_type not in self.handlers:
@@ -0,0 +1,70 @@
+import json
+import zlib
+
+# msgpack é opcional: sem ele apenas os codecs baseados em JSON ficam disponíveis
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Sufixo do nome do codec para payloads comprimidos com zlib (ex.: 'json+zlib')
+ZLIB_SUFFIX = '+zlib'
+
+def _json_encode(data):
+    return json.dumps(data, separators=(',', ':'))
+
+def _json_decode(payload):
+    return json.loads(payload)
+
+def _msgpack_encode(data):
+    return msgpack.packb(data, use_bin_type=True)
+
+def _msgpack_decode(payload):
+    return msgpack.unpackb(payload, raw=False)
+
+class EventCodecs:
+    """Registro de codecs para a coluna data do Event Store
+
+    Cada linha grava o nome do codec usado; linhas antigas, sem codec
+    explícito, são lidas como 'json'. Payloads com compress_threshold bytes
+    ou mais são comprimidos com zlib e recebem o sufixo '+zlib'.
+    """
+
+    def __init__(self, default='json', compress_threshold=None):
+        self.codecs = {}
+        self.register('json', _json_encode, _json_decode)
+        if msgpack is not None:
+            self.register('msgpack', _msgpack_encode, _msgpack_decode)
+
+        if default not in self.codecs:
+            raise ValueError(f"Codec desconhecido ou indisponível: {default}")
+        self.default = default
+        self.compress_threshold = compress_threshold
+
+    def register(self, name, encode, decode):
+        """Registra um codec; encode retorna str ou bytes e decode faz o inverso"""
+        if name.endswith(ZLIB_SUFFIX):
+            raise ValueError(f"O sufixo {ZLIB_SUFFIX} é reservado para compressão")
+        self.codecs[name] = (encode, decode)
+
+    def encode(self, data):
+        """Codifica data com o codec padrão e retorna (nome_do_codec, payload)"""
+        encode, _ = self.codecs[self.default]
+        payload = encode(data)
+        if self.compress_threshold is not None and len(payload) >= self.compress_threshold:
+            if isinstance(payload, str):
+                payload = payload.encode('utf-8')
+            return self.default + ZLIB_SUFFIX, zlib.compress(payload)
+        return self.default, payload
+
+    def decode(self, codec, payload):
+        """Decodifica um payload gravado com o codec informado"""
+        codec = codec or 'json'
+        if codec.endswith(ZLIB_SUFFIX):
+            codec = codec[:-len(ZLIB_SUFFIX)]
+            payload = zlib.decompress(payload)
+        try:
+            _, decode = self.codecs[codec]
+        except KeyError:
+            raise ValueError(f"Codec desconhecido ou indisponível: {codec}")
+        return decode(payload)
@@ -1,8 +1,15 @@
 from read_model import ReadModel
 
 class EventHandlers:
-    def __init__(self):
-        self.read_model = ReadModel()
+    def __init__(self, read_model=None):
+        self.read_model = read_model if read_model is not None else ReadModel()
+
+    def _save_user(self, event, user_data):
+        """Projeta o usuário; um username/email repetido não interrompe a projeção, só é registrado"""
+        conflicts = self.read_model.save_user(user_data)
+        if conflicts:
+            print(f"Evento {event.get('id')} ({event.get('event_type')}) com {', '.join(conflicts)} "
+                  f"já em uso; usuário {user_data['id']} projetado sem esses campos no índice")
 
     def handle_user_created(self, event):
         """Manipula eventos de criação de usuário"""
@@ -16,7 +23,7 @@ class EventHandlers:
         # Criar uma cópia para não modificar o original
         user_data = dict(user_data)
         user_data['id'] = event['aggregate_id']
-        self.read_model.save_user(user_data)
+        self._save_user(event, user_data)
 
     def handle_user_updated(self, event):
         """Manipula eventos de atualização de usuário"""
@@ -30,7 +37,7 @@ class EventHandlers:
         # Criar uma cópia para não modificar o original
         user_data = dict(user_data)
         user_data['id'] = event['aggregate_id']
-        self.read_model.save_user(user_data)
+        self._save_user(event, user_data)
 
     def handle_user_deleted(self, event):
         """Manipula eventos de exclusão de usuário"""
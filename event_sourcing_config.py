@@ -1,12 +1,51 @@
+import atexit
 from event_store import EventStore
-from read_model import ReadModel
+from log_event_store import LogEventStore
+from memory_event_store import InMemoryEventStore
+from sharded_event_store import ShardedEventStore
+from read_model import ReadModel, InMemoryReadModel
+from sqlite_read_model import SQLiteReadModel
 from event_bus import EventBus
 from event_handlers import EventHandlers
+from outbox import OutboxRelay
+from compaction import Compactor
+from aggregates import AggregateLoader
 
-def setup_event_sourcing():
+def create_event_store(backend='sqlite', path=None, shards=4):
+    """Cria o Event Store do backend informado: 'sqlite', 'sharded', 'log' ou 'memory'"""
+    if backend == 'sqlite':
+        # Eventos de meses encerrados vão para segmentos somente leitura (events-AAAA-MM.db)
+        # Com outbox: o evento e a publicação pendente são gravados na mesma transação
+        return EventStore(path or 'events.db', segment_period='month', outbox=True)
+    if backend == 'sharded':
+        # Um arquivo por shard (events-shard0.db, ...), cada um com seus próprios segmentos
+        return ShardedEventStore(path or 'events.db', shards=shards, segment_period='month', outbox=True)
+    if backend == 'log':
+        # Apenas um processo: com vários workers o segundo falha ao travar o diretório
+        return LogEventStore(path or 'events_log')
+    if backend == 'memory':
+        return InMemoryEventStore()
+    raise ValueError(f"Backend de Event Store desconhecido: {backend}")
+
+def create_read_model(backend='sqlite', path=None):
+    """Cria o Read Model do backend informado: 'sqlite', 'tinydb' ou 'memory'"""
+    if backend == 'sqlite':
+        # Na primeira execução, importa o readmodel.json do backend TinyDB, se existir
+        return SQLiteReadModel(path or 'readmodel.db', migrate_from='readmodel.json')
+    if backend == 'tinydb':
+        return ReadModel(path or 'readmodel.json')
+    if backend == 'memory':
+        return InMemoryReadModel()
+    raise ValueError(f"Backend de Read Model desconhecido: {backend}")
+
+def setup_event_sourcing(event_store_backend='sqlite', read_model_backend='sqlite',
+                         event_store_path=None, read_model_path=None, event_store_shards=4,
+                         compact_after_days=None):
     # Inicializar componentes
-    event_store = EventStore('events.db')
-    read_model = ReadModel('readmodel.json')
+    event_store = create_event_store(event_store_backend, event_store_path, event_store_shards)
+    # Fechar as conexões persistentes do Event Store ao encerrar o processo
+    atexit.register(event_store.close)
+    read_model = create_read_model(read_model_backend, read_model_path)
 
     # Configurar o Redis real
     # Usar o Redis local na porta padrão 6379
@@ -30,7 +69,7 @@ def setup_event_sourcing():
         from event_bus_mock import EventBusMock
         event_bus = EventBusMock()
 
-    handlers = EventHandlers()
+    handlers = EventHandlers(read_model)
 
     # Registrar handlers
     event_bus.register_handler('USER_CREATED', handlers.handle_user_created)
@@ -41,11 +80,42 @@ def setup_event_sourcing():
     event_bus.register_handler('ITEM_DELETED', handlers.handle_item_deleted)
     event_bus.register_handler('TEST_EVENT', handlers.handle_test_event)
 
+    # Agregados em cache (LRU) com snapshots gravados em segundo plano a cada N eventos.
+    # O snapshot é agendado pelo handler de append, só no processo que gravou o evento: o
+    # barramento entrega cada evento a todos os workers, que gravariam o mesmo snapshot N vezes
+    aggregate_loader = AggregateLoader(event_store, snapshot_every=50, cache_size=1000)
+    event_store.register_append_handler(aggregate_loader.record)
+    event_store.register_append_handler(aggregate_loader.maybe_snapshot)
+    for event_type in ('USER_CREATED', 'USER_UPDATED', 'USER_PASSWORD_CHANGED', 'USER_DELETED',
+                       'ITEM_CREATED', 'ITEM_UPDATED', 'ITEM_DELETED'):
+        event_bus.register_handler(event_type, aggregate_loader.record)
+    aggregate_loader.start()
+
     # Iniciar o event bus
     event_bus.start()
 
+    # Backends com outbox: os serviços publicam pelo relay, que envia os eventos ao Event Bus
+    # em segundo plano; nos demais, publicam diretamente no Event Bus
+    outbox_relay = None
+    publisher = event_bus
+    if getattr(event_store, 'outbox', False):
+        outbox_relay = OutboxRelay(event_store, event_bus)
+        outbox_relay.start()
+        publisher = outbox_relay
+
+    # Históricos de agregados excluídos há mais de compact_after_days dias viram lápides. A remoção
+    # é irreversível, então fica desativada (None) até o operador escolher um prazo
+    compactor = None
+    if compact_after_days is not None and hasattr(event_store, 'compact_deleted_aggregates'):
+        compactor = Compactor(event_store, older_than_days=compact_after_days)
+        compactor.start()
+
     return {
         'event_store': event_store,
         'read_model': read_model,
-        'event_bus': event_bus
+        'event_bus': event_bus,
+        'publisher': publisher,
+        'outbox_relay': outbox_relay,
+        'compactor': compactor,
+        'aggregate_loader': aggregate_loader
     }
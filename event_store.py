@@ -1,89 +1,1640 @@
 import sqlite3
+import calendar
 import json
+import os
+import queue
+import threading
+import time
+import urllib.request
 import uuid
-from datetime import datetime
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from event_codecs import EventCodecs
+from event_upcasters import default_upcasters
+
+# position é o rowid: posição global e crescente de cada evento no log.
+# codec identifica como a coluna data foi codificada (ver event_codecs.py).
+# timestamp_us repete timestamp em microssegundos desde a época (UTC) para consultas por período.
+# schema_version é a versão do formato de data, convertida na leitura (ver event_upcasters.py).
+# idempotency_key identifica o comando que gerou o evento; é limpa após idempotency_ttl.
+EVENTS_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS events (
+    position INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    aggregate_id TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    codec TEXT NOT NULL DEFAULT 'json',
+    timestamp_us INTEGER,
+    schema_version INTEGER NOT NULL DEFAULT 1,
+    idempotency_key TEXT
+)
+'''
+
+# Colunas de events, na ordem do esquema; usadas ao copiar linhas para segmentos
+# (idempotency_key não é copiada: quando um período é selado as chaves já expiraram)
+EVENT_COLUMNS = ('position, id, aggregate_id, event_type, data, timestamp, version, codec, '
+                 'timestamp_us, schema_version')
+
+# Eventos que encerram um agregado; históricos excluídos há tempo suficiente são compactados
+DELETION_EVENT_TYPES = ('USER_DELETED', 'ITEM_DELETED')
+
+# Tamanho aproximado de uma linha de events, em bytes, para o relatório da compactação
+ROW_BYTES_SQL = ('length(CAST(data AS BLOB)) + length(id) + length(aggregate_id) + '
+                 'length(event_type) + length(timestamp)')
+
+# Índices de cada segmento selado (os mesmos do banco principal)
+SEGMENT_INDEXES_SQL = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_events_aggregate_version ON events (aggregate_id, version)",
+    "CREATE INDEX IF NOT EXISTS idx_events_type_timestamp ON events (event_type, timestamp_us)",
+    "CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events (timestamp_us)",
+]
+
+def to_epoch_us(value):
+    """Converte um datetime (UTC, sem fuso) ou número de microssegundos para microssegundos desde a época"""
+    if isinstance(value, datetime):
+        return calendar.timegm(value.utctimetuple()) * 1000000 + value.microsecond
+    return int(value)
+
+class ConcurrencyError(Exception):
+    """Conflito de versão ao anexar um evento a um agregado"""
+
+    def __init__(self, aggregate_id, expected_version, actual_version):
+        self.aggregate_id = aggregate_id
+        self.expected_version = expected_version
+        self.actual_version = actual_version
+        super().__init__(
+            f"Conflito de versão no agregado {aggregate_id}: "
+            f"esperada {expected_version}, atual {actual_version}"
+        )
+
+class ReadConnectionPool:
+    """Pool limitado de conexões somente leitura (mode=ro) com o banco de eventos
+
+    Com o banco em WAL, cada consulta lê um snapshot consistente sem bloquear
+    os escritores. Uma conexão com um cursor aberto mantém o snapshot antigo,
+    por isso leituras aninhadas (por exemplo, dentro de um iter_events) usam
+    outra conexão; se o pool estiver esgotado, a thread que já tem uma
+    conexão emprestada recebe uma conexão extra temporária em vez de esperar,
+    o que evitaria um deadlock.
+    """
+
+    def __init__(self, connect, size=8):
+        self._connect = connect
+        self.size = size
+        self._idle = []
+        self._all = []
+        self._overflow = []
+        # thread -> quantidade de conexões emprestadas
+        self._borrowed = {}
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Empresta uma conexão, aguardando se o pool estiver esgotado"""
+        thread_id = threading.get_ident()
+        with self._condition:
+            while not self._idle and len(self._all) >= self.size:
+                if self._borrowed.get(thread_id):
+                    conn = self._connect()
+                    self._overflow.append(conn)
+                    break
+                self._condition.wait()
+            else:
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    conn = self._connect()
+                    self._all.append(conn)
+            self._borrowed[thread_id] = self._borrowed.get(thread_id, 0) + 1
+            return conn
+
+    def release(self, conn):
+        """Devolve uma conexão emprestada com acquire"""
+        thread_id = threading.get_ident()
+        with self._condition:
+            if self._borrowed.get(thread_id, 0) > 1:
+                self._borrowed[thread_id] -= 1
+            else:
+                self._borrowed.pop(thread_id, None)
+
+            if conn in self._overflow:
+                self._overflow.remove(conn)
+                conn.close()
+            elif conn in self._all:
+                self._idle.append(conn)
+                self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Empresta uma conexão durante o bloco with"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Fecha todas as conexões do pool"""
+        with self._condition:
+            connections = self._all + self._overflow
+            self._all = []
+            self._idle = []
+            self._overflow = []
+            self._borrowed = {}
+            self._condition.notify_all()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Erro ao fechar conexão de leitura do Event Store: {e}")
 
 class EventStore:
-    def __init__(self, db_path='events.db'):
+    def __init__(self, db_path='events.db', group_commit=False,
+                 group_commit_window=0.002, group_commit_max_batch=100,
+                 codec='json', compress_threshold=None,
+                 segment_period=None, segment_grace=60.0, upcasters=None,
+                 idempotency_ttl=24 * 60 * 60, read_pool_size=8, outbox=False,
+                 position_sequence=None):
+        if segment_period not in (None, 'day', 'month'):
+            raise ValueError(f"Período de segmento inválido: {segment_period}")
         self.db_path = db_path
+        self.codecs = EventCodecs(default=codec, compress_threshold=compress_threshold)
+        self.upcasters = upcasters if upcasters is not None else default_upcasters()
+        # Uma conexão persistente por thread, registradas (com a thread) para o close();
+        # as de threads encerradas são fechadas quando outra thread abre a sua
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._pid = os.getpid()
+        # Leituras usam conexões separadas, somente leitura, para não disputar com as escritas
+        self.read_pool_size = read_pool_size
+        self._read_pool = ReadConnectionPool(self._connect_reader, read_pool_size)
+
+        # Group commit: uma thread escritora agrupa os save_event concorrentes
+        self.group_commit = group_commit
+        self.group_commit_window = group_commit_window
+        self.group_commit_max_batch = group_commit_max_batch
+        self._write_queue = None
+        self._writer_thread = None
+        self._writer_lock = threading.Lock()
+
+        # Chaves de idempotência valem por idempotency_ttl segundos; a limpeza é incremental
+        self.idempotency_ttl = idempotency_ttl
+        self._idempotency_expired_upto = 0
+        self._next_idempotency_cleanup = 0
+
+        # Com outbox, cada evento gravado também entra na tabela outbox (ver outbox.py)
+        self.outbox = outbox
+
+        # Sem position_sequence a position é o autoincremento do banco; com ela, cada
+        # INSERT usa position_sequence(cursor), chamada dentro da transação (ver sharded_event_store.py)
+        self.position_sequence = position_sequence
+
+        # Handlers chamados com cada evento logo após o commit
+        self.append_handlers = []
+
+        # Segmentos por período: eventos de períodos encerrados saem do banco
+        # principal para arquivos somente leitura listados na tabela segments
+        self.segment_period = segment_period
+        self.segment_grace = segment_grace
+        self._segment_lock = threading.Lock()
+        self._roll_lock = threading.Lock()
+        self._maintenance_thread = None
+        self._next_maintenance = 0
+
+        # Compactação de agregados excluídos: eventos de exclusão já examinados (em memória)
+        self._compaction_scanned_upto = 0
+
         self._init_db()
-        
+        self._segmented = bool(segment_period) or bool(self._load_segments())
+        self._tombstoned = self._has_tombstones()
+
+    def _connect(self):
+        """Abre uma nova conexão com o banco de eventos"""
+        # Aberta como URI para que o ATTACH aceite URIs (segmentos anexados somente leitura)
+        uri = 'file:' + urllib.request.pathname2url(os.path.abspath(self.db_path))
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _connect_reader(self):
+        """Abre uma conexão somente leitura com o banco de eventos, para o pool de leitura"""
+        uri = 'file:' + urllib.request.pathname2url(os.path.abspath(self.db_path)) + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _get_connection(self):
+        """Obtém a conexão de escrita da thread atual, criando-a se necessário"""
+        # Após um fork o processo filho não pode reutilizar as conexões do pai
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._register_connection(conn)
+        return conn
+
+    def _register_connection(self, conn):
+        """Registra uma conexão da thread atual e fecha as conexões de threads já encerradas"""
+        finished = []
+        with self._connections_lock:
+            registered = []
+            for thread_ref, registered_conn in self._connections:
+                thread = thread_ref()
+                if thread is not None and thread.is_alive():
+                    registered.append((thread_ref, registered_conn))
+                else:
+                    finished.append(registered_conn)
+            registered.append((weakref.ref(threading.current_thread()), conn))
+            self._connections = registered
+        for finished_conn in finished:
+            try:
+                finished_conn.close()
+            except sqlite3.Error as e:
+                print(f"Erro ao fechar conexão do Event Store: {e}")
+
+    def _reset_after_fork(self):
+        """Descarta (sem fechar) as conexões herdadas do processo pai"""
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._read_pool = ReadConnectionPool(self._connect_reader, self.read_pool_size)
+        # A thread escritora não sobrevive ao fork; será recriada sob demanda
+        self._write_queue = None
+        self._writer_thread = None
+        self._writer_lock = threading.Lock()
+        self._segment_lock = threading.Lock()
+        self._roll_lock = threading.Lock()
+        self._maintenance_thread = None
+
+    def close(self):
+        """Fecha todas as conexões abertas pelo Event Store"""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+            return
+
+        self._stop_writer()
+        if self._maintenance_thread is not None:
+            self._maintenance_thread.join(timeout=5.0)
+        with self._connections_lock:
+            connections = self._connections
+            self._connections = []
+        for _, conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Erro ao fechar conexão do Event Store: {e}")
+        self._read_pool.close()
+        self._local = threading.local()
+
     def _init_db(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
+        # WAL: leitores veem um snapshot e não bloqueiam (nem são bloqueados por) escritores
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(EVENTS_TABLE_SQL)
+        self._migrate_add_position(cursor)
+        self._migrate_add_codec(cursor)
+        self._migrate_add_timestamp_us(cursor)
+        self._migrate_add_schema_version(cursor)
+        self._migrate_add_idempotency_key(cursor)
+        try:
+            # Garante versões únicas por agregado e transforma a busca da versão em index seek
+            cursor.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_events_aggregate_version "
+                "ON events (aggregate_id, version)"
+            )
+        except sqlite3.IntegrityError as e:
+            # Bancos antigos podem conter versões duplicadas; manter ao menos o índice de busca
+            print(f"Versões duplicadas no Event Store, índice único não criado: {e}")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_events_aggregate_version_legacy "
+                "ON events (aggregate_id, version)"
+            )
+        # Snapshots: último estado conhecido de cada agregado e a versão que ele reflete
         cursor.execute('''
-        CREATE TABLE IF NOT EXISTS events (
-            id TEXT PRIMARY KEY,
-            aggregate_id TEXT NOT NULL,
-            event_type TEXT NOT NULL,
-            data TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
+        CREATE TABLE IF NOT EXISTS snapshots (
+            aggregate_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            timestamp TEXT NOT NULL
+        )
+        ''')
+        # Catálogo de segmentos selados e última versão de cada agregado contida neles
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS segments (
+            name TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            first_position INTEGER NOT NULL,
+            last_position INTEGER NOT NULL,
+            first_timestamp_us INTEGER,
+            last_timestamp_us INTEGER,
+            event_count INTEGER NOT NULL,
+            sealed_at_us INTEGER NOT NULL
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS aggregate_versions (
+            aggregate_id TEXT PRIMARY KEY,
             version INTEGER NOT NULL
         )
         ''')
+        # Outbox: eventos a publicar no Event Bus, gravados na mesma transação do evento
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            position INTEGER PRIMARY KEY,
+            created_at_us INTEGER NOT NULL,
+            sent_at_us INTEGER
+        )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (position) WHERE sent_at_us IS NULL"
+        )
+        # Concessão do relay: com vários processos, só o dono da concessão publica o outbox
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outbox_relay (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            owner TEXT NOT NULL,
+            lease_until_us INTEGER NOT NULL
+        )
+        ''')
+        # Concessão da compactação: com vários processos, só o dono compacta
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS compactor (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            owner TEXT NOT NULL,
+            lease_until_us INTEGER NOT NULL
+        )
+        ''')
+        # Lápides: o que resta de agregados excluídos cujo histórico foi compactado
+        # (compacted_at_us fica NULL enquanto ainda houver eventos a remover)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tombstones (
+            aggregate_id TEXT PRIMARY KEY,
+            event_type TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            deleted_at_us INTEGER NOT NULL,
+            compacted_at_us INTEGER,
+            events_removed INTEGER NOT NULL DEFAULT 0,
+            bytes_removed INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tombstones_pending ON tombstones (aggregate_id) "
+            "WHERE compacted_at_us IS NULL"
+        )
         conn.commit()
-        conn.close()
-        
-    def save_event(self, aggregate_id, event_type, data):
-        """Salva um novo evento no Event Store"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Obter a versão atual do agregado
+
+    def _migrate_add_position(self, cursor):
+        """Reconstrói tabelas antigas (sem a coluna position) no esquema atual"""
+        cursor.execute("PRAGMA table_info(events)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'position' in columns:
+            return
+
+        print("Migrando o Event Store para o esquema com position...")
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("ALTER TABLE events RENAME TO events_legacy")
+        cursor.execute(EVENTS_TABLE_SQL)
+        # A ordem de inserção original é a melhor aproximação da ordem global
+        cursor.execute(
+            "INSERT INTO events (id, aggregate_id, event_type, data, timestamp, version) "
+            "SELECT id, aggregate_id, event_type, data, timestamp, version "
+            "FROM events_legacy ORDER BY timestamp, rowid"
+        )
+        cursor.execute("DROP TABLE events_legacy")
+        cursor.connection.commit()
+
+    def _migrate_add_codec(self, cursor):
+        """Adiciona a coluna codec a tabelas antigas; as linhas existentes são JSON"""
+        cursor.execute("PRAGMA table_info(events)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'codec' not in columns:
+            cursor.execute("ALTER TABLE events ADD COLUMN codec TEXT NOT NULL DEFAULT 'json'")
+
+    def _migrate_add_schema_version(self, cursor):
+        """Adiciona a coluna schema_version a tabelas antigas; as linhas existentes são da versão 1"""
+        cursor.execute("PRAGMA table_info(events)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'schema_version' not in columns:
+            cursor.execute("ALTER TABLE events ADD COLUMN schema_version INTEGER NOT NULL DEFAULT 1")
+
+    def _migrate_add_idempotency_key(self, cursor):
+        """Adiciona a coluna idempotency_key e o índice único parcial sobre ela"""
+        cursor.execute("PRAGMA table_info(events)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'idempotency_key' not in columns:
+            cursor.execute("ALTER TABLE events ADD COLUMN idempotency_key TEXT")
+        cursor.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_events_idempotency_key "
+            "ON events (idempotency_key) WHERE idempotency_key IS NOT NULL"
+        )
+
+    def _migrate_add_timestamp_us(self, cursor):
+        """Cria timestamp_us e os índices por tipo/período, preenchendo linhas antigas"""
+        cursor.execute("PRAGMA table_info(events)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'timestamp_us' not in columns:
+            cursor.execute("ALTER TABLE events ADD COLUMN timestamp_us INTEGER")
+
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_events_type_timestamp "
+            "ON events (event_type, timestamp_us)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_events_timestamp "
+            "ON events (timestamp_us)"
+        )
+
+        # Timestamps ISO gerados por datetime.isoformat() omitem os microssegundos quando são zero
+        cursor.execute(
+            "UPDATE events SET timestamp_us = "
+            "CAST(strftime('%s', timestamp) AS INTEGER) * 1000000 + "
+            "CASE WHEN length(timestamp) > 19 "
+            "THEN CAST(substr(timestamp || '000000', 21, 6) AS INTEGER) ELSE 0 END "
+            "WHERE timestamp_us IS NULL"
+        )
+        cursor.connection.commit()
+
+    def _current_version(self, cursor, aggregate_id):
+        """Obtém a versão atual de um agregado (0 se não houver eventos)"""
         cursor.execute(
-            "SELECT MAX(version) FROM events WHERE aggregate_id = ?", 
+            "SELECT MAX(version) FROM events WHERE aggregate_id = ?",
             (aggregate_id,)
         )
         result = cursor.fetchone()
-        version = (result[0] or 0) + 1
-        
+        version = result[0] or 0
+        if not version and (self._segmented or self._tombstoned):
+            # Agregados sem eventos recentes podem existir apenas em segmentos selados
+            # ou ter tido o histórico compactado
+            cursor.execute(
+                "SELECT version FROM aggregate_versions WHERE aggregate_id = ?",
+                (aggregate_id,)
+            )
+            result = cursor.fetchone()
+            version = result[0] if result else 0
+        return version
+
+    def _idempotency_cutoff(self, now=None):
+        """Instante (em microssegundos) antes do qual as chaves de idempotência expiraram"""
+        now = now or datetime.utcnow()
+        return to_epoch_us(now - timedelta(seconds=self.idempotency_ttl))
+
+    def _find_by_idempotency_key(self, cursor, idempotency_key):
+        """Obtém o evento gravado com uma chave de idempotência ainda válida, ou None"""
+        cursor.execute(
+            "SELECT * FROM events WHERE idempotency_key = ? AND timestamp_us >= ?",
+            (idempotency_key, self._idempotency_cutoff())
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        event = self._row_to_event(row)
+        # Indica ao chamador que nada foi gravado e o evento não deve ser publicado de novo
+        event['replayed'] = True
+        return event
+
+    def _append(self, cursor, aggregate_id, event_type, data, expected_version=None,
+                idempotency_key=None):
+        """Insere um evento na transação corrente e retorna o evento criado"""
+        if idempotency_key is not None:
+            existing = self._find_by_idempotency_key(cursor, idempotency_key)
+            if existing is not None:
+                return existing
+            # Uma chave expirada ainda não limpa não pode bloquear a reutilização
+            cursor.execute(
+                "UPDATE events SET idempotency_key = NULL WHERE idempotency_key = ?",
+                (idempotency_key,)
+            )
+
+        # Obter a versão atual do agregado
+        current_version = self._current_version(cursor, aggregate_id)
+        if expected_version is not None and current_version != expected_version:
+            raise ConcurrencyError(aggregate_id, expected_version, current_version)
+
         # Criar o evento
+        now = datetime.utcnow()
         event = {
             'id': str(uuid.uuid4()),
             'aggregate_id': aggregate_id,
             'event_type': event_type,
-            'data': json.dumps(data),
-            'timestamp': datetime.utcnow().isoformat(),
-            'version': version
+            'data': data,
+            'timestamp': now.isoformat(),
+            'timestamp_us': to_epoch_us(now),
+            'version': current_version + 1,
+            'idempotency_key': idempotency_key
         }
-        
+        codec, payload = self.codecs.encode(data)
+
         # Salvar o evento
-        cursor.execute(
-            "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)",
-            (
-                event['id'], 
-                event['aggregate_id'], 
-                event['event_type'], 
-                event['data'], 
-                event['timestamp'], 
-                event['version']
+        try:
+            cursor.execute(
+                "INSERT INTO events "
+                "(position, id, aggregate_id, event_type, data, timestamp, timestamp_us, version, codec, "
+                "idempotency_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.position_sequence(cursor) if self.position_sequence else None,
+                    event['id'],
+                    event['aggregate_id'],
+                    event['event_type'],
+                    payload,
+                    event['timestamp'],
+                    event['timestamp_us'],
+                    event['version'],
+                    codec,
+                    idempotency_key
+                )
             )
-        )
-        conn.commit()
-        conn.close()
-        
+        except sqlite3.IntegrityError:
+            # Outro escritor gravou a mesma versão primeiro
+            raise ConcurrencyError(
+                aggregate_id, current_version, self._current_version(cursor, aggregate_id)
+            )
+
+        event['position'] = cursor.lastrowid
+        if self.outbox:
+            cursor.execute(
+                "INSERT INTO outbox (position, created_at_us) VALUES (?, ?)",
+                (event['position'], event['timestamp_us'])
+            )
+        # Os serviços gravam o formato original (versão 1); quem recebe o evento já vê o atual
+        event['schema_version'] = 1
+        return self.upcasters.upcast(event)
+
+    def save_event(self, aggregate_id, event_type, data, expected_version=None,
+                   idempotency_key=None):
+        """Salva um novo evento no Event Store
+
+        Se expected_version for informado, o evento só é gravado se a versão
+        atual do agregado for igual a ela; caso contrário levanta ConcurrencyError.
+        Se idempotency_key já tiver sido usada dentro de idempotency_ttl, nada é
+        gravado e o evento original é retornado, marcado com 'replayed'.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        if idempotency_key is not None:
+            # Caminho rápido para retentativas: uma leitura, sem lock de escrita
+            existing = self._find_by_idempotency_key(cursor, idempotency_key)
+            if existing is not None:
+                return existing
+
+        if self.group_commit:
+            # Aguarda o commit do lote que contém o evento (mesma durabilidade)
+            future = Future()
+            self._get_write_queue().put(
+                ((aggregate_id, event_type, data, expected_version, idempotency_key), future)
+            )
+            event = future.result()
+            if not event.get('replayed'):
+                self._after_commit([event])
+            return event
+
+        try:
+            # BEGIN IMMEDIATE reserva o lock de escrita entre a leitura da versão e o INSERT
+            cursor.execute("BEGIN IMMEDIATE")
+            event = self._append(cursor, aggregate_id, event_type, data, expected_version,
+                                 idempotency_key)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        if not event.get('replayed'):
+            self._after_commit([event])
+
         # Retornar o evento para ser publicado
         return event
-        
-    def get_events(self, aggregate_id=None):
-        """Obtém eventos do Event Store, opcionalmente filtrados por aggregate_id"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+
+    def register_append_handler(self, handler):
+        """Registra um handler chamado com cada evento gravado por este processo"""
+        self.append_handlers.append(handler)
+
+    def _after_commit(self, events):
+        """Tarefas executadas após cada commit de eventos"""
+        self._notify_append(events)
+        self._maybe_expire_idempotency_keys()
+        self._maybe_maintain_segments()
+
+    def expire_idempotency_keys(self, now=None):
+        """Limpa as chaves de idempotência expiradas e retorna quantas foram removidas
+
+        Cada execução percorre apenas os eventos gravados desde o corte anterior.
+        """
+        cutoff = self._idempotency_cutoff(now)
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                "UPDATE events SET idempotency_key = NULL "
+                "WHERE timestamp_us >= ? AND timestamp_us < ? AND idempotency_key IS NOT NULL",
+                (self._idempotency_expired_upto, cutoff)
+            )
+            expired = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self._idempotency_expired_upto = cutoff
+        return expired
+
+    def _maybe_expire_idempotency_keys(self):
+        """Executa a limpeza das chaves expiradas no máximo a cada décimo do TTL"""
+        if time.time() < self._next_idempotency_cleanup:
+            return
+        self._next_idempotency_cleanup = time.time() + self.idempotency_ttl / 10
+        try:
+            self.expire_idempotency_keys()
+        except sqlite3.Error as e:
+            print(f"Erro ao limpar chaves de idempotência: {e}")
+
+    def _notify_append(self, events):
+        """Repassa os eventos recém-gravados aos handlers registrados"""
+        for event in events:
+            for handler in self.append_handlers:
+                try:
+                    handler(event)
+                except Exception as e:
+                    print(f"Erro no handler de append para {event['event_type']}: {e}")
+
+    def _get_write_queue(self):
+        """Obtém a fila da thread escritora, iniciando-a se necessário"""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+
+        with self._writer_lock:
+            if self._writer_thread is None or not self._writer_thread.is_alive():
+                self._write_queue = queue.Queue()
+                self._writer_thread = threading.Thread(
+                    target=self._writer_loop, args=(self._write_queue,)
+                )
+                self._writer_thread.daemon = True
+                self._writer_thread.start()
+            return self._write_queue
+
+    def _stop_writer(self):
+        """Para a thread escritora após gravar os eventos já enfileirados"""
+        with self._writer_lock:
+            thread, write_queue = self._writer_thread, self._write_queue
+            self._writer_thread = None
+            self._write_queue = None
+        if thread is not None:
+            write_queue.put(None)
+            thread.join()
+
+    def _writer_loop(self, write_queue):
+        """Agrupa os eventos que chegam dentro da janela e grava cada lote em uma transação"""
+        conn = self._get_connection()
+        stopping = False
+        while not stopping:
+            item = write_queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.group_commit_window
+            while len(batch) < self.group_commit_max_batch:
+                try:
+                    item = write_queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._commit_batch(conn, batch)
+
+    def _commit_batch(self, conn, batch):
+        """Grava um lote do group commit e resolve o future de cada chamador"""
         cursor = conn.cursor()
-        
+        results = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for args, future in batch:
+                # Um savepoint por evento: um conflito não derruba o lote inteiro
+                cursor.execute("SAVEPOINT group_append")
+                try:
+                    event = self._append(cursor, *args)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO group_append")
+                    cursor.execute("RELEASE group_append")
+                    results.append((future, None, e))
+                else:
+                    cursor.execute("RELEASE group_append")
+                    results.append((future, event, None))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for future, event, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(event)
+
+    def save_events(self, events):
+        """Salva vários eventos em uma única transação
+
+        Recebe uma lista de tuplas (aggregate_id, event_type, data) e retorna os
+        eventos criados, na mesma ordem, prontos para serem publicados.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            saved_events = [
+                self._append(cursor, aggregate_id, event_type, data)
+                for aggregate_id, event_type, data in events
+            ]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        self._after_commit(saved_events)
+        return saved_events
+
+    def import_events(self, events, skip_existing=False):
+        """Grava, em uma única transação, eventos exportados de outro Event Store
+
+        Preserva id, timestamp e versão de cada evento; a position é
+        atribuída por este banco. Cada evento precisa ter exatamente a versão
+        seguinte à atual do seu agregado, senão levanta ConcurrencyError. Com
+        skip_existing, eventos com versão já presente são ignorados (útil para
+        retomar uma importação interrompida). Retorna os eventos gravados.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        # Versão atual dos agregados vistos neste lote, para não consultar o banco a cada evento
+        versions = {}
+        imported = []
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for event in events:
+                aggregate_id = event['aggregate_id']
+                current_version = versions.get(aggregate_id)
+                if current_version is None:
+                    current_version = self._current_version(cursor, aggregate_id)
+                if event['version'] != current_version + 1:
+                    if skip_existing and event['version'] <= current_version:
+                        continue
+                    raise ConcurrencyError(aggregate_id, event['version'] - 1, current_version)
+
+                timestamp_us = event.get('timestamp_us')
+                if timestamp_us is None:
+                    timestamp_us = to_epoch_us(datetime.fromisoformat(event['timestamp']))
+                schema_version = event.get('schema_version') or 1
+                codec, payload = self.codecs.encode(event['data'])
+                cursor.execute(
+                    "INSERT INTO events "
+                    "(position, id, aggregate_id, event_type, data, timestamp, timestamp_us, version, codec, "
+                    "schema_version) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        self.position_sequence(cursor) if self.position_sequence else None,
+                        event['id'],
+                        aggregate_id,
+                        event['event_type'],
+                        payload,
+                        event['timestamp'],
+                        timestamp_us,
+                        event['version'],
+                        codec,
+                        schema_version
+                    )
+                )
+                versions[aggregate_id] = event['version']
+                imported.append(self.upcasters.upcast(dict(
+                    event, timestamp_us=timestamp_us, position=cursor.lastrowid, schema_version=schema_version
+                )))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        self._after_commit(imported)
+        return imported
+
+    def _row_to_event(self, row):
+        """Converte uma linha da tabela events em um evento com data decodificado e atualizado"""
+        event = dict(row)
+        event['data'] = self.codecs.decode(event.pop('codec', None), event['data'])
+        # Segmentos selados antes da coluna schema_version não a possuem
+        event.setdefault('schema_version', 1)
+        return self.upcasters.upcast(event)
+
+    def _iter_rows(self, sources, conditions, params, order_by, limit=None, batch_size=500):
+        """Executa a mesma consulta em cada fonte, em sequência, entregando as linhas em lotes
+
+        Uma fonte sem conexão é o banco principal, lido com uma conexão
+        emprestada do pool de leitura enquanto a consulta estiver aberta.
+        """
+        remaining = limit
+        for conn, extra_condition in sources:
+            source_conditions = list(conditions)
+            source_params = list(params)
+            if extra_condition:
+                source_conditions.append(extra_condition[0])
+                source_params.append(extra_condition[1])
+
+            query = "SELECT * FROM events"
+            if source_conditions:
+                query += " WHERE " + " AND ".join(source_conditions)
+            query += " ORDER BY " + order_by
+            if remaining is not None:
+                query += " LIMIT ?"
+                source_params.append(remaining)
+
+            with self._read_pool.connection() if conn is None else nullcontext(conn) as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, source_params)
+                try:
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        for row in rows:
+                            yield row
+                            if remaining is not None:
+                                remaining -= 1
+                                if remaining <= 0:
+                                    return
+                finally:
+                    cursor.close()
+
+    def iter_events(self, aggregate_id=None, from_position=None, batch_size=500,
+                    from_version=None):
+        """Itera sobre os eventos sem carregar o histórico inteiro na memória
+
+        Lê as linhas em lotes de batch_size com fetchmany e decodifica cada
+        payload apenas quando o evento é entregue. Com from_position, começa
+        pelo evento com essa posição global (inclusive); com aggregate_id e
+        from_version, pela versão informada do agregado (inclusive).
+        """
+        conditions = []
+        params = []
+        if aggregate_id:
+            conditions.append("aggregate_id = ?")
+            params.append(aggregate_id)
+        if from_position is not None:
+            conditions.append("position >= ?")
+            params.append(from_position)
+        if aggregate_id and from_version is not None:
+            conditions.append("version >= ?")
+            params.append(from_version)
+
         if aggregate_id:
+            # Segmentos só são consultados se o agregado tiver eventos selados ainda não lidos
+            sealed_version = self._sealed_version(aggregate_id)
+            if not sealed_version or (from_version or 0) > sealed_version:
+                sources = self._read_sources(lambda segment: False)
+            else:
+                sources = self._read_sources()
+        elif from_position is not None:
+            sources = self._read_sources(lambda segment: segment['last_position'] >= from_position)
+        else:
+            sources = self._read_sources()
+
+        order_by = "version" if aggregate_id else "position"
+        for row in self._iter_rows(sources, conditions, params, order_by, batch_size=batch_size):
+            yield self._row_to_event(row)
+
+    def _read_page(self, condition, params, descending, limit, event_types, segment_filter=None):
+        """Lê uma página de eventos por keyset na coluna position"""
+        if limit < 1:
+            raise ValueError(f"Tamanho de página inválido: {limit}")
+        conditions = [condition] if condition else []
+        params = list(params)
+        if event_types:
+            conditions.append("event_type IN (%s)" % ", ".join("?" * len(event_types)))
+            params.extend(event_types)
+
+        sources = self._read_sources(segment_filter)
+        if descending:
+            sources.reverse()
+        order_by = "position DESC" if descending else "position"
+        # Um registro a mais indica se existe uma próxima página
+        rows = list(self._iter_rows(sources, conditions, params, order_by, limit=limit + 1))
+
+        events = [self._row_to_event(row) for row in rows[:limit]]
+        next_position = events[-1]['position'] if len(rows) > limit else None
+        return events, next_position
+
+    def read_all(self, after_position=None, limit=100, event_types=None):
+        """Lê uma página do log global em ordem crescente de position
+
+        Retorna (eventos, next_position); next_position é o cursor a passar
+        como after_position na próxima chamada, ou None na última página.
+        O custo de cada página independe da profundidade.
+        """
+        if after_position is None:
+            return self._read_page(None, (), False, limit, event_types)
+        return self._read_page(
+            "position > ?", (after_position,), False, limit, event_types,
+            lambda segment: segment['last_position'] > after_position
+        )
+
+    def read_all_backwards(self, before_position=None, limit=100, event_types=None):
+        """Lê uma página do log global a partir dos eventos mais recentes
+
+        Retorna (eventos, next_position); next_position é o cursor a passar
+        como before_position na próxima chamada, ou None na última página.
+        """
+        if before_position is None:
+            return self._read_page(None, (), True, limit, event_types)
+        return self._read_page(
+            "position < ?", (before_position,), True, limit, event_types,
+            lambda segment: segment['first_position'] < before_position
+        )
+
+    def get_events_by_type(self, types=None, since=None, until=None, limit=100):
+        """Obtém eventos por tipo e/ou período, em ordem cronológica
+
+        types pode ser um tipo ou uma lista de tipos; since (inclusive) e
+        until (exclusive) aceitam datetime UTC ou microssegundos desde a época.
+        As consultas usam os índices (event_type, timestamp_us) e (timestamp_us).
+        """
+        if isinstance(types, str):
+            types = [types]
+        since_us = to_epoch_us(since) if since is not None else None
+        until_us = to_epoch_us(until) if until is not None else None
+
+        conditions = []
+        params = []
+        if types:
+            conditions.append("event_type IN (%s)" % ", ".join("?" * len(types)))
+            params.extend(types)
+        if since_us is not None:
+            conditions.append("timestamp_us >= ?")
+            params.append(since_us)
+        if until_us is not None:
+            conditions.append("timestamp_us < ?")
+            params.append(until_us)
+
+        def in_range(segment):
+            if since_us is not None and segment['last_timestamp_us'] < since_us:
+                return False
+            if until_us is not None and segment['first_timestamp_us'] >= until_us:
+                return False
+            return True
+
+        sources = self._read_sources(in_range)
+        rows = self._iter_rows(sources, conditions, params, "timestamp_us, position", limit=limit)
+        return [self._row_to_event(row) for row in rows]
+
+    def get_events(self, aggregate_id=None):
+        """Obtém eventos do Event Store, opcionalmente filtrados por aggregate_id"""
+        return list(self.iter_events(aggregate_id))
+
+    def _acquire_lease(self, table, owner, lease, now=None):
+        """Obtém ou renova por lease segundos a concessão guardada em table; False se outro dono a detém"""
+        now_us = to_epoch_us(now or datetime.utcnow())
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
             cursor.execute(
-                "SELECT * FROM events WHERE aggregate_id = ? ORDER BY version",
+                f"INSERT INTO {table} (id, owner, lease_until_us) VALUES (1, ?, ?) "
+                f"ON CONFLICT(id) DO UPDATE SET owner = excluded.owner, lease_until_us = excluded.lease_until_us "
+                f"WHERE {table}.owner = excluded.owner OR {table}.lease_until_us < ?",
+                (owner, now_us + int(lease * 1000000), now_us)
+            )
+            acquired = cursor.rowcount > 0
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return acquired
+
+    def _release_lease(self, table, owner):
+        """Libera a concessão guardada em table, se owner for o dono"""
+        conn = self._get_connection()
+        try:
+            conn.execute(f"DELETE FROM {table} WHERE owner = ?", (owner,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def acquire_outbox_lease(self, owner, lease=30.0, now=None):
+        """Obtém ou renova por lease segundos a concessão do relay; False se outro dono a detém"""
+        return self._acquire_lease('outbox_relay', owner, lease, now)
+
+    def release_outbox_lease(self, owner):
+        """Libera a concessão do relay, se owner for o dono, para outro processo assumir logo"""
+        self._release_lease('outbox_relay', owner)
+
+    def fetch_outbox(self, limit=100, owner=None, lease=30.0):
+        """Obtém, em ordem de position, até limit eventos do outbox ainda não publicados
+
+        Com owner, só devolve eventos se owner detiver (ou obtiver) a
+        concessão do relay: com vários processos, cada evento é publicado
+        por um único relay, na ordem do log.
+        """
+        if owner is not None and not self.acquire_outbox_lease(owner, lease):
+            return []
+        with self._read_pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT events.* FROM outbox JOIN events ON events.position = outbox.position "
+                "WHERE outbox.sent_at_us IS NULL ORDER BY outbox.position LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [self._row_to_event(row) for row in rows]
+
+    def mark_outbox_sent(self, positions):
+        """Marca como publicados os eventos do outbox com as positions informadas"""
+        if not positions:
+            return
+        conn = self._get_connection()
+        try:
+            conn.executemany(
+                "UPDATE outbox SET sent_at_us = ? WHERE position = ?",
+                [(to_epoch_us(datetime.utcnow()), position) for position in positions]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def purge_outbox(self, older_than=3600, now=None):
+        """Remove do outbox as linhas publicadas há mais de older_than segundos"""
+        cutoff = to_epoch_us((now or datetime.utcnow()) - timedelta(seconds=older_than))
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute("DELETE FROM outbox WHERE sent_at_us < ?", (cutoff,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return cursor.rowcount
+
+    def outbox_stats(self, now=None):
+        """Atraso do outbox: eventos pendentes e idade, em segundos, do mais antigo deles"""
+        with self._read_pool.connection() as conn:
+            pending, oldest_us, oldest_position = conn.execute(
+                "SELECT COUNT(*), MIN(created_at_us), MIN(position) FROM outbox WHERE sent_at_us IS NULL"
+            ).fetchone()
+            last_sent = conn.execute(
+                "SELECT MAX(position) FROM outbox WHERE sent_at_us IS NOT NULL"
+            ).fetchone()[0]
+        now_us = to_epoch_us(now or datetime.utcnow())
+        return {
+            'pending': pending,
+            'oldest_pending_position': oldest_position,
+            'last_sent_position': last_sent,
+            'lag_seconds': (now_us - oldest_us) / 1000000 if oldest_us is not None else 0.0
+        }
+
+    def save_snapshot(self, aggregate_id, version, state):
+        """Grava o snapshot de um agregado, mantendo apenas o mais recente"""
+        conn = self._get_connection()
+        try:
+            conn.execute(
+                "INSERT INTO snapshots (aggregate_id, version, state, timestamp) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(aggregate_id) DO UPDATE SET "
+                "version = excluded.version, state = excluded.state, timestamp = excluded.timestamp "
+                "WHERE excluded.version > snapshots.version",
+                (aggregate_id, version, json.dumps(state), datetime.utcnow().isoformat())
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def get_snapshot(self, aggregate_id):
+        """Obtém o snapshot mais recente de um agregado, ou None"""
+        with self._read_pool.connection() as conn:
+            row = conn.execute(
+                "SELECT aggregate_id, version, state, timestamp FROM snapshots WHERE aggregate_id = ?",
+                (aggregate_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        snapshot = dict(row)
+        snapshot['state'] = json.loads(snapshot['state'])
+        return snapshot
+
+    def _load_segments(self):
+        """Lê o catálogo de segmentos selados, em ordem de position"""
+        with self._read_pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT name, path, first_position, last_position, first_timestamp_us, "
+                "last_timestamp_us, event_count, sealed_at_us FROM segments ORDER BY first_position"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _sealed_version(self, aggregate_id):
+        """Última versão de um agregado contida em segmentos selados (0 se nenhuma)"""
+        if not self._segmented:
+            return 0
+        with self._read_pool.connection() as conn:
+            row = conn.execute(
+                "SELECT version FROM aggregate_versions WHERE aggregate_id = ?",
                 (aggregate_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def _segment_path(self, path):
+        """Resolve o caminho de um segmento, gravado relativo ao banco principal"""
+        return os.path.join(os.path.dirname(os.path.abspath(self.db_path)), path)
+
+    def _get_segment_connection(self, path):
+        """Obtém a conexão somente leitura da thread atual para um segmento selado"""
+        segments = getattr(self._local, 'segments', None)
+        if segments is None:
+            segments = self._local.segments = {}
+
+        conn = segments.get(path)
+        if conn is None:
+            # Segmentos selados nunca mudam: immutable=1 dispensa locks e a verificação de alterações
+            uri = 'file:' + urllib.request.pathname2url(self._segment_path(path)) + '?mode=ro&immutable=1'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            segments[path] = conn
+            self._register_connection(conn)
+        return conn
+
+    def _read_sources(self, segment_filter=None):
+        """Lista as fontes de leitura em ordem de position: segmentos selados e, por fim, o banco principal
+
+        Cada fonte é (conexão, condição extra); o banco principal tem conexão
+        None e é lido pelo pool de leitura. Nele a condição ignora linhas já
+        copiadas para segmentos mas ainda não removidas.
+        """
+        if not self._segmented:
+            return [(None, None)]
+
+        segments = self._load_segments()
+        sources = [
+            (self._get_segment_connection(segment['path']), None)
+            for segment in segments
+            if segment_filter is None or segment_filter(segment)
+        ]
+        sealed_upto = segments[-1]['last_position'] if segments else 0
+        sources.append((None, ("position > ?", sealed_upto) if sealed_upto else None))
+        return sources
+
+    def _period_start(self, moment):
+        """Início do período de segmento que contém moment"""
+        if self.segment_period == 'day':
+            return datetime(moment.year, moment.month, moment.day)
+        return datetime(moment.year, moment.month, 1)
+
+    def _next_period(self, start):
+        """Início do período seguinte a start"""
+        if self.segment_period == 'day':
+            return start + timedelta(days=1)
+        return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+    def roll_segments(self, now=None):
+        """Copia os eventos de períodos encerrados para segmentos somente leitura
+
+        Retorna os nomes dos segmentos selados. As linhas copiadas só saem do
+        banco principal em purge_sealed_events, após segment_grace segundos,
+        para que leituras em andamento não percam eventos.
+        """
+        if not self.segment_period:
+            return []
+
+        now = now or datetime.utcnow()
+        cutoff_us = to_epoch_us(self._period_start(now))
+        conn = self._get_connection()
+        sealed = []
+
+        with self._roll_lock:
+            while True:
+                segments = self._load_segments()
+                sealed_upto = segments[-1]['last_position'] if segments else 0
+                row = conn.execute(
+                    "SELECT timestamp_us FROM events WHERE position > ? ORDER BY position LIMIT 1",
+                    (sealed_upto,)
+                ).fetchone()
+                if row is None or row[0] >= cutoff_us:
+                    break
+
+                # Um segmento por período, cobrindo um intervalo contínuo de positions
+                start = self._period_start(datetime.utcfromtimestamp(row[0] / 1000000))
+                end_us = to_epoch_us(self._next_period(start))
+                last_position = conn.execute(
+                    "SELECT MAX(position) FROM events WHERE position > ? AND timestamp_us < ?",
+                    (sealed_upto, end_us)
+                ).fetchone()[0]
+
+                name = start.strftime('%Y-%m-%d' if self.segment_period == 'day' else '%Y-%m')
+                if any(segment['name'] == name for segment in segments):
+                    name = f"{name}-{sealed_upto + 1}"
+                self._seal_segment(conn, name, sealed_upto, last_position)
+                sealed.append(name)
+
+        if sealed:
+            self._segmented = True
+        return sealed
+
+    def _seal_segment(self, conn, name, after_position, last_position):
+        """Copia as linhas (after_position, last_position] para um novo segmento e o registra no catálogo"""
+        base = os.path.splitext(os.path.basename(self.db_path))[0]
+        path = f"{base}-{name}.db"
+        full_path = self._segment_path(path)
+
+        segment = sqlite3.connect(full_path)
+        segment.execute(EVENTS_TABLE_SQL)
+        for statement in SEGMENT_INDEXES_SQL:
+            segment.execute(statement)
+        segment.commit()
+        segment.close()
+
+        conn.execute("ATTACH DATABASE ? AS segment", (full_path,))
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                f"INSERT INTO segment.events ({EVENT_COLUMNS}) "
+                f"SELECT {EVENT_COLUMNS} FROM main.events WHERE position > ? AND position <= ?",
+                (after_position, last_position)
             )
-        else:
-            cursor.execute("SELECT * FROM events ORDER BY timestamp")
-            
-        events = []
-        for row in cursor.fetchall():
-            event = dict(row)
-            event['data'] = json.loads(event['data'])
-            events.append(event)
-            
-        conn.close()
-        return events
+            cursor.execute(
+                "INSERT INTO aggregate_versions (aggregate_id, version) "
+                "SELECT aggregate_id, MAX(version) FROM main.events "
+                "WHERE position > ? AND position <= ? GROUP BY aggregate_id "
+                "ON CONFLICT(aggregate_id) DO UPDATE SET "
+                "version = MAX(aggregate_versions.version, excluded.version)",
+                (after_position, last_position)
+            )
+            cursor.execute(
+                "SELECT COUNT(*), MIN(timestamp_us), MAX(timestamp_us) FROM main.events "
+                "WHERE position > ? AND position <= ?",
+                (after_position, last_position)
+            )
+            count, first_us, last_us = cursor.fetchone()
+            cursor.execute(
+                "INSERT INTO segments (name, path, first_position, last_position, first_timestamp_us, "
+                "last_timestamp_us, event_count, sealed_at_us) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, path, after_position + 1, last_position, first_us, last_us, count,
+                 to_epoch_us(datetime.utcnow()))
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE segment")
+
+        # Segmentos selados nunca mais são escritos
+        os.chmod(full_path, 0o444)
+        print(f"Segmento {name} selado com {count} eventos em {path}")
+
+    def purge_sealed_events(self, now=None):
+        """Remove do banco principal as linhas seladas há mais de segment_grace segundos
+
+        Linhas ainda pendentes no outbox (e as seguintes) ficam até serem
+        publicadas, pois fetch_outbox lê apenas o banco principal.
+        """
+        now_us = to_epoch_us(now or datetime.utcnow())
+        conn = self._get_connection()
+        row = conn.execute(
+            "SELECT MAX(last_position) FROM segments WHERE sealed_at_us <= ?",
+            (now_us - int(self.segment_grace * 1000000),)
+        ).fetchone()
+        if not row or row[0] is None:
+            return 0
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT MIN(position) FROM outbox WHERE sent_at_us IS NULL")
+            pending = cursor.fetchone()[0]
+            upto = row[0] if pending is None else min(row[0], pending - 1)
+            cursor.execute("DELETE FROM events WHERE position <= ?", (upto,))
+            purged = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return purged
+
+    def _has_tombstones(self):
+        with self._read_pool.connection() as conn:
+            return conn.execute("SELECT 1 FROM tombstones LIMIT 1").fetchone() is not None
+
+    def get_tombstone(self, aggregate_id):
+        """Obtém a lápide de um agregado excluído e compactado (ou em compactação), ou None"""
+        with self._read_pool.connection() as conn:
+            row = conn.execute("SELECT * FROM tombstones WHERE aggregate_id = ?", (aggregate_id,)).fetchone()
+        return dict(row) if row else None
+
+    def _tombstone_deleted(self, cutoff_us):
+        """Cria lápides para os agregados cujo último evento é uma exclusão anterior a cutoff_us"""
+        placeholders = ', '.join('?' for _ in DELETION_EVENT_TYPES)
+        conditions = [f"event_type IN ({placeholders})", "timestamp_us >= ?", "timestamp_us < ?"]
+        params = list(DELETION_EVENT_TYPES) + [self._compaction_scanned_upto, cutoff_us]
+        sources = self._read_sources(lambda segment: (segment['last_timestamp_us'] or 0) >=
+                                     self._compaction_scanned_upto)
+        candidates = [
+            (row['aggregate_id'], row['event_type'], row['version'], row['timestamp_us'])
+            for row in self._iter_rows(sources, conditions, params, "position")
+        ]
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        created = 0
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for aggregate_id, event_type, version, deleted_at_us in candidates:
+                cursor.execute("SELECT 1 FROM tombstones WHERE aggregate_id = ?", (aggregate_id,))
+                if cursor.fetchone() is not None:
+                    continue
+                # Agregados com eventos posteriores à exclusão não são compactados
+                if self._current_version(cursor, aggregate_id) != version:
+                    continue
+                cursor.execute(
+                    "INSERT INTO tombstones (aggregate_id, event_type, version, deleted_at_us) "
+                    "VALUES (?, ?, ?, ?)",
+                    (aggregate_id, event_type, version, deleted_at_us)
+                )
+                created += 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self._compaction_scanned_upto = cutoff_us
+        if created:
+            self._tombstoned = True
+        return created
+
+    def _pending_in_segment(self, segment, pending):
+        """Agregados pendentes de compactação que ainda têm eventos no segmento"""
+        conn = self._get_segment_connection(segment['path'])
+        found = set()
+        for start in range(0, len(pending), 500):
+            chunk = pending[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            found.update(row[0] for row in conn.execute(
+                f"SELECT DISTINCT aggregate_id FROM events WHERE aggregate_id IN ({placeholders})", chunk
+            ))
+        return found
+
+    def _rewrite_segment(self, segment):
+        """Regrava um segmento selado sem os eventos dos agregados com lápide
+
+        A cópia é feita fora de qualquer transação do banco principal; apenas
+        a troca do caminho no catálogo (e a contabilização nas lápides) é uma
+        transação curta. Retorna os bytes liberados em disco, ou None se outro
+        processo já tiver regravado o segmento.
+        """
+        conn = self._get_connection()
+        row = conn.execute("SELECT path FROM segments WHERE name = ?", (segment['name'],)).fetchone()
+        if row is None or row[0] != segment['path']:
+            return None
+
+        old_path = self._segment_path(segment['path'])
+        base = os.path.splitext(os.path.basename(self.db_path))[0]
+        path = f"{base}-{segment['name']}-c{to_epoch_us(datetime.utcnow())}.db"
+        full_path = self._segment_path(path)
+
+        compacted = sqlite3.connect(full_path)
+        compacted.execute(EVENTS_TABLE_SQL)
+        for statement in SEGMENT_INDEXES_SQL:
+            compacted.execute(statement)
+        compacted.commit()
+        compacted.close()
+
+        try:
+            # Somente leitura: se o arquivo já foi removido, o ATTACH falha em vez de criá-lo vazio
+            conn.execute("ATTACH DATABASE ? AS segment",
+                         ('file:' + urllib.request.pathname2url(old_path) + '?mode=ro',))
+            try:
+                conn.execute("ATTACH DATABASE ? AS compacted", (full_path,))
+                try:
+                    swapped, removed = self._copy_compacted(conn, segment, path)
+                finally:
+                    conn.execute("DETACH DATABASE compacted")
+            finally:
+                conn.execute("DETACH DATABASE segment")
+        except Exception:
+            os.remove(full_path)
+            raise
+        if not swapped:
+            os.remove(full_path)
+            return None
+
+        os.chmod(full_path, 0o444)
+        reclaimed = os.path.getsize(old_path) - os.path.getsize(full_path)
+        # Leituras em andamento mantêm o arquivo antigo aberto; novas leituras já usam o novo
+        try:
+            os.remove(old_path)
+        except OSError as e:
+            print(f"Erro ao remover o segmento compactado {segment['path']}: {e}")
+        print(f"Segmento {segment['name']} compactado: {reclaimed} bytes liberados")
+        return reclaimed
+
+    def _copy_compacted(self, conn, segment, path):
+        """Copia o segmento anexado sem os agregados com lápide e troca o caminho no catálogo
+
+        Retorna (trocado, [(aggregate_id, eventos, bytes) removidos]); a troca só
+        acontece se o catálogo ainda apontar para o segmento copiado.
+        """
+        try:
+            # Segmentos selados antes da coluna schema_version não a possuem
+            columns = [row[1] for row in conn.execute("PRAGMA segment.table_info(events)")]
+            copied = ', '.join(column for column in EVENT_COLUMNS.split(', ') if column in columns)
+            removed = conn.execute(
+                f"SELECT aggregate_id, COUNT(*), SUM({ROW_BYTES_SQL}) FROM segment.events "
+                "WHERE aggregate_id IN (SELECT aggregate_id FROM main.tombstones) GROUP BY aggregate_id"
+            ).fetchall()
+            conn.execute(
+                f"INSERT INTO compacted.events ({copied}) SELECT {copied} FROM segment.events "
+                "WHERE aggregate_id NOT IN (SELECT aggregate_id FROM main.tombstones) ORDER BY position"
+            )
+            conn.commit()
+
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                "UPDATE segments SET path = ?, event_count = event_count - ? WHERE name = ? AND path = ?",
+                (path, sum(row[1] for row in removed), segment['name'], segment['path'])
+            )
+            swapped = cursor.rowcount > 0
+            if swapped:
+                cursor.executemany(
+                    "UPDATE tombstones SET events_removed = events_removed + ?, "
+                    "bytes_removed = bytes_removed + ? WHERE aggregate_id = ?",
+                    [(count, size, aggregate_id) for aggregate_id, count, size in removed]
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return swapped, removed
+
+    def _finish_tombstones(self, aggregate_ids):
+        """Remove do banco principal os eventos dos agregados e conclui as lápides"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        events_removed = 0
+        bytes_removed = 0
+        now_us = to_epoch_us(datetime.utcnow())
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for aggregate_id in aggregate_ids:
+                cursor.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM({ROW_BYTES_SQL}), 0) FROM events WHERE aggregate_id = ?",
+                    (aggregate_id,)
+                )
+                count, size = cursor.fetchone()
+                cursor.execute(
+                    "DELETE FROM outbox WHERE position IN (SELECT position FROM events WHERE aggregate_id = ?)",
+                    (aggregate_id,)
+                )
+                cursor.execute("DELETE FROM events WHERE aggregate_id = ?", (aggregate_id,))
+                cursor.execute("DELETE FROM snapshots WHERE aggregate_id = ?", (aggregate_id,))
+                # A versão continua reservada: um evento posterior recebe a versão seguinte à exclusão
+                cursor.execute(
+                    "INSERT INTO aggregate_versions (aggregate_id, version) "
+                    "SELECT aggregate_id, version FROM tombstones WHERE aggregate_id = ? "
+                    "ON CONFLICT(aggregate_id) DO UPDATE SET "
+                    "version = MAX(aggregate_versions.version, excluded.version)",
+                    (aggregate_id,)
+                )
+                cursor.execute(
+                    "UPDATE tombstones SET compacted_at_us = ?, events_removed = events_removed + ?, "
+                    "bytes_removed = bytes_removed + ? WHERE aggregate_id = ?",
+                    (now_us, count, size, aggregate_id)
+                )
+                events_removed += count
+                bytes_removed += size
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return events_removed, bytes_removed
+
+    def acquire_compaction_lease(self, owner, lease=300.0, now=None):
+        """Obtém ou renova por lease segundos a concessão da compactação; False se outro dono a detém"""
+        return self._acquire_lease('compactor', owner, lease, now)
+
+    def release_compaction_lease(self, owner):
+        """Libera a concessão da compactação, se owner for o dono"""
+        self._release_lease('compactor', owner)
+
+    def compact_deleted_aggregates(self, older_than_days=30, now=None, batch_size=100,
+                                   owner=None, lease=300.0):
+        """Executa um passo da compactação dos agregados excluídos há mais de older_than_days dias
+
+        Cada agregado compactado perde todo o histórico e fica apenas com uma
+        lápide (tipo e versão da exclusão). Segmentos selados são regravados
+        sem esses eventos, um por passo e do mais antigo ao mais recente; as
+        linhas do banco principal, que contêm a exclusão, saem por último,
+        para que um replay nunca veja um agregado excluído sem sua exclusão.
+        Com owner, o passo só é executado se owner detiver (ou obtiver) a
+        concessão da compactação: com vários processos, um compacta por vez.
+        Retorna o que foi feito no passo; 'more' indica que há trabalho pendente.
+        """
+        now = now or datetime.utcnow()
+        cutoff_us = to_epoch_us(now - timedelta(days=older_than_days))
+        result = {
+            'tombstoned': 0,
+            'compacted': 0,
+            'events_removed': 0,
+            'bytes_removed': 0,
+            'segments_rewritten': 0,
+            'segment_bytes_reclaimed': 0
+        }
+        if owner is not None and not self.acquire_compaction_lease(owner, lease):
+            result['more'] = False
+            return result
+        result['tombstoned'] = self._tombstone_deleted(cutoff_us)
+
+        with self._read_pool.connection() as conn:
+            pending = [row[0] for row in conn.execute(
+                "SELECT aggregate_id FROM tombstones WHERE compacted_at_us IS NULL"
+            )]
+        if not pending:
+            result['more'] = False
+            return result
+
+        in_segments = set()
+        if self._segmented:
+            with self._roll_lock:
+                for segment in self._load_segments():
+                    found = self._pending_in_segment(segment, pending)
+                    if found and not result['segments_rewritten']:
+                        reclaimed = self._rewrite_segment(segment)
+                        # None: outro processo regravou o segmento; será reavaliado no próximo passo
+                        if reclaimed is not None:
+                            result['segment_bytes_reclaimed'] += reclaimed
+                            result['segments_rewritten'] += 1
+                            continue
+                    in_segments.update(found)
+
+        ready = [aggregate_id for aggregate_id in pending if aggregate_id not in in_segments][:batch_size]
+        if ready:
+            result['events_removed'], result['bytes_removed'] = self._finish_tombstones(ready)
+            result['compacted'] = len(ready)
+        result['more'] = len(pending) > len(ready)
+        return result
+
+    def compaction_stats(self):
+        """Totais da compactação: agregados com lápide, eventos e bytes removidos e espaço livre no banco"""
+        with self._read_pool.connection() as conn:
+            tombstones, compacted, events_removed, bytes_removed = conn.execute(
+                "SELECT COUNT(*), COUNT(compacted_at_us), COALESCE(SUM(events_removed), 0), "
+                "COALESCE(SUM(bytes_removed), 0) FROM tombstones"
+            ).fetchone()
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return {
+            'tombstones': tombstones,
+            'compacted': compacted,
+            'pending': tombstones - compacted,
+            'events_removed': events_removed,
+            'bytes_removed': bytes_removed,
+            # Páginas livres são reutilizadas pelas próximas escritas sem aumentar o arquivo
+            'free_bytes': page_size * free_pages
+        }
+
+    def _maybe_maintain_segments(self):
+        """Dispara a rotação de segmentos em segundo plano quando um período se encerra"""
+        if not self.segment_period or time.time() < self._next_maintenance:
+            return
+
+        with self._segment_lock:
+            if self._maintenance_thread is not None and self._maintenance_thread.is_alive():
+                return
+            self._next_maintenance = float('inf')
+            self._maintenance_thread = threading.Thread(target=self._maintain_segments)
+            self._maintenance_thread.daemon = True
+            self._maintenance_thread.start()
+
+    def _maintain_segments(self):
+        """Sela os períodos encerrados, remove linhas já seladas e agenda a próxima execução"""
+        retry = False
+        try:
+            retry = bool(self.roll_segments())
+            self.purge_sealed_events()
+        except Exception as e:
+            retry = True
+            print(f"Erro na manutenção dos segmentos do Event Store: {e}")
+
+        next_period = self._next_period(self._period_start(datetime.utcnow()))
+        next_run = to_epoch_us(next_period) / 1000000
+        if retry:
+            # Voltar após o período de carência para remover as linhas recém-seladas (ou tentar de novo)
+            next_run = min(next_run, time.time() + self.segment_grace)
+        self._next_maintenance = next_run
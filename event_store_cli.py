@@ -0,0 +1,130 @@
+"""Exportação e importação do Event Store em JSONL (um evento por linha).
+
+Uso:
+    python event_store_cli.py export eventos.jsonl.gz [--db events.db] [--from-position N] [--to-position N]
+    python event_store_cli.py import eventos.jsonl.gz [--db events.db] [--batch-size 5000] [--skip-existing]
+
+Arquivos terminados em .gz são comprimidos com gzip; '-' usa stdin/stdout.
+A memória usada não depende do tamanho do log: a exportação percorre o
+Event Store com iter_events e a importação grava em lotes de batch_size
+eventos, um por transação.
+"""
+import argparse
+import gzip
+import io
+import json
+import sys
+import time
+from event_store import ConcurrencyError, EventStore
+
+# Campos exportados de cada evento
+# data é exportado já convertido para a versão atual (schema_version)
+EXPORT_FIELDS = ('position', 'id', 'aggregate_id', 'event_type', 'data', 'timestamp', 'timestamp_us',
+                 'version', 'schema_version')
+
+def open_jsonl(path, mode):
+    """Abre um arquivo JSONL em modo texto ('r' ou 'w'), com gzip se terminar em .gz"""
+    if path == '-':
+        stream = sys.stdin.buffer if mode == 'r' else sys.stdout.buffer
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    if path.endswith('.gz'):
+        # Nível 6: bem mais rápido que o padrão (9) com compressão quase igual
+        return gzip.open(path, mode + 't', encoding='utf-8', compresslevel=6)
+    return open(path, mode, encoding='utf-8')
+
+class Progress:
+    """Mostra no stderr a quantidade de eventos processados e a vazão"""
+
+    def __init__(self, label, every=100000):
+        self.label = label
+        self.every = every
+        self.count = 0
+        self.start = time.perf_counter()
+
+    def add(self, count):
+        before = self.count
+        self.count += count
+        if self.count // self.every > before // self.every:
+            self.report()
+
+    def report(self, final=False):
+        elapsed = time.perf_counter() - self.start
+        rate = self.count / elapsed if elapsed else 0.0
+        status = 'Concluído' if final else 'Em andamento'
+        print(f"{status} ({self.label}): {self.count} eventos em {elapsed:.1f}s ({rate:.0f} eventos/s)",
+              file=sys.stderr)
+
+def export_events(store, path, from_position=None, to_position=None):
+    """Exporta os eventos (opcionalmente um intervalo de positions, inclusive) para JSONL"""
+    progress = Progress('exportação')
+    with open_jsonl(path, 'w') as output:
+        for event in store.iter_events(from_position=from_position):
+            if to_position is not None and event['position'] > to_position:
+                break
+            output.write(json.dumps({field: event.get(field) for field in EXPORT_FIELDS},
+                                    separators=(',', ':')))
+            output.write('\n')
+            progress.add(1)
+    progress.report(final=True)
+    return progress.count
+
+def _read_batches(input_file, batch_size):
+    batch = []
+    for line in input_file:
+        if line.strip():
+            batch.append(json.loads(line))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def import_events(store, path, batch_size=5000, skip_existing=False):
+    """Importa eventos de um JSONL em transações de batch_size eventos, verificando as versões"""
+    progress = Progress('importação')
+    with open_jsonl(path, 'r') as input_file:
+        for batch in _read_batches(input_file, batch_size):
+            try:
+                store.import_events(batch, skip_existing=skip_existing)
+            except ConcurrencyError as e:
+                print(f"Erro de versão ao importar o lote iniciado na position {batch[0].get('position')}: {e}",
+                      file=sys.stderr)
+                print(f"{progress.count} eventos já importados foram mantidos; "
+                      f"use --skip-existing para retomar.", file=sys.stderr)
+                raise
+            progress.add(len(batch))
+    progress.report(final=True)
+    return progress.count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Exporta e importa o Event Store em JSONL')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Exporta eventos para JSONL')
+    export_parser.add_argument('path', help="arquivo de saída (.jsonl, .jsonl.gz ou '-')")
+    export_parser.add_argument('--db', default='events.db')
+    export_parser.add_argument('--from-position', type=int)
+    export_parser.add_argument('--to-position', type=int)
+
+    import_parser = subparsers.add_parser('import', help='Importa eventos de um JSONL')
+    import_parser.add_argument('path', help="arquivo de entrada (.jsonl, .jsonl.gz ou '-')")
+    import_parser.add_argument('--db', default='events.db')
+    import_parser.add_argument('--batch-size', type=int, default=5000)
+    import_parser.add_argument('--skip-existing', action='store_true',
+                               help='ignora eventos cuja versão já existe no destino')
+
+    args = parser.parse_args(argv)
+    store = EventStore(args.db)
+    try:
+        if args.command == 'export':
+            export_events(store, args.path, args.from_position, args.to_position)
+        else:
+            import_events(store, args.path, args.batch_size, args.skip_existing)
+    except ConcurrencyError:
+        return 1
+    finally:
+        store.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""Verificação de integridade do Event Store em paralelo.
+
+Uso:
+    python event_store_verify.py [--db events.db] [--workers N] [--block-size 100000]
+                                 [--hash-chain] [--max-findings 1000] [--output relatorio.json]
+
+O log é dividido em blocos consecutivos de block-size eventos (as
+positions podem ter lacunas, como nos shards), verificados por um pool de processos (um por núcleo, por padrão). Cada
+bloco confere a continuidade das versões de cada agregado, decodifica (e
+converte para a versão atual) cada payload e resume os ids para detectar
+duplicatas entre o banco principal e os segmentos selados. O processo
+principal junta os blocos em ordem de position. Agregados excluídos e
+compactados (tabela tombstones) podem recomeçar depois da versão da lápide.
+
+Com --hash-chain, cada bloco calcula um hash encadeado (SHA-256) das linhas
+gravadas, e os blocos são encadeados em um hash final. Como os blocos têm
+tamanho fixo, o resultado não depende da quantidade de processos; blocos
+já verificados numa execução anterior mantêm o mesmo hash enquanto o log
+não for alterado.
+
+O relatório é um JSON no stdout (ou em --output); o código de saída é 0
+se nenhum problema foi encontrado e 1 caso contrário. Em um Event Store
+dividido em shards, verifique cada arquivo events-shardN.db.
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import time
+import urllib.request
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from event_codecs import EventCodecs
+from event_upcasters import default_upcasters
+
+# Colunas de cada linha incluídas no hash encadeado, nesta ordem, antes do payload
+HASH_COLUMNS = ('position', 'id', 'aggregate_id', 'event_type', 'version', 'timestamp', 'codec')
+
+# Codecs e upcasters de cada processo do pool, criados na primeira tarefa
+_decoders = None
+
+def _connect(path, immutable=False):
+    """Abre uma conexão somente leitura (segmentos selados com immutable=1)"""
+    uri = 'file:' + urllib.request.pathname2url(os.path.abspath(path)) + '?mode=ro'
+    if immutable:
+        uri += '&immutable=1'
+    conn = sqlite3.connect(uri, uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _id_digest(event_id):
+    """Resumo de 64 bits de um id, usado na busca de duplicatas"""
+    return int.from_bytes(hashlib.blake2b(event_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def _hash_row(chain, row):
+    """Acrescenta ao hash encadeado a linha como gravada (colunas e payload com seu tamanho)"""
+    data = row['data']
+    payload = data.encode('utf-8') if isinstance(data, str) else bytes(data)
+    header = '\x1f'.join([str(row[column]) for column in HASH_COLUMNS] + [str(len(payload))])
+    chain.update(header.encode('utf-8'))
+    chain.update(b'\n')
+    chain.update(payload)
+
+def list_sources(db_path):
+    """Lista as fontes do log e as lápides: ([(caminho, imutável, primeira, última)], {aggregate_id: (versão, compactada)})
+
+    As fontes vêm em ordem de position. Um agregado com lápide perdeu os
+    eventos até a versão da lápide (todos, se a compactação já terminou;
+    parte deles, se ainda está pendente).
+    """
+    conn = _connect(db_path)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        segments = []
+        if 'segments' in tables:
+            segments = conn.execute(
+                "SELECT path, first_position, last_position FROM segments ORDER BY first_position"
+            ).fetchall()
+        tombstones = {}
+        if 'tombstones' in tables:
+            tombstones = {
+                aggregate_id: (version, compacted_at_us is not None)
+                for aggregate_id, version, compacted_at_us in conn.execute(
+                    "SELECT aggregate_id, version, compacted_at_us FROM tombstones"
+                )
+            }
+        last_position = conn.execute("SELECT MAX(position) FROM events").fetchone()[0] or 0
+    finally:
+        conn.close()
+
+    base_dir = os.path.dirname(os.path.abspath(db_path))
+    sources = [(os.path.join(base_dir, path), True, first, last) for path, first, last in segments]
+    # Linhas já copiadas para segmentos mas ainda não removidas do banco principal são ignoradas
+    sealed_upto = segments[-1][2] if segments else 0
+    if last_position > sealed_upto:
+        sources.append((db_path, False, sealed_upto + 1, last_position))
+    return sources, tombstones
+
+def split_blocks(sources, block_size):
+    """Gera os blocos de até block_size eventos, em ordem de position: (primeira, última)
+
+    Os limites seguem as linhas gravadas, e não o intervalo de positions, que
+    pode ser esparso (nos shards as positions não são contíguas).
+    """
+    start, missing = 1, block_size
+    for path, immutable, first, last in sources:
+        conn = _connect(path, immutable)
+        try:
+            low = first
+            while low <= last:
+                row = conn.execute(
+                    "SELECT position FROM events WHERE position BETWEEN ? AND ? ORDER BY position LIMIT 1 OFFSET ?",
+                    (low, last, missing - 1)
+                ).fetchone()
+                if row is None:
+                    # O restante da fonte não completa o bloco, que continua na próxima
+                    missing -= conn.execute(
+                        "SELECT COUNT(*) FROM events WHERE position BETWEEN ? AND ?", (low, last)
+                    ).fetchone()[0]
+                    break
+                yield start, row[0]
+                start = low = row[0] + 1
+                missing = block_size
+        finally:
+            conn.close()
+    if missing < block_size:
+        yield start, sources[-1][3]
+
+def verify_block(sources, first, last, hash_chain=False):
+    """Verifica as positions de first a last (inclusive); executado em um processo do pool"""
+    global _decoders
+    if _decoders is None:
+        _decoders = (EventCodecs(), default_upcasters(cache_size=0))
+    codecs, upcasters = _decoders
+
+    findings = []
+    # aggregate_id -> [primeira versão, position da primeira versão, última versão]
+    aggregates = {}
+    digests = array('Q')
+    chain = hashlib.sha256() if hash_chain else None
+    count = 0
+
+    for path, immutable, source_first, source_last in sources:
+        low, high = max(first, source_first), min(last, source_last)
+        if low > high:
+            continue
+        conn = _connect(path, immutable)
+        try:
+            cursor = conn.execute(
+                "SELECT * FROM events WHERE position BETWEEN ? AND ? ORDER BY position", (low, high)
+            )
+            # Segmentos selados antes da coluna schema_version não a possuem
+            has_schema_version = 'schema_version' in [column[0] for column in cursor.description]
+            for row in cursor:
+                position, event_id, aggregate_id = row['position'], row['id'], row['aggregate_id']
+                version, codec = row['version'], row['codec']
+                count += 1
+                digests.append(_id_digest(event_id))
+                if chain is not None:
+                    _hash_row(chain, row)
+
+                try:
+                    upcasters.upcast({
+                        'id': None,
+                        'event_type': row['event_type'],
+                        'data': codecs.decode(codec, row['data']),
+                        'schema_version': row['schema_version'] if has_schema_version else 1
+                    })
+                except Exception as e:
+                    findings.append({'type': 'undecodable', 'position': position, 'id': event_id,
+                                     'aggregate_id': aggregate_id, 'codec': codec, 'error': str(e)})
+
+                state = aggregates.get(aggregate_id)
+                if state is None:
+                    aggregates[aggregate_id] = [version, position, version]
+                    continue
+                expected = state[2] + 1
+                if version != expected:
+                    findings.append({
+                        'type': 'version_gap' if version > expected else 'version_out_of_order',
+                        'position': position, 'aggregate_id': aggregate_id,
+                        'expected_version': expected, 'version': version
+                    })
+                state[2] = max(state[2], version)
+        finally:
+            conn.close()
+
+    digests = array('Q', sorted(digests))
+    return {
+        'first': first,
+        'last': last,
+        'count': count,
+        'findings': findings,
+        'aggregates': aggregates,
+        'digests': digests,
+        'hash': chain.hexdigest() if chain is not None else None
+    }
+
+def find_ids(sources, first, last, digests):
+    """Obtém (position, id) das linhas do bloco cujos ids têm um dos resumos informados"""
+    found = []
+    for path, immutable, source_first, source_last in sources:
+        low, high = max(first, source_first), min(last, source_last)
+        if low > high:
+            continue
+        conn = _connect(path, immutable)
+        try:
+            for position, event_id in conn.execute(
+                "SELECT position, id FROM events WHERE position BETWEEN ? AND ? ORDER BY position",
+                (low, high)
+            ):
+                if _id_digest(event_id) in digests:
+                    found.append((position, event_id))
+        finally:
+            conn.close()
+    return found
+
+def _duplicate_digests(blocks):
+    """Resumos que aparecem mais de uma vez, com um k-way merge das listas ordenadas dos blocos"""
+    duplicates = set()
+    previous = None
+    for digest in heapq.merge(*blocks):
+        if digest == previous:
+            duplicates.add(digest)
+        previous = digest
+    return duplicates
+
+def verify(db_path, workers=None, block_size=100000, hash_chain=False, max_findings=1000):
+    """Verifica o Event Store em db_path e retorna o relatório (dict serializável em JSON)"""
+    start = time.perf_counter()
+    sources, tombstones = list_sources(db_path)
+    last_position = sources[-1][3] if sources else 0
+    blocks = []
+    workers = workers or os.cpu_count() or 1
+
+    findings = []
+    last_versions = {}
+    block_digests = []
+    block_hashes = []
+    count = 0
+    chain = hashlib.sha256() if hash_chain else None
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Os blocos são enviados ao pool à medida que seus limites são encontrados
+        futures = []
+        for first, last in split_blocks(sources, block_size):
+            blocks.append((first, last))
+            futures.append(executor.submit(verify_block, sources, first, last, hash_chain))
+        results = (future.result() for future in futures)
+        # Os resultados chegam em ordem de position: a continuidade entre blocos é conferida aqui
+        for result in results:
+            count += result['count']
+            findings.extend(result['findings'])
+            block_digests.append(result['digests'])
+            for aggregate_id, (first_version, position, block_last) in result['aggregates'].items():
+                expected = last_versions.get(aggregate_id, 0) + 1
+                if aggregate_id not in last_versions and aggregate_id in tombstones:
+                    version, compacted = tombstones[aggregate_id]
+                    if compacted:
+                        # Um agregado compactado recomeça depois da versão da lápide
+                        expected = version + 1
+                    elif first_version <= version + 1:
+                        # Compactação pendente: o início do histórico pode já ter saído dos segmentos
+                        expected = first_version
+                if first_version != expected:
+                    findings.append({
+                        'type': 'version_gap' if first_version > expected else 'version_out_of_order',
+                        'position': position, 'aggregate_id': aggregate_id,
+                        'expected_version': expected, 'version': first_version
+                    })
+                last_versions[aggregate_id] = max(last_versions.get(aggregate_id, 0), block_last)
+            if chain is not None:
+                chain.update(bytes.fromhex(result['hash']))
+                block_hashes.append({'first_position': result['first'], 'last_position': result['last'],
+                                     'hash': result['hash'], 'chain': chain.hexdigest()})
+
+        duplicates = _duplicate_digests(block_digests)
+        del block_digests
+        if duplicates:
+            # Segunda passada, apenas se houver resumos repetidos, para obter os ids reais
+            occurrences = {}
+            for found in executor.map(find_ids, [sources] * len(blocks), [first for first, _ in blocks],
+                                      [last for _, last in blocks], [duplicates] * len(blocks)):
+                for position, event_id in found:
+                    occurrences.setdefault(event_id, []).append(position)
+            for event_id, positions in occurrences.items():
+                if len(positions) > 1:
+                    findings.append({'type': 'duplicate_id', 'position': positions[1], 'id': event_id,
+                                     'positions': positions})
+
+    findings.sort(key=lambda finding: finding['position'])
+    report = {
+        'db': db_path,
+        'ok': not findings,
+        'events': count,
+        'aggregates': len(last_versions),
+        'tombstones': len(tombstones),
+        'last_position': last_position,
+        'blocks': len(blocks),
+        'workers': workers,
+        'findings_count': len(findings),
+        'findings': findings[:max_findings],
+        'elapsed_seconds': round(time.perf_counter() - start, 3)
+    }
+    if chain is not None:
+        report['hash_chain'] = {'head': chain.hexdigest() if blocks else None, 'blocks': block_hashes}
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Verifica a integridade do Event Store em paralelo')
+    parser.add_argument('--db', default='events.db')
+    parser.add_argument('--workers', type=int, help='processos do pool (padrão: um por núcleo)')
+    parser.add_argument('--block-size', type=int, default=100000, help='eventos por bloco')
+    parser.add_argument('--hash-chain', action='store_true', help='calcula o hash encadeado do log')
+    parser.add_argument('--max-findings', type=int, default=1000,
+                        help='quantidade máxima de problemas listados no relatório')
+    parser.add_argument('--output', default='-', help="arquivo do relatório JSON ('-' para stdout)")
+    args = parser.parse_args(argv)
+
+    report = verify(args.db, args.workers, args.block_size, args.hash_chain, args.max_findings)
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+    print(f"{report['events']} eventos verificados em {report['elapsed_seconds']:.1f}s "
+          f"com {report['workers']} processos: {report['findings_count']} problemas",
+          file=sys.stderr)
+    return 0 if report['ok'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+class EventUpcasters:
+    """Registro de upcasters: convertem payloads antigos para o formato atual na leitura
+
+    Cada upcaster é registrado para (event_type, schema_version) e converte
+    o payload dessa versão para a seguinte; na leitura os upcasters são
+    encadeados até a versão mais recente do tipo. O log nunca é reescrito.
+    Com cache_size, os payloads convertidos ficam em um cache LRU por id
+    do evento, para que um replay repetido não converta o mesmo evento
+    duas vezes.
+    """
+
+    def __init__(self, cache_size=0):
+        self.upcasters = {}
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+
+    def register(self, event_type, schema_version, upcaster):
+        """Registra a conversão do payload de event_type da versão schema_version para a seguinte"""
+        self.upcasters[(event_type, schema_version)] = upcaster
+
+    def current_version(self, event_type):
+        """Versão mais recente do payload de um tipo de evento (1 se não houver upcasters)"""
+        version = 1
+        while (event_type, version) in self.upcasters:
+            version += 1
+        return version
+
+    def upcast(self, event):
+        """Converte o payload do evento para a versão atual, alterando o próprio evento"""
+        event_type = event['event_type']
+        version = event.get('schema_version') or 1
+        if (event_type, version) not in self.upcasters:
+            event['schema_version'] = version
+            return event
+
+        event_id = event.get('id')
+        if self.cache_size and event_id:
+            with self.cache_lock:
+                cached = self.cache.get(event_id)
+                if cached is not None:
+                    self.cache.move_to_end(event_id)
+            if cached is not None:
+                event['schema_version'], data = cached
+                event['data'] = dict(data)
+                return event
+
+        data = event['data']
+        while (event_type, version) in self.upcasters:
+            data = self.upcasters[(event_type, version)](data)
+            version += 1
+        event['data'] = data
+        event['schema_version'] = version
+
+        if self.cache_size and event_id:
+            with self.cache_lock:
+                self.cache[event_id] = (version, dict(data))
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return event
+
+def _user_created_v1_to_v2(data):
+    """USER_CREATED v2: todos os usuários têm username, avatar, google_id e auth_type
+
+    Usuários do Google eram criados sem username e usuários locais sem
+    avatar/google_id; eventos antigos também podiam não ter auth_type.
+    """
+    data = dict(data)
+    data['auth_type'] = data.get('auth_type') or ('google' if data.get('google_id') else 'local')
+    data.setdefault('username', None)
+    data.setdefault('avatar', None)
+    data.setdefault('google_id', None)
+    return data
+
+def default_upcasters(cache_size=10000):
+    """Cria o registro com os upcasters dos eventos desta aplicação"""
+    upcasters = EventUpcasters(cache_size=cache_size)
+    upcasters.register('USER_CREATED', 1, _user_created_v1_to_v2)
+    return upcasters
@@ -1,40 +1,57 @@
 import uuid
 
+# Namespace dos ids derivados de chaves de idempotência (ver create_item)
+ITEM_ID_NAMESPACE = uuid.UUID('402341bd-6cac-4e94-ae7d-d24da2b29bbf')
+
 class ItemService:
     def __init__(self, event_store, event_bus, read_model):
         self.event_store = event_store
         self.event_bus = event_bus
         self.read_model = read_model
 
-    def create_item(self, item_data):
-        """Cria um novo item"""
-        item_id = str(uuid.uuid4())
+    def create_item(self, item_data, idempotency_key=None):
+        """Cria um novo item
+
+        Com idempotency_key, o id é derivado da chave: retentativas, mesmo
+        concorrentes, gravam no mesmo agregado (e no mesmo shard), onde a
+        chave é única. Se o agregado já existir sem a chave (reutilizada
+        depois de expirar), levanta ConcurrencyError.
+        """
+        if idempotency_key is None:
+            item_id, expected_version = str(uuid.uuid4()), None
+        else:
+            item_id, expected_version = str(uuid.uuid5(ITEM_ID_NAMESPACE, idempotency_key)), 0
 
         # Criar e salvar o evento
         event = self.event_store.save_event(
             aggregate_id=item_id,
             event_type='ITEM_CREATED',
-            data=item_data
+            data=item_data,
+            expected_version=expected_version,
+            idempotency_key=idempotency_key
         )
 
-        # Publicar o evento
-        self.event_bus.publish(event)
+        # Publicar o evento (uma retentativa com a mesma chave já foi publicada)
+        if not event.get('replayed'):
+            self.event_bus.publish(event)
 
-        return item_id
+        return event['aggregate_id']
 
-    def update_item(self, item_id, item_data):
+    def update_item(self, item_id, item_data, idempotency_key=None):
         """Atualiza um item existente"""
         # Criar e salvar o evento
         event = self.event_store.save_event(
             aggregate_id=item_id,
             event_type='ITEM_UPDATED',
-            data=item_data
+            data=item_data,
+            idempotency_key=idempotency_key
         )
 
-        # Publicar o evento
-        self.event_bus.publish(event)
+        # Publicar o evento (uma retentativa com a mesma chave já foi publicada)
+        if not event.get('replayed'):
+            self.event_bus.publish(event)
 
-    def delete_item(self, item_id):
+    def delete_item(self, item_id, idempotency_key=None):
         """Remove um item"""
         # Obter o item antes de excluí-lo para armazenar seus dados no evento
         item = self.read_model.get_item(item_id)
@@ -54,11 +71,13 @@ class ItemService:
         event = self.event_store.save_event(
             aggregate_id=item_id,
             event_type='ITEM_DELETED',
-            data=deletion_info
+            data=deletion_info,
+            idempotency_key=idempotency_key
         )
 
-        # Publicar o evento
-        self.event_bus.publish(event)
+        # Publicar o evento (uma retentativa com a mesma chave já foi publicada)
+        if not event.get('replayed'):
+            self.event_bus.publish(event)
 
     def get_item(self, item_id):
         """Obtém um item pelo ID (do modelo de leitura)"""
@@ -0,0 +1,467 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from event_store import ConcurrencyError, to_epoch_us
+from event_upcasters import default_upcasters
+
+# fcntl só existe em sistemas Unix; sem ele o diretório não é travado
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class LogEventStore:
+    """Event Store em arquivos de log append-only, para cargas com muitas escritas
+
+    Oferece a mesma interface de escrita e leitura do EventStore (save_event,
+    save_events, get_events, iter_events, read_all, read_all_backwards,
+    get_events_by_type, save_snapshot, get_snapshot). Cada gravação é um
+    registro [tamanho][crc32][payload JSON com a lista de eventos]; um lote
+    de save_events é um único registro e, portanto, atômico. Os arquivos
+    são segmentados por tamanho, lidos via mmap, e os índices (versões por
+    agregado e um índice esparso de positions) ficam em memória e são
+    reconstruídos na abertura. Como no EventStore, os payloads são
+    convertidos para a versão atual pelos upcasters na leitura.
+
+    Os snapshots são acrescentados a snapshots.jsonl (vale o último de cada
+    agregado). Outbox e compaction não existem neste backend:
+    setup_event_sourcing só os ativa nos Event Stores que os oferecem.
+
+    O backend é de um único processo: positions, versões e chaves de
+    idempotência só existem na memória de quem abriu o diretório. A
+    abertura trava o arquivo LOCK do diretório (flock exclusivo) e falha se
+    outro processo já o tiver aberto; um processo filho criado por fork
+    também não pode gravar. Com vários workers, use o backend sqlite.
+    """
+
+    HEADER = struct.Struct('<II')
+
+    def __init__(self, directory='events_log', segment_size=64 * 1024 * 1024,
+                 index_interval=1000, fsync=True, idempotency_ttl=24 * 60 * 60, upcasters=None):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.index_interval = index_interval
+        self.fsync = fsync
+        self.lock = threading.RLock()
+
+        # Segmentos: caminho, mmap atual e tamanho já gravado
+        self.segments = []
+        # Índice esparso: (position, segmento, offset) a cada index_interval eventos
+        self.sparse_index = []
+        # aggregate_id -> [(segmento, offset, índice no registro), ...] em ordem de versão
+        self.aggregates = {}
+        self.position = 0
+        self.append_handlers = []
+        self.idempotency_ttl = idempotency_ttl
+        # idempotency_key -> (segmento, offset, índice no registro, timestamp_us)
+        self.idempotency_keys = {}
+        self.upcasters = upcasters if upcasters is not None else default_upcasters()
+        # aggregate_id -> snapshot mais recente
+        self.snapshots = {}
+        self._file = None
+        self._snapshot_file = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock_directory()
+        try:
+            self._load()
+            self._load_snapshots()
+        except Exception:
+            self.close()
+            raise
+
+    def _lock_directory(self):
+        """Trava o diretório para este processo; ValueError se outro processo já o usa"""
+        self._pid = os.getpid()
+        self._lock_file = open(os.path.join(self.directory, 'LOCK'), 'a')
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise ValueError(f"O log {self.directory} já está aberto por outro processo")
+
+    def _check_process(self):
+        """Impede gravações de um processo filho, que herdou a trava mas não os índices do pai"""
+        if os.getpid() != self._pid:
+            raise ValueError(f"O log {self.directory} pertence a outro processo (fork após a abertura)")
+
+    def _load(self):
+        """Reconstrói os índices lendo todos os segmentos; trunca um registro final incompleto"""
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith('.log'))
+        for number, name in enumerate(names):
+            path = os.path.join(self.directory, name)
+            segment = {'path': path, 'size': os.path.getsize(path), 'mmap': None}
+            self.segments.append(segment)
+
+            valid_size = 0
+            for offset, end, events in self._scan(len(self.segments) - 1, 0):
+                self._index(len(self.segments) - 1, offset, events)
+                valid_size = end
+
+            if valid_size < segment['size']:
+                if number != len(names) - 1:
+                    raise ValueError(f"Segmento corrompido no meio do log: {path}")
+                print(f"Registro incompleto no fim de {path}; truncando em {valid_size} bytes")
+                self._unmap(segment)
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_size)
+                segment['size'] = valid_size
+
+    def _load_snapshots(self):
+        """Lê snapshots.jsonl mantendo o snapshot mais recente de cada agregado"""
+        path = os.path.join(self.directory, 'snapshots.jsonl')
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    snapshot = json.loads(line)
+                except ValueError:
+                    # Linha final incompleta: a gravação foi interrompida
+                    print(f"Snapshot incompleto ignorado em {path}")
+                    continue
+                current = self.snapshots.get(snapshot['aggregate_id'])
+                if current is None or snapshot['version'] > current['version']:
+                    self.snapshots[snapshot['aggregate_id']] = snapshot
+
+    def _index(self, segment_number, offset, events):
+        """Atualiza os índices em memória com os eventos de um registro"""
+        for i, event in enumerate(events):
+            self.position = event['position']
+            self.aggregates.setdefault(event['aggregate_id'], []).append((segment_number, offset, i))
+            if event.get('idempotency_key') is not None:
+                self.idempotency_keys[event['idempotency_key']] = (
+                    segment_number, offset, i, event['timestamp_us']
+                )
+            if (event['position'] - 1) % self.index_interval == 0:
+                self.sparse_index.append((event['position'], segment_number, offset))
+
+    def _view(self, segment_number, size):
+        """Obtém o mmap de um segmento cobrindo ao menos size bytes"""
+        segment = self.segments[segment_number]
+        mm = segment['mmap']
+        if mm is None or len(mm) < size:
+            # O mmap anterior não é fechado: leitores em andamento ainda podem usá-lo
+            with open(segment['path'], 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            segment['mmap'] = mm
+        return mm
+
+    def _unmap(self, segment):
+        if segment['mmap'] is not None:
+            segment['mmap'].close()
+            segment['mmap'] = None
+
+    def _scan(self, segment_number, offset, end=None):
+        """Percorre os registros válidos de um segmento a partir de offset: (offset, fim, eventos)"""
+        size = self.segments[segment_number]['size'] if end is None else end
+        if size == 0:
+            return
+        mm = self._view(segment_number, size)
+        while offset + self.HEADER.size <= size:
+            length, checksum = self.HEADER.unpack_from(mm, offset)
+            start = offset + self.HEADER.size
+            record_end = start + length
+            if record_end > size:
+                return
+            payload = mm[start:record_end]
+            if zlib.crc32(payload) != checksum:
+                return
+            yield offset, record_end, json.loads(payload)
+            offset = record_end
+
+    def _to_event(self, stored):
+        """Copia um evento lido do log e converte o payload para a versão atual"""
+        event = dict(stored)
+        # Registros gravados antes de schema_version são da versão 1
+        event.setdefault('schema_version', 1)
+        return self.upcasters.upcast(event)
+
+    def _read_record(self, segment_number, offset):
+        """Lê e decodifica o registro que começa em offset"""
+        mm = self._view(segment_number, offset + self.HEADER.size)
+        length, _ = self.HEADER.unpack_from(mm, offset)
+        start = offset + self.HEADER.size
+        mm = self._view(segment_number, start + length)
+        return json.loads(mm[start:start + length])
+
+    def _active_file(self, record_size):
+        """Obtém o arquivo do segmento ativo, abrindo um novo se o atual estiver cheio"""
+        if self.segments and self.segments[-1]['size'] + record_size <= self.segment_size:
+            if self._file is None:
+                self._file = open(self.segments[-1]['path'], 'ab')
+            return len(self.segments) - 1
+
+        if self.segments and self.segments[-1]['size'] == 0:
+            # Segmento vazio: usar mesmo que o registro seja maior que segment_size
+            if self._file is None:
+                self._file = open(self.segments[-1]['path'], 'ab')
+            return len(self.segments) - 1
+
+        if self._file is not None:
+            self._file.close()
+        path = os.path.join(self.directory, f'{self.position + 1:020d}.log')
+        self.segments.append({'path': path, 'size': 0, 'mmap': None})
+        self._file = open(path, 'ab')
+        return len(self.segments) - 1
+
+    def _current_version(self, aggregate_id):
+        return len(self.aggregates.get(aggregate_id, ()))
+
+    def _find_by_idempotency_key(self, idempotency_key):
+        """Obtém o evento gravado com uma chave ainda válida, ou None"""
+        location = self.idempotency_keys.get(idempotency_key)
+        if location is None:
+            return None
+        segment_number, offset, i, timestamp_us = location
+        if timestamp_us < to_epoch_us(datetime.utcnow() - timedelta(seconds=self.idempotency_ttl)):
+            del self.idempotency_keys[idempotency_key]
+            return None
+        return self._to_event(dict(self._read_record(segment_number, offset)[i], replayed=True))
+
+    def _write(self, commands, idempotency_key=None):
+        """Grava uma lista de (aggregate_id, event_type, data, expected_version) como um único registro"""
+        self._check_process()
+        with self.lock:
+            if idempotency_key is not None:
+                existing = self._find_by_idempotency_key(idempotency_key)
+                if existing is not None:
+                    return [existing]
+
+            versions = {}
+            events = []
+            for aggregate_id, event_type, data, expected_version in commands:
+                current = versions.get(aggregate_id, self._current_version(aggregate_id))
+                if expected_version is not None and current != expected_version:
+                    raise ConcurrencyError(aggregate_id, expected_version, current)
+                versions[aggregate_id] = current + 1
+
+                now = datetime.utcnow()
+                events.append({
+                    'position': self.position + len(events) + 1,
+                    'id': str(uuid.uuid4()),
+                    'aggregate_id': aggregate_id,
+                    'event_type': event_type,
+                    'data': data,
+                    'timestamp': now.isoformat(),
+                    'timestamp_us': to_epoch_us(now),
+                    'version': current + 1,
+                    # Os serviços gravam o formato original (versão 1), convertido na leitura
+                    'schema_version': 1,
+                    'idempotency_key': idempotency_key
+                })
+
+            payload = json.dumps(events, separators=(',', ':')).encode('utf-8')
+            record = self.HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+            segment_number = self._active_file(len(record))
+            segment = self.segments[segment_number]
+            offset = segment['size']
+            try:
+                self._file.write(record)
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except Exception:
+                # Descartar bytes parciais para não deixar lixo no meio do segmento
+                self._file.close()
+                self._file = None
+                with open(segment['path'], 'r+b') as f:
+                    f.truncate(offset)
+                raise
+            segment['size'] += len(record)
+
+            # Só indexar depois de durável: leitores nunca veem registros incompletos
+            self._index(segment_number, offset, events)
+        events = [self._to_event(event) for event in events]
+
+        for event in events:
+            for handler in self.append_handlers:
+                try:
+                    handler(event)
+                except Exception as e:
+                    print(f"Erro no handler de append para {event['event_type']}: {e}")
+        return events
+
+    def save_event(self, aggregate_id, event_type, data, expected_version=None,
+                   idempotency_key=None):
+        """Salva um novo evento no log; uma idempotency_key já usada retorna o evento original"""
+        return self._write([(aggregate_id, event_type, data, expected_version)], idempotency_key)[0]
+
+    def save_events(self, events):
+        """Salva vários eventos (aggregate_id, event_type, data) em um único registro atômico"""
+        if not events:
+            return []
+        return self._write([
+            (aggregate_id, event_type, data, None)
+            for aggregate_id, event_type, data in events
+        ])
+
+    def register_append_handler(self, handler):
+        """Registra um handler chamado com cada evento gravado"""
+        self.append_handlers.append(handler)
+
+    def _iter_stored(self, from_position=None):
+        """Percorre os eventos gravados, sem conversão, em ordem de position"""
+        with self.lock:
+            last_position = self.position
+            ends = [segment['size'] for segment in self.segments]
+            start_segment, start_offset = 0, 0
+            if from_position is not None and self.sparse_index:
+                # O índice esparso aponta o registro mais próximo antes de from_position
+                i = bisect.bisect_right(self.sparse_index, (from_position, float('inf'), float('inf'))) - 1
+                if i >= 0:
+                    _, start_segment, start_offset = self.sparse_index[i]
+        yield from self._iter_range(start_segment, start_offset, ends, from_position, last_position)
+
+    def _iter_range(self, start_segment, start_offset, ends, first, last):
+        """Eventos gravados com position entre first e last, a partir de (segmento, offset)"""
+        for segment_number in range(start_segment, len(ends)):
+            offset = start_offset if segment_number == start_segment else 0
+            for _, _, events in self._scan(segment_number, offset, ends[segment_number]):
+                for event in events:
+                    if event['position'] > last:
+                        return
+                    if first is None or event['position'] >= first:
+                        yield event
+
+    def _iter_stored_backwards(self, before_position=None):
+        """Percorre os eventos gravados, sem conversão, do mais recente ao mais antigo
+
+        Cada trecho do índice esparso (até index_interval eventos) é lido
+        para a frente e devolvido invertido.
+        """
+        with self.lock:
+            last = self.position
+            ends = [segment['size'] for segment in self.segments]
+            sparse_index = list(self.sparse_index)
+        if before_position is not None:
+            last = min(last, before_position - 1)
+
+        i = bisect.bisect_right(sparse_index, (last, float('inf'), float('inf'))) - 1
+        while i >= 0 and last >= 1:
+            first, segment_number, offset = sparse_index[i]
+            yield from reversed(list(self._iter_range(segment_number, offset, ends, first, last)))
+            last = first - 1
+            i -= 1
+
+    def iter_events(self, aggregate_id=None, from_position=None, batch_size=None,
+                    from_version=None):
+        """Itera sobre os eventos via mmap; mesma semântica de EventStore.iter_events"""
+        if aggregate_id:
+            with self.lock:
+                start = max((from_version or 1) - 1, 0)
+                locations = list(self.aggregates.get(aggregate_id, ())[start:])
+            cached = (None, None, None)
+            for segment_number, offset, i in locations:
+                # Eventos do mesmo registro são decodificados uma única vez
+                if cached[:2] != (segment_number, offset):
+                    cached = (segment_number, offset, self._read_record(segment_number, offset))
+                event = cached[2][i]
+                if from_position is None or event['position'] >= from_position:
+                    yield self._to_event(event)
+            return
+
+        for event in self._iter_stored(from_position):
+            yield self._to_event(event)
+
+    def get_events(self, aggregate_id=None):
+        """Obtém eventos do log, opcionalmente filtrados por aggregate_id"""
+        return list(self.iter_events(aggregate_id))
+
+    def _read_page(self, events, limit, event_types):
+        if limit < 1:
+            raise ValueError(f"Tamanho de página inválido: {limit}")
+        page = []
+        for event in events:
+            if event_types and event['event_type'] not in event_types:
+                continue
+            page.append(self._to_event(event))
+            if len(page) > limit:
+                break
+        next_position = page[limit - 1]['position'] if len(page) > limit else None
+        return page[:limit], next_position
+
+    def read_all(self, after_position=None, limit=100, event_types=None):
+        """Lê uma página do log global em ordem crescente de position: (eventos, next_position)"""
+        from_position = after_position + 1 if after_position is not None else None
+        return self._read_page(self._iter_stored(from_position), limit, event_types)
+
+    def read_all_backwards(self, before_position=None, limit=100, event_types=None):
+        """Lê uma página do log global a partir dos mais recentes: (eventos, next_position)"""
+        return self._read_page(self._iter_stored_backwards(before_position), limit, event_types)
+
+    def get_events_by_type(self, types=None, since=None, until=None, limit=100):
+        """Obtém eventos por tipo e/ou período, em ordem cronológica
+
+        Não há índice por tipo ou período neste backend: o log é percorrido
+        desde o início até encontrar limit eventos.
+        """
+        if isinstance(types, str):
+            types = [types]
+        since_us = to_epoch_us(since) if since is not None else None
+        until_us = to_epoch_us(until) if until is not None else None
+
+        result = []
+        for event in self._iter_stored():
+            if since_us is not None and event['timestamp_us'] < since_us:
+                continue
+            if until_us is not None and event['timestamp_us'] >= until_us:
+                break
+            if types and event['event_type'] not in types:
+                continue
+            result.append(self._to_event(event))
+            if len(result) >= limit:
+                break
+        return result
+
+    def save_snapshot(self, aggregate_id, version, state):
+        """Grava o snapshot de um agregado, mantendo apenas o mais recente"""
+        snapshot = {
+            'aggregate_id': aggregate_id,
+            'version': version,
+            'state': state,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        line = json.dumps(snapshot, separators=(',', ':')).encode('utf-8') + b'\n'
+        self._check_process()
+        with self.lock:
+            current = self.snapshots.get(aggregate_id)
+            if current is not None and version <= current['version']:
+                return
+            if self._snapshot_file is None:
+                self._snapshot_file = open(os.path.join(self.directory, 'snapshots.jsonl'), 'ab')
+            self._snapshot_file.write(line)
+            self._snapshot_file.flush()
+            # Guardar a cópia gravada: o chamador pode continuar alterando state
+            self.snapshots[aggregate_id] = json.loads(line)
+
+    def get_snapshot(self, aggregate_id):
+        """Obtém o snapshot mais recente de um agregado, ou None"""
+        with self.lock:
+            snapshot = self.snapshots.get(aggregate_id)
+        return json.loads(json.dumps(snapshot)) if snapshot else None
+
+    def close(self):
+        """Fecha o arquivo ativo e os mmaps e libera o diretório"""
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._snapshot_file is not None:
+                self._snapshot_file.close()
+                self._snapshot_file = None
+            for segment in self.segments:
+                self._unmap(segment)
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
@@ -0,0 +1,191 @@
+import threading
+import uuid
+from datetime import datetime, timedelta
+from event_store import ConcurrencyError, to_epoch_us
+
+class InMemoryEventStore:
+    """Event Store em memória, com a mesma interface do EventStore
+
+    Pensado para testes e benchmarks: nada é gravado em disco e cada
+    instância começa vazia. Os eventos retornados são cópias rasas; o
+    dicionário data é compartilhado e não deve ser alterado.
+    """
+
+    def __init__(self, idempotency_ttl=24 * 60 * 60):
+        self.lock = threading.RLock()
+        self.events = []
+        # aggregate_id -> eventos do agregado em ordem de versão
+        self.aggregates = {}
+        self.snapshots = {}
+        self.append_handlers = []
+        self.idempotency_ttl = idempotency_ttl
+        # idempotency_key -> evento gravado com ela
+        self.idempotency_keys = {}
+
+    def _find_by_idempotency_key(self, idempotency_key):
+        """Obtém o evento gravado com uma chave ainda válida, ou None; descarta chaves expiradas"""
+        event = self.idempotency_keys.get(idempotency_key)
+        if event is None:
+            return None
+        cutoff = to_epoch_us(datetime.utcnow() - timedelta(seconds=self.idempotency_ttl))
+        if event['timestamp_us'] < cutoff:
+            del self.idempotency_keys[idempotency_key]
+            return None
+        return dict(event, replayed=True)
+
+    def _append(self, aggregate_id, event_type, data, expected_version=None, idempotency_key=None):
+        """Cria e armazena um evento; deve ser chamado com o lock adquirido"""
+        if idempotency_key is not None:
+            existing = self._find_by_idempotency_key(idempotency_key)
+            if existing is not None:
+                return existing
+
+        history = self.aggregates.setdefault(aggregate_id, [])
+        current_version = len(history)
+        if expected_version is not None and current_version != expected_version:
+            raise ConcurrencyError(aggregate_id, expected_version, current_version)
+
+        now = datetime.utcnow()
+        event = {
+            'position': len(self.events) + 1,
+            'id': str(uuid.uuid4()),
+            'aggregate_id': aggregate_id,
+            'event_type': event_type,
+            'data': data,
+            'timestamp': now.isoformat(),
+            'timestamp_us': to_epoch_us(now),
+            'version': current_version + 1,
+            'idempotency_key': idempotency_key
+        }
+        self.events.append(event)
+        history.append(event)
+        if idempotency_key is not None:
+            self.idempotency_keys[idempotency_key] = event
+        return event
+
+    def _notify_append(self, events):
+        """Repassa os eventos recém-gravados aos handlers registrados"""
+        for event in events:
+            for handler in self.append_handlers:
+                try:
+                    handler(event)
+                except Exception as e:
+                    print(f"Erro no handler de append para {event['event_type']}: {e}")
+
+    def save_event(self, aggregate_id, event_type, data, expected_version=None,
+                   idempotency_key=None):
+        """Salva um novo evento; uma idempotency_key já usada retorna o evento original"""
+        with self.lock:
+            event = self._append(aggregate_id, event_type, data, expected_version, idempotency_key)
+        if event.get('replayed'):
+            return event
+        self._notify_append([event])
+        return dict(event)
+
+    def save_events(self, events):
+        """Salva vários eventos (aggregate_id, event_type, data) de forma atômica"""
+        with self.lock:
+            # Validar tudo antes de gravar: em caso de erro nada é armazenado
+            size = len(self.events)
+            try:
+                saved = [
+                    self._append(aggregate_id, event_type, data)
+                    for aggregate_id, event_type, data in events
+                ]
+            except Exception:
+                for event in self.events[size:]:
+                    self.aggregates[event['aggregate_id']].pop()
+                del self.events[size:]
+                raise
+        self._notify_append(saved)
+        return [dict(event) for event in saved]
+
+    def register_append_handler(self, handler):
+        """Registra um handler chamado com cada evento gravado"""
+        self.append_handlers.append(handler)
+
+    def iter_events(self, aggregate_id=None, from_position=None, batch_size=None,
+                    from_version=None):
+        """Itera sobre os eventos; mesma semântica de EventStore.iter_events"""
+        with self.lock:
+            if aggregate_id:
+                events = self.aggregates.get(aggregate_id, [])[max((from_version or 1) - 1, 0):]
+            else:
+                events = self.events[max((from_position or 1) - 1, 0):]
+
+        for event in events:
+            if from_position is None or event['position'] >= from_position:
+                yield dict(event)
+
+    def get_events(self, aggregate_id=None):
+        """Obtém eventos, opcionalmente filtrados por aggregate_id"""
+        return list(self.iter_events(aggregate_id))
+
+    def _read_page(self, events, limit, event_types):
+        if limit < 1:
+            raise ValueError(f"Tamanho de página inválido: {limit}")
+        page = []
+        for event in events:
+            if event_types and event['event_type'] not in event_types:
+                continue
+            page.append(dict(event))
+            if len(page) > limit:
+                break
+        next_position = page[limit - 1]['position'] if len(page) > limit else None
+        return page[:limit], next_position
+
+    def read_all(self, after_position=None, limit=100, event_types=None):
+        """Lê uma página do log global em ordem crescente: (eventos, next_position)"""
+        with self.lock:
+            events = self.events[after_position or 0:]
+        return self._read_page(events, limit, event_types)
+
+    def read_all_backwards(self, before_position=None, limit=100, event_types=None):
+        """Lê uma página do log global a partir dos mais recentes: (eventos, next_position)"""
+        with self.lock:
+            end = len(self.events) if before_position is None else max(before_position - 1, 0)
+            events = self.events[:end]
+        return self._read_page(reversed(events), limit, event_types)
+
+    def get_events_by_type(self, types=None, since=None, until=None, limit=100):
+        """Obtém eventos por tipo e/ou período, em ordem cronológica"""
+        if isinstance(types, str):
+            types = [types]
+        since_us = to_epoch_us(since) if since is not None else None
+        until_us = to_epoch_us(until) if until is not None else None
+        with self.lock:
+            events = list(self.events)
+
+        result = []
+        for event in events:
+            if since_us is not None and event['timestamp_us'] < since_us:
+                continue
+            if until_us is not None and event['timestamp_us'] >= until_us:
+                break
+            if types and event['event_type'] not in types:
+                continue
+            result.append(dict(event))
+            if len(result) >= limit:
+                break
+        return result
+
+    def save_snapshot(self, aggregate_id, version, state):
+        """Grava o snapshot de um agregado, mantendo apenas o mais recente"""
+        with self.lock:
+            current = self.snapshots.get(aggregate_id)
+            if current is None or version > current['version']:
+                self.snapshots[aggregate_id] = {
+                    'aggregate_id': aggregate_id,
+                    'version': version,
+                    'state': state,
+                    'timestamp': datetime.utcnow().isoformat()
+                }
+
+    def get_snapshot(self, aggregate_id):
+        """Obtém o snapshot mais recente de um agregado, ou None"""
+        with self.lock:
+            snapshot = self.snapshots.get(aggregate_id)
+        return dict(snapshot) if snapshot else None
+
+    def close(self):
+        """Nada a liberar; mantido para compatibilidade com o EventStore"""
@@ -0,0 +1,116 @@
+import threading
+import time
+import uuid
+
+class OutboxRelay:
+    """Publica no Event Bus, em lotes e em segundo plano, os eventos do outbox do Event Store
+
+    Com o outbox habilitado, cada evento é gravado na tabela outbox na
+    mesma transação do próprio evento; a requisição termina logo após o
+    commit e esta thread faz a publicação. A entrega é "pelo menos uma
+    vez": se o processo cair entre publicar e marcar o lote, ele é
+    publicado de novo na próxima execução (os consumidores já ignoram
+    versões repetidas ou gravam de forma idempotente).
+
+    Com vários processos sobre o mesmo Event Store, cada um com o seu relay,
+    apenas o dono da concessão (renovada a cada lote, válida por lease
+    segundos) publica; os demais assumem se ele parar de renová-la.
+
+    Também serve como Event Bus para os serviços: publish e publish_many
+    apenas acordam o relay, pois o evento já está no outbox.
+    """
+
+    def __init__(self, event_store, event_bus, batch_size=100, interval=1.0, retention=3600, lease=30.0):
+        self.event_store = event_store
+        self.event_bus = event_bus
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retention = retention
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self.running = False
+        self.thread = None
+        self.wake = threading.Event()
+
+        self.published = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error = None
+        self._next_purge = 0
+
+        # Acordar o relay assim que um evento for gravado
+        event_store.register_append_handler(lambda event: self.wake.set())
+
+    def publish(self, event):
+        """O evento já está no outbox; apenas acorda o relay"""
+        self.wake.set()
+
+    def publish_many(self, events):
+        """Os eventos já estão no outbox; apenas acorda o relay"""
+        self.wake.set()
+
+    def relay_once(self):
+        """Publica um lote de eventos pendentes e retorna quantos foram publicados"""
+        events = self.event_store.fetch_outbox(self.batch_size, owner=self.owner, lease=self.lease)
+        if not events:
+            return 0
+        self.event_bus.publish_many(events)
+        self.event_store.mark_outbox_sent([event['position'] for event in events])
+        self.published += len(events)
+        self.batches += 1
+        return len(events)
+
+    def start(self):
+        """Inicia a thread do relay"""
+        self.running = True
+
+        def worker():
+            backoff = self.interval
+            while self.running:
+                try:
+                    count = self.relay_once()
+                    backoff = self.interval
+                    if time.time() >= self._next_purge:
+                        self.event_store.purge_outbox(self.retention)
+                        self._next_purge = time.time() + self.retention / 10
+                except Exception as e:
+                    # Redis fora do ar, por exemplo: tentar de novo com espera crescente
+                    self.errors += 1
+                    self.last_error = str(e)
+                    print(f"Erro no relay do outbox: {e}")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+
+                if count < self.batch_size:
+                    # Nada (ou pouco) pendente: aguardar um novo evento ou o intervalo
+                    self.wake.wait(self.interval)
+                    self.wake.clear()
+
+        self.thread = threading.Thread(target=worker)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Para a thread do relay"""
+        self.running = False
+        self.wake.set()
+        if self.thread:
+            self.thread.join(timeout=5.0)
+        try:
+            self.event_store.release_outbox_lease(self.owner)
+        except Exception as e:
+            print(f"Erro ao liberar a concessão do relay do outbox: {e}")
+
+    def get_stats(self):
+        """Retorna o atraso do outbox e os contadores do relay"""
+        stats = self.event_store.outbox_stats()
+        stats.update({
+            'running': self.running,
+            'owner': self.owner,
+            'published': self.published,
+            'batches': self.batches,
+            'errors': self.errors,
+            'last_error': self.last_error
+        })
+        return stats
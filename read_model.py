@@ -1,26 +1,75 @@
+import threading
 from tinydb import TinyDB, Query
+from tinydb.storages import MemoryStorage
 
 class ReadModel:
+    """Read Model em TinyDB (readmodel.json)
+
+    Usuários e itens também ficam em índices em memória (dicts por id,
+    username e email), montados na abertura e atualizados a cada save e
+    delete: as consultas pontuais não percorrem mais a tabela. Os
+    documentos devolvidos são cópias, como os lidos do TinyDB.
+    """
+
     def __init__(self, db_path='readmodel.json'):
         self.db = TinyDB(db_path)
+        self._open_tables()
+
+    def _open_tables(self):
         self.users = self.db.table('users')
         self.items = self.db.table('items')
         self.roles = self.db.table('roles')
+        # Serializa as escritas: cada uma altera o TinyDB e os índices juntos
+        self._write_lock = threading.Lock()
+        self._build_indexes()
+
+    def _build_indexes(self):
+        """Monta os índices em memória a partir das tabelas"""
+        # id -> (doc_id do TinyDB, documento)
+        self._users_by_id = {}
+        self._items_by_id = {}
+        # username/email -> tupla ordenada de (doc_id, id); com valores repetidos vale o
+        # primeiro documento, como em table.get
+        self._user_ids_by_username = {}
+        self._user_ids_by_email = {}
+        for document in self.users.all():
+            self._index_user(document.doc_id, dict(document))
+        for document in self.items.all():
+            self._items_by_id[document.get('id')] = (document.doc_id, dict(document))
+
+    def _index_user(self, doc_id, user):
+        self._users_by_id[user.get('id')] = (doc_id, user)
+        self._add_key(self._user_ids_by_username, user.get('username'), doc_id, user.get('id'))
+        self._add_key(self._user_ids_by_email, user.get('email'), doc_id, user.get('id'))
+
+    # As tuplas são substituídas, nunca alteradas: leituras concorrentes sempre veem uma tupla inteira
+    def _add_key(self, index, value, doc_id, user_id):
+        if value:
+            index[value] = tuple(sorted(index.get(value, ()) + ((doc_id, user_id),)))
+
+    def _remove_key(self, index, value, doc_id, user_id):
+        entries = tuple(entry for entry in index.get(value, ()) if entry != (doc_id, user_id))
+        if entries:
+            index[value] = entries
+        else:
+            index.pop(value, None)
+
+    def _user_by_index(self, index, value):
+        entries = index.get(value)
+        return self.get_user(entries[0][1]) if entries else None
 
     def get_user(self, user_id):
         """Obtém um usuário pelo ID"""
-        User = Query()
-        return self.users.get(User.id == user_id)
+        entry = self._users_by_id.get(user_id)
+        return dict(entry[1]) if entry else None
 
     def get_user_by_username(self, username):
         """Obtém um usuário pelo nome de usuário"""
-        User = Query()
-        return self.users.get(User.username == username)
+        return self._user_by_index(self._user_ids_by_username, username)
 
     def get_user_by_email(self, email):
         """Obtém um usuário pelo email"""
-        User = Query()
-        return self.users.get(User.email == email)
+        return self._user_by_index(self._user_ids_by_email, email)
 
     def get_users(self):
         """Obtém todos os usuários"""
@@ -50,21 +99,37 @@ class ReadModel:
 
     def save_user(self, user_data):
         """Salva ou atualiza um usuário"""
-        User = Query()
-        if self.users.contains(User.id == user_data['id']):
-            self.users.update(user_data, User.id == user_data['id'])
-        else:
-            self.users.insert(user_data)
+        with self._write_lock:
+            entry = self._users_by_id.get(user_data['id'])
+            if entry:
+                doc_id, existing = entry
+                user = dict(existing, **user_data)
+                self.users.update(user_data, doc_ids=[doc_id])
+                self._users_by_id[user['id']] = (doc_id, user)
+                # Só mexer nas chaves alteradas: buscas concorrentes pelas demais não falham
+                for index, field in ((self._user_ids_by_username, 'username'),
+                                     (self._user_ids_by_email, 'email')):
+                    if user.get(field) != existing.get(field):
+                        self._remove_key(index, existing.get(field), doc_id, user['id'])
+                        self._add_key(index, user.get(field), doc_id, user['id'])
+            else:
+                doc_id = self.users.insert(user_data)
+                self._index_user(doc_id, dict(user_data))
 
     def delete_user(self, user_id):
         """Remove um usuário"""
-        User = Query()
-        self.users.remove(User.id == user_id)
+        with self._write_lock:
+            entry = self._users_by_id.pop(user_id, None)
+            if entry:
+                doc_id, existing = entry
+                self.users.remove(doc_ids=[doc_id])
+                self._remove_key(self._user_ids_by_username, existing.get('username'), doc_id, user_id)
+                self._remove_key(self._user_ids_by_email, existing.get('email'), doc_id, user_id)
 
     def get_item(self, item_id):
         """Obtém um item pelo ID"""
-        Item = Query()
-        return self.items.get(Item.id == item_id)
+        entry = self._items_by_id.get(item_id)
+        return dict(entry[1]) if entry else None
 
     def get_items(self, user_id=None):
         """Obtém todos os itens, opcionalmente filtrados por user_id"""
@@ -75,18 +140,26 @@ class ReadModel:
 
     def save_item(self, item_data):
         """Salva ou atualiza um item"""
-        Item = Query()
-        if self.items.contains(Item.id == item_data['id']):
-            self.items.update(item_data, Item.id == item_data['id'])
-        else:
-            self.items.insert(item_data)
+        with self._write_lock:
+            entry = self._items_by_id.get(item_data['id'])
+            if entry:
+                doc_id, existing = entry
+                self.items.update(item_data, doc_ids=[doc_id])
+                self._items_by_id[item_data['id']] = (doc_id, dict(existing, **item_data))
+            else:
+                doc_id = self.items.insert(item_data)
+                self._items_by_id[item_data['id']] = (doc_id, dict(item_data))
 
     def delete_item(self, item_id):
         """Remove um item"""
-        Item = Query()
-        self.items.remove(Item.id == item_id)
+        with self._write_lock:
+            entry = self._items_by_id.pop(item_id, None)
+            if entry:
+                self.items.remove(doc_ids=[entry[0]])
 
-    def delete_user(self, user_id):
-        """Remove um usuário"""
-        User = Query()
-        self.users.remove(User.id == user_id)
+class InMemoryReadModel(ReadModel):
+    """Read Model mantido apenas em memória (TinyDB com MemoryStorage), para testes e benchmarks"""
+
+    def __init__(self):
+        self.db = TinyDB(storage=MemoryStorage)
+        self._open_tables()
@@ -0,0 +1,339 @@
+import functools
+import heapq
+import os
+import time
+import zlib
+from itertools import takewhile
+from event_store import EventStore
+
+def _clock_us():
+    """Relógio do sistema em microssegundos"""
+    return time.time_ns() // 1000
+
+class ShardedEventStore:
+    """Event Store dividido em N arquivos SQLite por hash estável do aggregate_id
+
+    Cada shard é um EventStore independente, com seu próprio lock de escrita:
+    escritas em agregados de shards diferentes acontecem em paralelo, sem
+    nenhum estado compartilhado entre os shards. Não há conexões próprias
+    além das dos shards, que as reabrem após um fork. Operações de um agregado
+    vão sempre ao mesmo shard (crc32 do id módulo N). As leituras globais
+    fazem um k-way merge dos shards por position (ou por timestamp em
+    get_events_by_type).
+
+    A position é global sem ser coordenada: o shard i grava o relógio em
+    microssegundos * N + i, ou a próxima position com resto i acima da sua
+    última, se o relógio não tiver avançado. Positions de shards diferentes
+    nunca colidem e seguem a ordem de gravação, mas não são contíguas.
+    Como os shards fazem commit em paralelo, uma transação ainda aberta
+    pode gravar uma position menor que a de um evento já visível em outro
+    shard; as leituras globais param em visible_position, abaixo da qual
+    nenhum shard grava mais. Assim, quem leu até a position P nunca recebe
+    depois um evento com position menor. Isso supõe que o relógio do
+    sistema não volte atrás.
+
+    Atenção: save_events com agregados de shards diferentes é atômico
+    apenas dentro de cada shard.
+    """
+
+    def __init__(self, db_path='events.db', shards=4, **options):
+        if shards < 1:
+            raise ValueError(f"Quantidade de shards inválida: {shards}")
+        self.shard_count = shards
+        base, extension = os.path.splitext(db_path)
+        self.shards = []
+        try:
+            for index in range(shards):
+                self.shards.append(EventStore(
+                    f'{base}-shard{index}{extension or ".db"}',
+                    position_sequence=functools.partial(self._next_position, index), **options
+                ))
+            for index, shard in enumerate(self.shards):
+                self._check_shard(index, shard)
+        except Exception:
+            self.close()
+            raise
+
+    @staticmethod
+    def _last_position(cursor):
+        """Maior position já atribuída no shard (inclusive a eventos movidos para segmentos)"""
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'")
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _next_position(self, index, cursor):
+        """Position do próximo evento do shard index; chamada pelo shard dentro da sua transação"""
+        last = self._last_position(cursor)
+        # Menor position com resto index acima da última do shard
+        following = last + 1 + (index - last - 1) % self.shard_count
+        return max(_clock_us() * self.shard_count + index, following)
+
+    def _shard_watermark(self, shard):
+        """Maior position até a qual o shard não grava mais eventos"""
+        conn = shard._get_connection()
+        cursor = conn.cursor()
+        try:
+            # Com o lock de escrita não há transação do shard em andamento, e as
+            # próximas lerão o relógio depois de now
+            cursor.execute("BEGIN IMMEDIATE")
+            last = self._last_position(cursor)
+            now = _clock_us()
+            while _clock_us() == now:
+                pass
+        finally:
+            conn.rollback()
+        return max(last, (now + 1) * self.shard_count - 1)
+
+    def visible_position(self):
+        """Maior position abaixo da qual todos os eventos já estão gravados: o limite das leituras globais"""
+        return min(self._shard_watermark(shard) for shard in self.shards)
+
+    def _check_shard(self, index, shard):
+        """Grava (ou confere) a quantidade de shards: mudar N redistribuiria os agregados"""
+        conn = shard._get_connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS shard_info (shard INTEGER NOT NULL, shard_count INTEGER NOT NULL, "
+            "global_positions INTEGER NOT NULL DEFAULT 1)"
+        )
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(shard_info)")]
+        if 'global_positions' not in columns:
+            # Shards anteriores às positions globais numeravam as positions por shard
+            conn.execute("ALTER TABLE shard_info ADD COLUMN global_positions INTEGER NOT NULL DEFAULT 0")
+        row = conn.execute("SELECT shard, shard_count, global_positions FROM shard_info").fetchone()
+        if row is None:
+            conn.execute("INSERT INTO shard_info (shard, shard_count) VALUES (?, ?)", (index, self.shard_count))
+            conn.commit()
+            return
+        if tuple(row[:2]) != (index, self.shard_count):
+            raise ValueError(
+                f"Shard {index} foi criado como {row[0]} de {row[1]}; "
+                f"não é possível abri-lo com {self.shard_count} shards"
+            )
+        if not row[2]:
+            if shard.read_all_backwards(None, 1)[0]:
+                raise ValueError(
+                    f"Shard {index} usa positions locais; exporte os eventos e importe-os em um "
+                    f"Event Store novo com event_store_cli.py"
+                )
+            conn.execute("UPDATE shard_info SET global_positions = 1")
+        conn.commit()
+
+    def shard_index(self, aggregate_id):
+        """Índice do shard de um agregado (estável entre processos, ao contrário de hash())"""
+        return zlib.crc32(aggregate_id.encode('utf-8')) % self.shard_count
+
+    def _shard_for(self, aggregate_id):
+        return self.shards[self.shard_index(aggregate_id)]
+
+    def save_event(self, aggregate_id, event_type, data, expected_version=None,
+                   idempotency_key=None):
+        """Salva um novo evento no shard do agregado
+
+        A chave de idempotência só é única dentro de cada shard: chamadas
+        concorrentes com a mesma chave e agregados de shards diferentes podem
+        gravar dois eventos. Os serviços derivam o id do agregado criado a
+        partir da chave, para que as retentativas caiam no mesmo shard.
+        """
+        if idempotency_key is not None:
+            # Uma retentativa sequencial com outro aggregate_id ainda encontra a chave
+            # em outro shard
+            for shard in self.shards:
+                with shard._read_pool.connection() as conn:
+                    existing = shard._find_by_idempotency_key(conn.cursor(), idempotency_key)
+                if existing is not None:
+                    return existing
+
+        return self._shard_for(aggregate_id).save_event(
+            aggregate_id, event_type, data, expected_version, idempotency_key
+        )
+
+    def save_events(self, events):
+        """Salva vários eventos, uma transação por shard; retorna os eventos na ordem recebida"""
+        by_shard = {}
+        for i, (aggregate_id, event_type, data) in enumerate(events):
+            by_shard.setdefault(self.shard_index(aggregate_id), []).append((i, (aggregate_id, event_type, data)))
+
+        saved = [None] * len(events)
+        for index, items in by_shard.items():
+            shard_events = self.shards[index].save_events([args for _, args in items])
+            for (i, _), event in zip(items, shard_events):
+                saved[i] = event
+        return saved
+
+    def import_events(self, events, skip_existing=False):
+        """Importa eventos exportados, distribuindo-os pelos shards (uma transação por shard)"""
+        by_shard = {}
+        for event in events:
+            by_shard.setdefault(self.shard_index(event['aggregate_id']), []).append(event)
+
+        imported = []
+        for index, shard_events in by_shard.items():
+            imported.extend(self.shards[index].import_events(shard_events, skip_existing))
+        return imported
+
+    def register_append_handler(self, handler):
+        """Registra um handler chamado com cada evento gravado"""
+        for shard in self.shards:
+            shard.register_append_handler(handler)
+
+    def iter_events(self, aggregate_id=None, from_position=None, batch_size=500,
+                    from_version=None):
+        """Itera sobre os eventos; sem aggregate_id, faz o merge dos shards até visible_position"""
+        if aggregate_id:
+            yield from self._shard_for(aggregate_id).iter_events(aggregate_id, from_position, batch_size,
+                                                                 from_version)
+            return
+
+        visible = self.visible_position()
+        yield from heapq.merge(
+            *[takewhile(lambda event: event['position'] <= visible,
+                        shard.iter_events(from_position=from_position, batch_size=batch_size))
+              for shard in self.shards],
+            key=lambda event: event['position']
+        )
+
+    def get_events(self, aggregate_id=None):
+        """Obtém eventos, opcionalmente filtrados por aggregate_id"""
+        return list(self.iter_events(aggregate_id))
+
+    def _merge_pages(self, pages, limit, descending):
+        """Combina as páginas dos shards em uma página global: (eventos, next_position)"""
+        events = [event for page, _ in pages for event in page]
+        events.sort(key=lambda event: event['position'], reverse=descending)
+        more = len(events) > limit or any(next_position is not None for _, next_position in pages)
+        events = events[:limit]
+        return events, events[-1]['position'] if more and events else None
+
+    def read_all(self, after_position=None, limit=100, event_types=None):
+        """Lê uma página do log global em ordem crescente de position: (eventos, next_position)
+
+        Eventos acima de visible_position ainda não entram: aparecem numa
+        próxima leitura, sempre depois do cursor já devolvido.
+        """
+        visible = self.visible_position()
+        pages = []
+        for shard in self.shards:
+            events, next_position = shard.read_all(after_position, limit, event_types)
+            shown = [event for event in events if event['position'] <= visible]
+            pages.append((shown, next_position if len(shown) == len(events) else None))
+        return self._merge_pages(pages, limit, descending=False)
+
+    def read_all_backwards(self, before_position=None, limit=100, event_types=None):
+        """Lê uma página do log global a partir dos mais recentes: (eventos, next_position)"""
+        before = self.visible_position() + 1
+        if before_position is not None:
+            before = min(before, before_position)
+        pages = [shard.read_all_backwards(before, limit, event_types) for shard in self.shards]
+        return self._merge_pages(pages, limit, descending=True)
+
+    def get_events_by_type(self, types=None, since=None, until=None, limit=100):
+        """Obtém eventos por tipo e/ou período, em ordem cronológica (merge dos shards por timestamp)"""
+        events = [
+            event
+            for shard in self.shards
+            for event in shard.get_events_by_type(types, since, until, limit)
+        ]
+        events.sort(key=lambda event: (event['timestamp_us'], event['position']))
+        return events[:limit]
+
+    def save_snapshot(self, aggregate_id, version, state):
+        """Grava o snapshot de um agregado no seu shard"""
+        self._shard_for(aggregate_id).save_snapshot(aggregate_id, version, state)
+
+    def get_snapshot(self, aggregate_id):
+        """Obtém o snapshot mais recente de um agregado, ou None"""
+        return self._shard_for(aggregate_id).get_snapshot(aggregate_id)
+
+    def expire_idempotency_keys(self, now=None):
+        """Limpa as chaves de idempotência expiradas em todos os shards"""
+        return sum(shard.expire_idempotency_keys(now) for shard in self.shards)
+
+    @property
+    def outbox(self):
+        return self.shards[0].outbox
+
+    def release_outbox_lease(self, owner):
+        """Libera a concessão do relay em todos os shards"""
+        for shard in self.shards:
+            shard.release_outbox_lease(owner)
+
+    def fetch_outbox(self, limit=100, owner=None, lease=30.0):
+        """Obtém até limit eventos pendentes do outbox, em ordem de position global
+
+        Com owner, cada shard só devolve eventos se owner detiver a sua concessão do relay.
+        Eventos acima de visible_position ficam para a próxima chamada, para que
+        a publicação siga a ordem das positions.
+        """
+        visible = self.visible_position()
+        events = [
+            event
+            for shard in self.shards
+            for event in shard.fetch_outbox(limit, owner, lease)
+            if event['position'] <= visible
+        ]
+        events.sort(key=lambda event: event['position'])
+        return events[:limit]
+
+    def mark_outbox_sent(self, positions):
+        """Marca como publicados os eventos com as positions informadas, no shard de cada uma"""
+        positions = list(positions)
+        if not positions:
+            return
+        placeholders = ', '.join('?' for _ in positions)
+        for shard in self.shards:
+            with shard._read_pool.connection() as conn:
+                found = [row[0] for row in conn.execute(
+                    f"SELECT position FROM outbox WHERE position IN ({placeholders})", positions
+                )]
+            shard.mark_outbox_sent(found)
+
+    def purge_outbox(self, older_than=3600, now=None):
+        """Remove de todos os shards as linhas do outbox publicadas há mais de older_than segundos"""
+        return sum(shard.purge_outbox(older_than, now) for shard in self.shards)
+
+    def outbox_stats(self, now=None):
+        """Atraso do outbox somado entre os shards (o mais atrasado define lag_seconds)"""
+        stats = [shard.outbox_stats(now) for shard in self.shards]
+        oldest = [s['oldest_pending_position'] for s in stats if s['oldest_pending_position'] is not None]
+        last_sent = [s['last_sent_position'] for s in stats if s['last_sent_position'] is not None]
+        return {
+            'pending': sum(s['pending'] for s in stats),
+            'oldest_pending_position': min(oldest) if oldest else None,
+            'last_sent_position': max(last_sent) if last_sent else None,
+            'lag_seconds': max(s['lag_seconds'] for s in stats)
+        }
+
+    def get_tombstone(self, aggregate_id):
+        """Obtém a lápide de um agregado excluído e compactado, ou None"""
+        return self._shard_for(aggregate_id).get_tombstone(aggregate_id)
+
+    def release_compaction_lease(self, owner):
+        """Libera a concessão da compactação em todos os shards"""
+        for shard in self.shards:
+            shard.release_compaction_lease(owner)
+
+    def compact_deleted_aggregates(self, older_than_days=30, now=None, batch_size=100,
+                                   owner=None, lease=300.0):
+        """Executa um passo da compactação em cada shard e soma os resultados
+
+        Com owner, cada shard só é compactado se owner detiver a sua concessão.
+        """
+        result = {}
+        for shard in self.shards:
+            step = shard.compact_deleted_aggregates(older_than_days, now, batch_size, owner, lease)
+            for key, value in step.items():
+                result[key] = (result.get(key, False) or value) if key == 'more' else result.get(key, 0) + value
+        return result
+
+    def compaction_stats(self):
+        """Totais da compactação somados entre os shards"""
+        stats = {}
+        for shard in self.shards:
+            for key, value in shard.compaction_stats().items():
+                stats[key] = stats.get(key, 0) + value
+        return stats
+
+    def close(self):
+        """Fecha todos os shards"""
+        for shard in self.shards:
+            shard.close()
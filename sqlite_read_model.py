@@ -0,0 +1,224 @@
+import json
+import os
+import sqlite3
+import threading
+
+# Cada documento é guardado inteiro (JSON) na coluna data; as colunas ao lado
+# repetem os campos consultados, com chave primária ou índice
+READ_MODEL_SCHEMA_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id TEXT PRIMARY KEY,
+        username TEXT,
+        email TEXT,
+        data TEXT NOT NULL
+    )
+    ''',
+    # Usuários do Google não têm username: NULLs não conflitam no índice único
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users (email)",
+    '''
+    CREATE TABLE IF NOT EXISTS items (
+        id TEXT PRIMARY KEY,
+        user_id TEXT,
+        data TEXT NOT NULL
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_items_user_id ON items (user_id)",
+    '''
+    CREATE TABLE IF NOT EXISTS roles (
+        id TEXT PRIMARY KEY,
+        data TEXT NOT NULL
+    )
+    ''',
+]
+
+class SQLiteReadModel:
+    """Read Model em SQLite, com os mesmos métodos do ReadModel (TinyDB)
+
+    Cada save_*/delete_* altera uma linha, em vez de regravar o arquivo
+    JSON inteiro, e as consultas por id, username, email e user_id usam
+    índices. Como no TinyDB, salvar um documento existente mescla os campos
+    recebidos com os já gravados; nas buscas por username e email vale o
+    primeiro usuário que os usou (ver save_user). Os
+    documentos são devolvidos na ordem de inserção.
+
+    Com migrate_from, um readmodel.json do TinyDB é importado na primeira
+    abertura (quando o banco ainda está vazio).
+    """
+
+    def __init__(self, db_path='readmodel.db', migrate_from=None):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            for statement in READ_MODEL_SCHEMA_SQL:
+                self.conn.execute(statement)
+            self.conn.commit()
+
+        if migrate_from and os.path.exists(migrate_from) and self._is_empty():
+            self.migrate_from_json(migrate_from)
+
+    def _is_empty(self):
+        with self.lock:
+            return not any(
+                self.conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()
+                for table in ('users', 'items', 'roles')
+            )
+
+    def _get(self, query, params):
+        with self.lock:
+            row = self.conn.execute(query, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _all(self, query, params=()):
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _upsert(self, cursor, table, document, columns, tolerant=()):
+        """Grava o documento mesclado ao existente; columns são os campos indexados além do id
+
+        Os campos de tolerant já usados por outro documento ficam fora do
+        índice (NULL) em vez de gerar IntegrityError; retorna esses campos.
+        """
+        cursor.execute(f"SELECT data FROM {table} WHERE id = ?", (document.get('id'),))
+        row = cursor.fetchone()
+        if row:
+            document = dict(json.loads(row[0]), **document)
+
+        # Valores vazios não participam dos índices únicos
+        values = [document.get(column) or None for column in columns]
+        conflicts = []
+        for i, column in enumerate(columns):
+            if column in tolerant and values[i] is not None:
+                cursor.execute(f"SELECT 1 FROM {table} WHERE {column} = ? AND id != ?",
+                               (values[i], document.get('id')))
+                if cursor.fetchone():
+                    values[i] = None
+                    conflicts.append(column)
+        names = ', '.join(('id',) + columns + ('data',))
+        placeholders = ', '.join('?' for _ in range(len(columns) + 2))
+        updates = ', '.join(f"{name} = excluded.{name}" for name in columns + ('data',))
+        cursor.execute(
+            f"INSERT INTO {table} ({names}) VALUES ({placeholders}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}",
+            [document.get('id')] + values + [json.dumps(document)]
+        )
+        return conflicts
+
+    def _save(self, table, document, columns=(), tolerant=()):
+        with self.lock:
+            cursor = self.conn.cursor()
+            try:
+                conflicts = self._upsert(cursor, table, document, columns, tolerant)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        return conflicts
+
+    def _delete(self, table, document_id):
+        with self.lock:
+            self.conn.execute(f"DELETE FROM {table} WHERE id = ?", (document_id,))
+            self.conn.commit()
+
+    def get_user(self, user_id):
+        """Obtém um usuário pelo ID"""
+        return self._get("SELECT data FROM users WHERE id = ?", (user_id,))
+
+    def get_user_by_username(self, username):
+        """Obtém um usuário pelo nome de usuário"""
+        return self._get("SELECT data FROM users WHERE username = ?", (username,))
+
+    def get_user_by_email(self, email):
+        """Obtém um usuário pelo email"""
+        return self._get("SELECT data FROM users WHERE email = ?", (email,))
+
+    def get_users(self):
+        """Obtém todos os usuários"""
+        return self._all("SELECT data FROM users ORDER BY rowid")
+
+    def get_roles(self):
+        """Obtém todos os perfis"""
+        return self._all("SELECT data FROM roles ORDER BY rowid")
+
+    def get_role(self, role_id):
+        """Obtém um perfil pelo ID"""
+        return self._get("SELECT data FROM roles WHERE id = ?", (role_id,))
+
+    def save_role(self, role_data):
+        """Salva um perfil"""
+        self._save('roles', role_data)
+
+    def save_user(self, user_data):
+        """Salva ou atualiza um usuário; retorna os campos (username, email) já em uso por outro usuário
+
+        A unicidade é garantida nos comandos (AuthService); se um evento
+        ainda assim repetir username ou email, o usuário é gravado pelo id e
+        a busca por esse campo continua devolvendo o usuário anterior.
+        """
+        conflicts = self._save('users', user_data, ('username', 'email'), tolerant=('username', 'email'))
+        for field in conflicts:
+            print(f"Usuário {user_data.get('id')}: {field} {user_data.get(field)!r} já pertence a outro usuário")
+        return conflicts
+
+    def delete_user(self, user_id):
+        """Remove um usuário"""
+        self._delete('users', user_id)
+
+    def get_item(self, item_id):
+        """Obtém um item pelo ID"""
+        return self._get("SELECT data FROM items WHERE id = ?", (item_id,))
+
+    def get_items(self, user_id=None):
+        """Obtém todos os itens, opcionalmente filtrados por user_id"""
+        if user_id:
+            return self._all("SELECT data FROM items WHERE user_id = ? ORDER BY rowid", (user_id,))
+        return self._all("SELECT data FROM items ORDER BY rowid")
+
+    def save_item(self, item_data):
+        """Salva ou atualiza um item"""
+        self._save('items', item_data, ('user_id',))
+
+    def delete_item(self, item_id):
+        """Remove um item"""
+        self._delete('items', item_id)
+
+    def migrate_from_json(self, json_path):
+        """Importa um readmodel.json do TinyDB em uma única transação; retorna {tabela: documentos}
+
+        Documentos com username ou email repetidos (aceitos pelo TinyDB) são
+        ignorados, mantendo o primeiro, e listados no console.
+        """
+        with open(json_path, encoding='utf-8') as json_file:
+            content = json.load(json_file)
+
+        columns = {'users': ('username', 'email'), 'items': ('user_id',), 'roles': ()}
+        migrated = {}
+        with self.lock:
+            cursor = self.conn.cursor()
+            try:
+                for table, table_columns in columns.items():
+                    documents = content.get(table, {})
+                    # O TinyDB grava {doc_id: documento}; a ordem dos doc_ids é a de inserção
+                    migrated[table] = 0
+                    for doc_id in sorted(documents, key=int):
+                        try:
+                            self._upsert(cursor, table, documents[doc_id], table_columns)
+                            migrated[table] += 1
+                        except sqlite3.IntegrityError as e:
+                            print(f"Documento {documents[doc_id].get('id')} de {table} ignorado na migração: {e}")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        print(f"Read Model migrado de {json_path}: " +
+              ', '.join(f"{count} {table}" for table, count in migrated.items()))
+        return migrated
+
+    def close(self):
+        """Fecha a conexão com o banco"""
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,75 @@
+import unittest
+import os
+import shutil
+import tempfile
+from event_store import EventStore
+from aggregates import AggregateLoader, apply_event
+
+class TestAggregateLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = EventStore(os.path.join(self.tmp_dir, 'events.db'))
+        self.loader = AggregateLoader(self.store, snapshot_every=5)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_apply_event_merges_updates(self):
+        state = apply_event(None, {'event_type': 'USER_CREATED', 'aggregate_id': 'u1',
+                                   'data': {'username': 'ana', 'role': 'user'}})
+        state = apply_event(state, {'event_type': 'USER_UPDATED', 'aggregate_id': 'u1',
+                                    'data': {'role': 'admin'}})
+        self.assertEqual(state, {'id': 'u1', 'username': 'ana', 'role': 'admin'})
+        self.assertIsNone(apply_event(state, {'event_type': 'USER_DELETED', 'aggregate_id': 'u1',
+                                              'data': {}}))
+
+    def test_load_uses_snapshot_plus_newer_events(self):
+        self.store.save_event('i1', 'ITEM_CREATED', {'title': 'v0'})
+        for i in range(1, 7):
+            self.store.save_event('i1', 'ITEM_UPDATED', {'title': f'v{i}'})
+        self.loader.snapshot('i1')
+        self.store.save_event('i1', 'ITEM_UPDATED', {'title': 'v7'})
+
+        self.assertEqual(self.store.get_snapshot('i1')['version'], 7)
+        version, state = self.loader.load('i1')
+        self.assertEqual(version, 8)
+        self.assertEqual(state['title'], 'v7')
+
+    def test_maybe_snapshot_runs_in_background(self):
+        # Como em setup_event_sourcing: agendado pelo append, no processo que gravou o evento
+        self.store.register_append_handler(self.loader.maybe_snapshot)
+        self.loader.start()
+        try:
+            for i in range(5):
+                self.store.save_event('i1', 'ITEM_UPDATED', {'n': i})
+        finally:
+            self.loader.stop()
+        self.assertEqual(self.store.get_snapshot('i1')['version'], 5)
+
+    def test_cache_hit_skips_store_and_follows_appends(self):
+        self.store.register_append_handler(self.loader.record)
+        self.store.save_event('u1', 'USER_CREATED', {'username': 'ana'})
+        self.assertEqual(self.loader.load('u1')[0], 1)
+
+        self.store.save_event('u1', 'USER_UPDATED', {'role': 'admin'})
+        # Sem get_snapshot o acerto só passa se não houver round trip ao SQLite
+        self.store.get_snapshot = None
+        version, state = self.loader.load('u1')
+        self.assertEqual(version, 2)
+        self.assertEqual(state['role'], 'admin')
+        self.assertEqual(self.loader.get_stats()['hits'], 1)
+        self.assertEqual(self.loader.get_stats()['misses'], 1)
+
+    def test_cache_evicts_least_recently_used_and_invalidates_on_gap(self):
+        loader = AggregateLoader(self.store, snapshot_every=0, cache_size=2)
+        for aggregate_id in ('a', 'b', 'c'):
+            self.store.save_event(aggregate_id, 'ITEM_CREATED', {})
+            loader.load(aggregate_id)
+        self.assertEqual(list(loader.cache), ['b', 'c'])
+
+        loader.record({'aggregate_id': 'b', 'event_type': 'ITEM_UPDATED', 'version': 5, 'data': {}})
+        self.assertNotIn('b', loader.cache)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from async_event_store import AsyncEventStore
+from event_store import ConcurrencyError, EventStore
+
+class TestAsyncEventStore(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = AsyncEventStore(EventStore(os.path.join(self.tmp_dir, 'events.db')))
+
+    async def asyncTearDown(self):
+        await self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    async def test_concurrent_appends_and_reads(self):
+        await asyncio.gather(*[
+            self.store.save_event(f'agg-{i % 5}', 'ITEM_UPDATED', {'i': i})
+            for i in range(50)
+        ])
+        events = await self.store.get_events('agg-3')
+        self.assertEqual([e['version'] for e in events], list(range(1, 11)))
+
+        results = await asyncio.gather(*[self.store.get_events(f'agg-{i}') for i in range(5)])
+        self.assertEqual([len(r) for r in results], [10] * 5)
+
+        with self.assertRaises(ConcurrencyError):
+            await self.store.save_event('agg-0', 'ITEM_UPDATED', {}, expected_version=3)
+
+    async def test_async_iterator_replay(self):
+        await self.store.save_events([('agg-1', 'ITEM_UPDATED', {'i': i}) for i in range(25)])
+
+        positions = [e['position'] async for e in self.store.iter_events(batch_size=10)]
+        self.assertEqual(positions, list(range(1, 26)))
+
+        versions = [e['version'] async for e in self.store.iter_events('agg-1', from_version=20, batch_size=2)]
+        self.assertEqual(versions, list(range(20, 26)))
+
+if __name__ == '__main__':
+    unittest.main()
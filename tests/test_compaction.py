@@ -0,0 +1,165 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from compaction import Compactor
+from event_store import EventStore
+from event_store_verify import verify
+
+class TestCompaction(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _history(self, store):
+        store.save_event('item-1', 'ITEM_CREATED', {'title': 'A'})
+        store.save_event('item-1', 'ITEM_UPDATED', {'title': 'B', 'description': 'x' * 5000})
+        store.save_event('item-2', 'ITEM_CREATED', {'title': 'C'})
+        store.save_event('item-1', 'ITEM_DELETED', {'deleted_item': {'title': 'B', 'description': 'x' * 5000}})
+
+    def test_compacts_deleted_aggregate_into_tombstone(self):
+        store = EventStore(os.path.join(self.tmp_dir, 'events.db'))
+        self._history(store)
+        store.save_snapshot('item-1', 2, {'title': 'B'})
+
+        # Exclusões recentes não são compactadas
+        self.assertEqual(store.compact_deleted_aggregates(30)['tombstoned'], 0)
+
+        later = datetime.utcnow() + timedelta(days=31)
+        result = store.compact_deleted_aggregates(30, now=later)
+        self.assertEqual((result['tombstoned'], result['compacted'], result['events_removed']), (1, 1, 3))
+        self.assertGreater(result['bytes_removed'], 1000)
+        self.assertFalse(result['more'])
+
+        self.assertEqual(store.get_events('item-1'), [])
+        self.assertIsNone(store.get_snapshot('item-1'))
+        self.assertEqual(len(store.get_events('item-2')), 1)
+        tombstone = store.get_tombstone('item-1')
+        self.assertEqual((tombstone['event_type'], tombstone['version']), ('ITEM_DELETED', 3))
+
+        stats = store.compaction_stats()
+        self.assertEqual((stats['tombstones'], stats['pending'], stats['events_removed']), (1, 0, 3))
+        # A versão do agregado continua reservada
+        self.assertEqual(store.save_event('item-1', 'ITEM_UPDATED', {})['version'], 4)
+        store.close()
+
+    def test_verify_after_compaction(self):
+        store = EventStore(os.path.join(self.tmp_dir, 'events.db'))
+        self._history(store)
+        store.compact_deleted_aggregates(30, now=datetime.utcnow() + timedelta(days=31))
+        # O agregado volta a receber eventos a partir da versão seguinte à lápide
+        resumed = store.save_event('item-1', 'ITEM_UPDATED', {'title': 'Restaurado'})
+        store.close()
+
+        report = verify(store.db_path, workers=1)
+        self.assertTrue(report['ok'], report['findings'])
+        self.assertEqual((report['events'], report['tombstones']), (2, 1))
+
+        conn = sqlite3.connect(store.db_path)
+        conn.execute("UPDATE events SET version = 6 WHERE position = ?", (resumed['position'],))
+        conn.commit()
+        conn.close()
+        report = verify(store.db_path, workers=1)
+        self.assertEqual([(f['type'], f['expected_version'], f['version']) for f in report['findings']],
+                         [('version_gap', 4, 6)])
+
+    def test_aggregate_changed_after_deletion_is_kept(self):
+        store = EventStore(os.path.join(self.tmp_dir, 'events.db'))
+        self._history(store)
+        store.save_event('item-1', 'ITEM_UPDATED', {'title': 'Restaurado'})
+
+        result = store.compact_deleted_aggregates(30, now=datetime.utcnow() + timedelta(days=31))
+        self.assertEqual(result['tombstoned'], 0)
+        self.assertEqual(len(store.get_events('item-1')), 4)
+        store.close()
+
+    def test_rewrites_sealed_segments(self):
+        store = EventStore(os.path.join(self.tmp_dir, 'seg.db'), segment_period='day', segment_grace=0)
+        self._history(store)
+        tomorrow = datetime.utcnow() + timedelta(days=1)
+        store.roll_segments(now=tomorrow)
+        store.purge_sealed_events(now=tomorrow)
+        old_segment = store._load_segments()[0]
+        store.save_event('item-3', 'ITEM_CREATED', {'title': 'D'})
+
+        compactor = Compactor(store, older_than_days=30)
+        store_now = tomorrow + timedelta(days=31)
+        result = store.compact_deleted_aggregates(30, now=store_now)
+        self.assertEqual((result['segments_rewritten'], result['compacted'], result['events_removed']), (1, 1, 0))
+        self.assertGreater(result['segment_bytes_reclaimed'], 0)
+
+        segment = store._load_segments()[0]
+        self.assertNotEqual(segment['path'], old_segment['path'])
+        self.assertEqual(segment['event_count'], 1)
+        self.assertFalse(os.path.exists(store._segment_path(old_segment['path'])))
+        self.assertEqual([e['aggregate_id'] for e in store.get_events()], ['item-2', 'item-3'])
+        self.assertEqual(store.get_tombstone('item-1')['events_removed'], 3)
+        self.assertEqual(compactor.get_stats()['compacted'], 1)
+        store.close()
+
+        report = verify(store.db_path, workers=1)
+        self.assertTrue(report['ok'])
+        self.assertEqual(report['events'], 2)
+
+    def test_compactor_runs_until_done(self):
+        store = EventStore(os.path.join(self.tmp_dir, 'events.db'))
+        for i in range(5):
+            store.save_event(f'user-{i}', 'USER_CREATED', {'username': f'u{i}'})
+            store.save_event(f'user-{i}', 'USER_DELETED', {})
+
+        compactor = Compactor(store, older_than_days=0, batch_size=2, pause=0)
+        totals = compactor.run_once()
+        self.assertEqual((totals['compacted'], totals['events_removed']), (5, 10))
+        self.assertEqual(store.get_events(), [])
+        self.assertEqual(compactor.get_stats()['runs'], 1)
+        store.close()
+
+    def test_only_one_process_compacts(self):
+        db_path = os.path.join(self.tmp_dir, 'events.db')
+        store, other = EventStore(db_path), EventStore(db_path)
+        self._history(store)
+        first = Compactor(store, older_than_days=0)
+        second = Compactor(other, older_than_days=0)
+        self.assertTrue(store.acquire_compaction_lease(first.owner))
+
+        self.assertEqual(second.run_once().get('compacted', 0), 0)
+        self.assertIsNone(store.get_tombstone('item-1'))
+
+        first.stop()
+        self.assertEqual(second.run_once()['compacted'], 1)
+        store.close()
+        other.close()
+
+    def test_stale_segment_rewrite_is_skipped(self):
+        db_path = os.path.join(self.tmp_dir, 'seg.db')
+        store = EventStore(db_path, segment_period='day', segment_grace=0)
+        self._history(store)
+        tomorrow = datetime.utcnow() + timedelta(days=1)
+        store.roll_segments(now=tomorrow)
+        store.purge_sealed_events(now=tomorrow)
+        # Outro processo, com o catálogo lido antes da regravação
+        other = EventStore(db_path, segment_period='day', segment_grace=0)
+        stale = other._load_segments()[0]
+
+        store.compact_deleted_aggregates(30, now=tomorrow + timedelta(days=31))
+        files = sorted(os.listdir(self.tmp_dir))
+        self.assertIsNone(other._rewrite_segment(stale))
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), files)
+
+        # Com o catálogo ainda apontando para um arquivo ausente, o ATTACH falha sem recriá-lo
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE segments SET path = ? WHERE name = ?", (stale['path'], stale['name']))
+        conn.commit()
+        conn.close()
+        with self.assertRaises(sqlite3.OperationalError):
+            other._rewrite_segment(stale)
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), files)
+        store.close()
+        other.close()
+
+if __name__ == '__main__':
+    unittest.main()
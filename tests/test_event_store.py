@@ -0,0 +1,338 @@
+import unittest
+import os
+import sqlite3
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from event_store import EventStore, ConcurrencyError
+
+class TestEventStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'events.db')
+        self.store = EventStore(self.db_path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save_and_get_events(self):
+        self.store.save_event('agg-1', 'ITEM_CREATED', {'title': 'Item'})
+        self.store.save_event('agg-1', 'ITEM_UPDATED', {'title': 'Item 2'})
+
+        events = self.store.get_events('agg-1')
+        self.assertEqual([e['version'] for e in events], [1, 2])
+        self.assertEqual(events[1]['data'], {'title': 'Item 2'})
+
+    def test_connection_is_reused_per_thread(self):
+        conn = self.store._get_connection()
+        self.store.save_event('agg-1', 'ITEM_CREATED', {})
+        self.assertIs(self.store._get_connection(), conn)
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.store._get_connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], conn)
+
+    def test_connections_of_finished_threads_are_closed(self):
+        # Um servidor com uma thread por requisição não acumula conexões
+        for i in range(20):
+            thread = threading.Thread(target=self.store.save_event, args=(f'agg-{i}', 'ITEM_CREATED', {}))
+            thread.start()
+            thread.join()
+        self.assertLessEqual(len(self.store._connections), 2)
+
+        finished_conn = self.store._connections[-1][1]
+        thread = threading.Thread(target=self.store._get_connection)
+        thread.start()
+        thread.join()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            finished_conn.execute("SELECT 1")
+        self.assertEqual(len(self.store.get_events()), 20)
+
+    def test_close_releases_connections(self):
+        self.store.save_event('agg-1', 'ITEM_CREATED', {})
+        self.store.close()
+        self.assertEqual(self.store._connections, [])
+
+        # O Event Store continua utilizável após o close
+        self.store.save_event('agg-1', 'ITEM_UPDATED', {})
+        self.assertEqual(len(self.store.get_events('agg-1')), 2)
+
+    def test_open_reads_do_not_block_writers(self):
+        self.store.close()
+        self.store = EventStore(self.db_path, read_pool_size=1)
+        for i in range(5):
+            self.store.save_event('agg-1', 'ITEM_UPDATED', {'i': i})
+
+        # Uma leitura longa em andamento (cursor aberto no pool) não bloqueia escritas
+        reader = self.store.iter_events(batch_size=1)
+        next(reader)
+        errors = []
+
+        def write():
+            try:
+                self.store.save_event('agg-2', 'ITEM_CREATED', {})
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join(timeout=2.0)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(errors, [])
+
+        # Leituras aninhadas com o pool (de tamanho 1) esgotado usam uma conexão extra e veem a escrita
+        self.assertEqual(len(self.store.get_events('agg-2')), 1)
+        self.assertEqual(self.store._read_pool._overflow, [])
+        self.assertEqual(len(list(reader)), 4)
+        self.assertNotIn(self.store._get_connection(), self.store._read_pool._all)
+
+    def test_expected_version_conflict(self):
+        self.store.save_event('agg-1', 'ITEM_CREATED', {}, expected_version=0)
+        self.store.save_event('agg-1', 'ITEM_UPDATED', {}, expected_version=1)
+
+        with self.assertRaises(ConcurrencyError) as ctx:
+            self.store.save_event('agg-1', 'ITEM_UPDATED', {}, expected_version=1)
+        self.assertEqual(ctx.exception.actual_version, 2)
+        self.assertEqual(len(self.store.get_events('agg-1')), 2)
+
+    def test_concurrent_writers_get_distinct_versions(self):
+        def writer():
+            for _ in range(20):
+                self.store.save_event('agg-1', 'ITEM_UPDATED', {})
+
+        threads = [threading.Thread(target=writer) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        versions = [e['version'] for e in self.store.get_events('agg-1')]
+        self.assertEqual(versions, list(range(1, 81)))
+
+    def test_global_position_orders_all_events(self):
+        first = self.store.save_event('agg-1', 'ITEM_CREATED', {})
+        second = self.store.save_event('agg-2', 'ITEM_CREATED', {})
+        third = self.store.save_event('agg-1', 'ITEM_UPDATED', {})
+        self.assertLess(first['position'], second['position'])
+        self.assertLess(second['position'], third['position'])
+
+        positions = [e['position'] for e in self.store.get_events()]
+        self.assertEqual(positions, [first['position'], second['position'], third['position']])
+
+    def test_save_events_assigns_versions_per_aggregate(self):
+        self.store.save_event('agg-1', 'ITEM_CREATED', {})
+        events = self.store.save_events([
+            ('agg-1', 'ITEM_UPDATED', {'n': 1}),
+            ('agg-2', 'ITEM_CREATED', {'n': 2}),
+            ('agg-1', 'ITEM_UPDATED', {'n': 3}),
+        ])
+        self.assertEqual([(e['aggregate_id'], e['version']) for e in events],
+                         [('agg-1', 2), ('agg-2', 1), ('agg-1', 3)])
+        self.assertEqual([e['position'] for e in events],
+                         sorted(e['position'] for e in events))
+
+    def test_save_events_is_atomic(self):
+        with self.assertRaises(TypeError):
+            self.store.save_events([
+                ('agg-1', 'ITEM_CREATED', {}),
+                ('agg-2', 'ITEM_CREATED', object()),
+            ])
+        self.assertEqual(self.store.get_events(), [])
+
+    def test_iter_events_streams_from_position(self):
+        saved = self.store.save_events([(f'agg-{i % 3}', 'ITEM_UPDATED', {'i': i}) for i in range(10)])
+
+        iterator = self.store.iter_events(batch_size=3)
+        self.assertEqual(next(iterator)['data'], {'i': 0})
+        self.assertEqual(len(list(iterator)), 9)
+
+        resumed = list(self.store.iter_events(from_position=saved[6]['position'], batch_size=2))
+        self.assertEqual([e['data']['i'] for e in resumed], [6, 7, 8, 9])
+
+        by_aggregate = list(self.store.iter_events('agg-1', batch_size=2))
+        self.assertEqual([e['version'] for e in by_aggregate], [1, 2, 3])
+
+    def test_read_all_pages_with_keyset_cursor(self):
+        self.store.save_events([
+            (f'agg-{i}', 'ITEM_DELETED' if i % 2 else 'ITEM_CREATED', {'i': i})
+            for i in range(7)
+        ])
+
+        pages = []
+        after = None
+        while True:
+            events, after = self.store.read_all(after, limit=3)
+            pages.append([e['data']['i'] for e in events])
+            if after is None:
+                break
+        self.assertEqual(pages, [[0, 1, 2], [3, 4, 5], [6]])
+        for limit in (0, -5):
+            with self.assertRaises(ValueError):
+                self.store.read_all(None, limit=limit)
+            with self.assertRaises(ValueError):
+                self.store.read_all_backwards(None, limit=limit)
+
+        events, cursor = self.store.read_all_backwards(limit=2, event_types=['ITEM_DELETED'])
+        self.assertEqual([e['data']['i'] for e in events], [5, 3])
+        events, cursor = self.store.read_all_backwards(cursor, limit=2, event_types=['ITEM_DELETED'])
+        self.assertEqual([e['data']['i'] for e in events], [1])
+        self.assertIsNone(cursor)
+
+    def test_group_commit_concurrent_writers(self):
+        store = EventStore(os.path.join(self.tmp_dir, 'group.db'), group_commit=True)
+        errors = []
+
+        def writer(n):
+            for i in range(25):
+                event = store.save_event(f'agg-{n}', 'ITEM_UPDATED', {'i': i})
+                if event['version'] != i + 1:
+                    errors.append(event)
+
+        try:
+            threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(errors, [])
+            self.assertEqual(len(store.get_events()), 100)
+            with self.assertRaises(ConcurrencyError):
+                store.save_event('agg-0', 'ITEM_UPDATED', {}, expected_version=1)
+            self.assertEqual(store.save_event('agg-0', 'ITEM_UPDATED', {})['version'], 26)
+        finally:
+            store.close()
+
+    def test_codecs_and_compression_are_tagged_per_row(self):
+        store = EventStore(os.path.join(self.tmp_dir, 'codec.db'), compress_threshold=100)
+        try:
+            small = store.save_event('agg-1', 'ITEM_CREATED', {'title': 'a'})
+            large = store.save_event('agg-1', 'ITEM_DELETED', {'deleted_item': {'description': 'x' * 500}})
+            self.assertEqual(large['data']['deleted_item']['description'], 'x' * 500)
+
+            conn = sqlite3.connect(os.path.join(self.tmp_dir, 'codec.db'))
+            codecs = dict(conn.execute("SELECT id, codec FROM events").fetchall())
+            conn.close()
+            self.assertEqual(codecs[small['id']], 'json')
+            self.assertEqual(codecs[large['id']], 'json+zlib')
+
+            events = store.get_events('agg-1')
+            self.assertEqual(events[1]['data'], large['data'])
+            self.assertNotIn('codec', events[1])
+        finally:
+            store.close()
+
+    def test_msgpack_round_trip_and_mixed_codec_reads(self):
+        path = os.path.join(self.tmp_dir, 'mixed.db')
+        store = EventStore(path)
+        first = store.save_event('agg-1', 'ITEM_CREATED', {'title': 'json', 'tags': ['a', 'b']})
+        store.close()
+
+        # O mesmo banco, agora gravando em msgpack (comprimido acima de 100 bytes)
+        store = EventStore(path, codec='msgpack', compress_threshold=100)
+        try:
+            payloads = [
+                {'title': 'msgpack', 'price': 9.5, 'active': True, 'owner': None},
+                {'description': 'é' * 300, 'nested': {'ids': [1, 2, 3]}},
+            ]
+            for payload in payloads:
+                self.assertEqual(store.save_event('agg-1', 'ITEM_UPDATED', payload)['data'], payload)
+
+            conn = sqlite3.connect(path)
+            codecs = [row[0] for row in conn.execute("SELECT codec FROM events ORDER BY position")]
+            conn.close()
+            self.assertEqual(codecs, ['json', 'msgpack', 'msgpack+zlib'])
+
+            events = store.get_events('agg-1')
+            self.assertEqual([e['data'] for e in events], [first['data']] + payloads)
+        finally:
+            store.close()
+
+    def test_get_events_by_type_and_time_range(self):
+        self.store.save_event('agg-1', 'ITEM_CREATED', {})
+        deleted = self.store.save_event('agg-1', 'ITEM_DELETED', {})
+        self.store.save_event('agg-2', 'USER_CREATED', {})
+
+        now = datetime.utcnow()
+        events = self.store.get_events_by_type('ITEM_DELETED', since=now - timedelta(hours=1))
+        self.assertEqual([e['id'] for e in events], [deleted['id']])
+
+        events = self.store.get_events_by_type(['ITEM_CREATED', 'USER_CREATED'])
+        self.assertEqual([e['event_type'] for e in events], ['ITEM_CREATED', 'USER_CREATED'])
+        self.assertEqual(self.store.get_events_by_type(until=now - timedelta(hours=1)), [])
+
+        plan = self.store._get_connection().execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM events WHERE event_type IN ('ITEM_DELETED') "
+            "AND timestamp_us >= 0 ORDER BY timestamp_us, position"
+        ).fetchall()
+        self.assertIn('idx_events_type_timestamp', ' '.join(row[3] for row in plan))
+
+    def test_segments_roll_and_reads_span_them(self):
+        store = EventStore(os.path.join(self.tmp_dir, 'seg.db'), segment_period='day', segment_grace=0)
+        try:
+            store.save_events([(f'agg-{i % 2}', 'ITEM_UPDATED', {'i': i}) for i in range(6)])
+            tomorrow = datetime.utcnow() + timedelta(days=1)
+            sealed = store.roll_segments(now=tomorrow)
+            self.assertEqual(len(sealed), 1)
+            store.purge_sealed_events(now=tomorrow)
+            # As linhas seladas saíram do banco principal
+            head_count = store._get_connection().execute("SELECT COUNT(*) FROM events").fetchone()[0]
+            self.assertEqual(head_count, 0)
+
+            segment_path = os.path.join(self.tmp_dir, store._load_segments()[0]['path'])
+            self.assertTrue(os.path.exists(segment_path))
+
+            recent = store.save_event('agg-0', 'ITEM_UPDATED', {'i': 6})
+            self.assertEqual(recent['version'], 4)
+            self.assertEqual(recent['position'], 7)
+
+            self.assertEqual([e['data']['i'] for e in store.get_events()], list(range(7)))
+            self.assertEqual([e['version'] for e in store.get_events('agg-0')], [1, 2, 3, 4])
+            self.assertEqual([e['data']['i'] for e in store.iter_events(from_position=5)], [4, 5, 6])
+
+            events, cursor = store.read_all_backwards(limit=3)
+            self.assertEqual([e['data']['i'] for e in events], [6, 5, 4])
+            events, cursor = store.read_all(after_position=2, limit=10)
+            self.assertEqual([e['data']['i'] for e in events], [2, 3, 4, 5, 6])
+            self.assertEqual(len(store.get_events_by_type('ITEM_UPDATED', limit=5)), 5)
+
+            with self.assertRaises(ConcurrencyError):
+                store.save_event('agg-1', 'ITEM_UPDATED', {}, expected_version=2)
+        finally:
+            store.close()
+
+    def test_migrates_legacy_schema(self):
+        legacy_path = os.path.join(self.tmp_dir, 'legacy.db')
+        conn = sqlite3.connect(legacy_path)
+        conn.execute('''
+        CREATE TABLE events (
+            id TEXT PRIMARY KEY,
+            aggregate_id TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            data TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            version INTEGER NOT NULL
+        )
+        ''')
+        conn.execute("INSERT INTO events VALUES ('e2', 'agg-1', 'ITEM_UPDATED', '{}', '2024-01-02T00:00:00', 2)")
+        conn.execute("INSERT INTO events VALUES ('e1', 'agg-1', 'ITEM_CREATED', '{}', '2024-01-01T00:00:00', 1)")
+        conn.commit()
+        conn.close()
+
+        store = EventStore(legacy_path)
+        try:
+            events = store.get_events()
+            self.assertEqual([e['id'] for e in events], ['e1', 'e2'])
+            self.assertEqual([e['position'] for e in events], [1, 2])
+            # 2024-01-01T00:00:00 UTC em microssegundos desde a época
+            self.assertEqual(events[0]['timestamp_us'], 1704067200000000)
+            self.assertEqual(store.save_event('agg-1', 'ITEM_UPDATED', {})['version'], 3)
+        finally:
+            store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+from event_store import ConcurrencyError, EventStore
+from event_store_cli import export_events, import_events, main
+
+class TestEventStoreCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source = EventStore(os.path.join(self.tmp_dir, 'source.db'))
+        for i in range(30):
+            self.source.save_event(f'agg-{i % 3}', 'ITEM_UPDATED', {'i': i})
+
+    def tearDown(self):
+        self.source.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip_compressed(self):
+        path = os.path.join(self.tmp_dir, 'events.jsonl.gz')
+        self.assertEqual(export_events(self.source, path), 30)
+
+        target = EventStore(os.path.join(self.tmp_dir, 'target.db'))
+        self.assertEqual(import_events(target, path, batch_size=7), 30)
+        original = self.source.get_events()
+        copied = target.get_events()
+        for field in ('id', 'aggregate_id', 'data', 'timestamp', 'version', 'position'):
+            self.assertEqual([e[field] for e in copied], [e[field] for e in original])
+        target.close()
+
+    def test_position_range_and_resume(self):
+        path = os.path.join(self.tmp_dir, 'events.jsonl')
+        self.assertEqual(export_events(self.source, path, from_position=1, to_position=12), 12)
+        full_path = os.path.join(self.tmp_dir, 'full.jsonl')
+        export_events(self.source, full_path)
+
+        target = EventStore(os.path.join(self.tmp_dir, 'target.db'))
+        import_events(target, path)
+        # Reimportar sem --skip-existing falha na verificação de versões
+        with self.assertRaises(ConcurrencyError):
+            import_events(target, full_path)
+        import_events(target, full_path, skip_existing=True)
+        self.assertEqual([e['version'] for e in target.get_events('agg-1')], list(range(1, 11)))
+        target.close()
+
+    def test_main(self):
+        path = os.path.join(self.tmp_dir, 'events.jsonl')
+        self.source.close()
+        self.assertEqual(main(['export', path, '--db', os.path.join(self.tmp_dir, 'source.db')]), 0)
+        self.assertEqual(main(['import', path, '--db', os.path.join(self.tmp_dir, 'target.db')]), 0)
+        self.assertEqual(main(['import', path, '--db', os.path.join(self.tmp_dir, 'target.db')]), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from event_store import EventStore
+from event_store_verify import main, verify
+
+class TestEventStoreVerify(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'events.db')
+        self.store = EventStore(self.db_path)
+        for i in range(40):
+            self.store.save_event(f'agg-{i % 4}', 'ITEM_UPDATED', {'i': i})
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _raw_execute(self, sql, params=()):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+
+    def test_intact_log(self):
+        report = verify(self.db_path, workers=2, block_size=7)
+
+        self.assertTrue(report['ok'])
+        self.assertEqual(report['events'], 40)
+        self.assertEqual(report['aggregates'], 4)
+        self.assertEqual(report['blocks'], 6)
+        self.assertEqual(report['findings'], [])
+
+    def test_detects_gap_and_undecodable_payload(self):
+        # Remove a versão 5 de agg-1 (position 18) e corrompe o payload da position 30
+        self._raw_execute("DELETE FROM events WHERE aggregate_id = 'agg-1' AND version = 5")
+        self._raw_execute("UPDATE events SET data = '{quebrado' WHERE position = 30")
+
+        report = verify(self.db_path, workers=2, block_size=7)
+
+        self.assertFalse(report['ok'])
+        self.assertEqual([(f['type'], f['position']) for f in report['findings']],
+                         [('version_gap', 22), ('undecodable', 30)])
+        gap = report['findings'][0]
+        self.assertEqual((gap['aggregate_id'], gap['expected_version'], gap['version']), ('agg-1', 5, 6))
+
+    def test_detects_duplicate_id_between_segment_and_main_db(self):
+        store = EventStore(os.path.join(self.tmp_dir, 'seg.db'), segment_period='day', segment_grace=0)
+        first = store.save_event('agg-1', 'ITEM_CREATED', {'title': 'A'})
+        store.save_event('agg-1', 'ITEM_UPDATED', {'title': 'B'})
+        tomorrow = datetime.utcnow() + timedelta(days=1)
+        store.roll_segments(now=tomorrow)
+        store.purge_sealed_events(now=tomorrow)
+        store.save_event('agg-1', 'ITEM_UPDATED', {'title': 'C'})
+        store.close()
+
+        conn = sqlite3.connect(store.db_path)
+        conn.execute("UPDATE events SET id = ? WHERE position = 3", (first['id'],))
+        conn.commit()
+        conn.close()
+
+        report = verify(store.db_path, workers=2, block_size=2)
+        self.assertEqual([(f['type'], f['id'], f['positions']) for f in report['findings']],
+                         [('duplicate_id', first['id'], [1, 3])])
+
+    def test_hash_chain_is_independent_of_workers_and_detects_changes(self):
+        one = verify(self.db_path, workers=1, block_size=10, hash_chain=True)
+        two = verify(self.db_path, workers=3, block_size=10, hash_chain=True)
+        self.assertEqual(one['hash_chain'], two['hash_chain'])
+        self.assertEqual(len(one['hash_chain']['blocks']), 4)
+
+        self._raw_execute("UPDATE events SET data = '{\"i\":99}' WHERE position = 25")
+        changed = verify(self.db_path, workers=2, block_size=10, hash_chain=True)
+        self.assertTrue(changed['ok'])
+        self.assertNotEqual(changed['hash_chain']['head'], one['hash_chain']['head'])
+        # Apenas o bloco alterado (positions 21 a 30) muda de hash
+        self.assertEqual([b['hash'] == o['hash'] for b, o in zip(changed['hash_chain']['blocks'],
+                                                                 one['hash_chain']['blocks'])],
+                         [True, True, False, True])
+
+    def test_cli_writes_json_report_and_exit_code(self):
+        output = os.path.join(self.tmp_dir, 'report.json')
+        self.assertEqual(main(['--db', self.db_path, '--workers', '2', '--output', output]), 0)
+        with open(output, encoding='utf-8') as report_file:
+            self.assertTrue(json.load(report_file)['ok'])
+
+        self._raw_execute("UPDATE events SET version = 20 WHERE position = 40")
+        self.assertEqual(main(['--db', self.db_path, '--workers', '2', '--output', output]), 1)
+
+if __name__ == '__main__':
+    unittest.main()
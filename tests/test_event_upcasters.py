@@ -0,0 +1,76 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from event_store import EventStore
+from event_upcasters import EventUpcasters, default_upcasters
+
+class TestEventUpcasters(unittest.TestCase):
+    def test_chain_and_cache(self):
+        calls = []
+
+        def v1_to_v2(data):
+            calls.append(1)
+            return dict(data, b=data['a'])
+
+        upcasters = EventUpcasters(cache_size=10)
+        upcasters.register('X', 1, v1_to_v2)
+        upcasters.register('X', 2, lambda data: dict(data, c=True))
+        self.assertEqual(upcasters.current_version('X'), 3)
+        self.assertEqual(upcasters.current_version('Y'), 1)
+
+        for _ in range(3):
+            event = upcasters.upcast({'id': 'e1', 'event_type': 'X', 'data': {'a': 1}})
+            self.assertEqual(event['data'], {'a': 1, 'b': 1, 'c': True})
+            self.assertEqual(event['schema_version'], 3)
+        self.assertEqual(len(calls), 1)
+
+        # Eventos já na versão atual passam sem conversão
+        event = upcasters.upcast({'id': 'e2', 'event_type': 'X', 'data': {}, 'schema_version': 3})
+        self.assertEqual(event['data'], {})
+
+    def test_user_created_v2(self):
+        upcasters = default_upcasters()
+        google = upcasters.upcast({'id': 'g', 'event_type': 'USER_CREATED',
+                                   'data': {'name': 'G', 'google_id': '123', 'avatar': 'a.png'}})['data']
+        self.assertEqual((google['username'], google['auth_type'], google['google_id']), (None, 'google', '123'))
+        local = upcasters.upcast({'id': 'l', 'event_type': 'USER_CREATED',
+                                  'data': {'username': 'ana', 'auth_type': 'local'}})['data']
+        self.assertEqual((local['avatar'], local['google_id']), (None, None))
+
+class TestEventStoreUpcasting(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'events.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_legacy_rows_are_upcast_on_read(self):
+        # Banco anterior à coluna schema_version
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "CREATE TABLE events (id TEXT PRIMARY KEY, aggregate_id TEXT NOT NULL, event_type TEXT NOT NULL, "
+            "data TEXT NOT NULL, timestamp TEXT NOT NULL, version INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "INSERT INTO events VALUES ('e1', 'user-1', 'USER_CREATED', "
+            "'{\"name\": \"G\", \"google_id\": \"123\"}', '2024-01-01T00:00:00', 1)"
+        )
+        conn.commit()
+        conn.close()
+
+        store = EventStore(self.db_path)
+        event = store.get_events('user-1')[0]
+        self.assertEqual(event['schema_version'], 2)
+        self.assertIsNone(event['data']['username'])
+        self.assertEqual(event['data']['auth_type'], 'google')
+
+        saved = store.save_event('user-2', 'USER_CREATED', {'username': 'ana', 'auth_type': 'local'})
+        self.assertEqual(saved['data']['google_id'], None)
+        self.assertEqual(store.get_events('user-2')[0]['data'], saved['data'])
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from event_store import ConcurrencyError, EventStore
+from item_service import ItemService
+from log_event_store import LogEventStore
+from memory_event_store import InMemoryEventStore
+from sharded_event_store import ShardedEventStore
+
+class FakeEventBus:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, event):
+        self.published.append(event)
+
+class TestIdempotencyKeys(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _stores(self):
+        return [
+            EventStore(os.path.join(self.tmp_dir, 'events.db')),
+            EventStore(os.path.join(self.tmp_dir, 'events_gc.db'), group_commit=True),
+            LogEventStore(os.path.join(self.tmp_dir, 'log'), fsync=False),
+            InMemoryEventStore(),
+        ]
+
+    def test_retry_returns_original_event(self):
+        for store in self._stores():
+            appended = []
+            store.register_append_handler(appended.append)
+            first = store.save_event('item-1', 'ITEM_CREATED', {'title': 'A'}, idempotency_key='k1')
+            retry = store.save_event('item-2', 'ITEM_CREATED', {'title': 'B'}, idempotency_key='k1')
+
+            self.assertEqual(retry['id'], first['id'])
+            self.assertEqual(retry['aggregate_id'], 'item-1')
+            self.assertTrue(retry['replayed'])
+            self.assertNotIn('replayed', first)
+            self.assertEqual(len(store.get_events()), 1)
+            self.assertEqual(len(appended), 1)
+            store.close()
+
+    def test_expired_key_can_be_reused(self):
+        store = EventStore(os.path.join(self.tmp_dir, 'events.db'), idempotency_ttl=60)
+        store.save_event('item-1', 'ITEM_CREATED', {}, idempotency_key='k1')
+        self.assertEqual(store.expire_idempotency_keys(now=datetime.utcnow() + timedelta(seconds=120)), 1)
+        self.assertNotIn('replayed', store.save_event('item-2', 'ITEM_CREATED', {}, idempotency_key='k1'))
+
+        # Chave expirada mas ainda não limpa também não bloqueia a reutilização
+        store.idempotency_ttl = 0
+        self.assertNotIn('replayed', store.save_event('item-3', 'ITEM_CREATED', {}, idempotency_key='k1'))
+        self.assertEqual(len(store.get_events()), 3)
+        store.close()
+
+    def test_item_service_does_not_republish(self):
+        bus = FakeEventBus()
+        service = ItemService(InMemoryEventStore(), bus, None)
+        first = service.create_item({'title': 'A'}, idempotency_key='user-1:abc')
+        self.assertEqual(service.create_item({'title': 'A'}, idempotency_key='user-1:abc'), first)
+        self.assertNotEqual(service.create_item({'title': 'A'}), first)
+        self.assertEqual(len(bus.published), 2)
+
+    def test_concurrent_retries_on_sharded_store_create_one_item(self):
+        store = ShardedEventStore(os.path.join(self.tmp_dir, 'sharded.db'), shards=4)
+        bus = FakeEventBus()
+        service = ItemService(store, bus, None)
+        for n in range(20):
+            ids = []
+            threads = [
+                threading.Thread(target=lambda: ids.append(
+                    service.create_item({'title': 'A'}, idempotency_key=f'user-1:{n}')
+                ))
+                for _ in range(2)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(set(ids)), 1)
+        self.assertEqual(len(store.get_events()), 20)
+        self.assertEqual(len(bus.published), 20)
+        store.close()
+
+    def test_reused_expired_key_does_not_overwrite_item(self):
+        store = InMemoryEventStore(idempotency_ttl=0)
+        service = ItemService(store, FakeEventBus(), None)
+        service.create_item({'title': 'A'}, idempotency_key='user-1:abc')
+        with self.assertRaises(ConcurrencyError):
+            service.create_item({'title': 'B'}, idempotency_key='user-1:abc')
+        self.assertEqual(len(store.get_events()), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import unittest
+import shutil
+import tempfile
+from event_store import ConcurrencyError
+from log_event_store import LogEventStore
+
+class TestLogEventStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = LogEventStore(self.tmp_dir, segment_size=512, index_interval=4, fsync=False)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_append_and_read_across_segments(self):
+        for i in range(20):
+            self.store.save_event(f'agg-{i % 3}', 'ITEM_UPDATED', {'i': i})
+        self.assertGreater(len(self.store.segments), 1)
+
+        self.assertEqual([e['data']['i'] for e in self.store.get_events()], list(range(20)))
+        self.assertEqual([e['version'] for e in self.store.get_events('agg-1')], list(range(1, 8)))
+        self.assertEqual([e['position'] for e in self.store.iter_events(from_position=14)],
+                         list(range(14, 21)))
+
+        events, cursor = self.store.read_all(after_position=5, limit=3)
+        self.assertEqual([e['position'] for e in events], [6, 7, 8])
+        self.assertEqual(cursor, 8)
+
+    def test_expected_version_and_batches(self):
+        self.store.save_events([('agg-1', 'ITEM_CREATED', {}), ('agg-1', 'ITEM_UPDATED', {})])
+        with self.assertRaises(ConcurrencyError):
+            self.store.save_event('agg-1', 'ITEM_UPDATED', {}, expected_version=1)
+        self.assertEqual(self.store.save_event('agg-1', 'ITEM_UPDATED', {}, expected_version=2)['version'], 3)
+
+    def test_reopen_rebuilds_indexes_and_truncates_torn_tail(self):
+        for i in range(10):
+            self.store.save_event('agg-1', 'ITEM_UPDATED', {'i': i})
+        last_segment = self.store.segments[-1]['path']
+        self.store.close()
+
+        with open(last_segment, 'ab') as f:
+            f.write(b'\x40\x00\x00\x00garbage')
+
+        self.store = LogEventStore(self.tmp_dir, segment_size=512, index_interval=4, fsync=False)
+        self.assertEqual(len(self.store.get_events('agg-1')), 10)
+        self.assertEqual(self.store.save_event('agg-1', 'ITEM_UPDATED', {})['position'], 11)
+        self.assertEqual(len(self.store.get_events()), 11)
+
+    def test_directory_is_locked_to_one_process(self):
+        self.store.save_event('agg-1', 'ITEM_CREATED', {})
+        # A trava é do arquivo aberto: uma segunda abertura falha como a de outro processo
+        with self.assertRaises(ValueError):
+            LogEventStore(self.tmp_dir, fsync=False)
+
+        if hasattr(os, 'fork'):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    self.store.save_event('agg-1', 'ITEM_UPDATED', {})
+                except ValueError:
+                    os._exit(0)
+                os._exit(1)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+        self.store.close()
+        self.store = LogEventStore(self.tmp_dir, fsync=False)
+        self.assertEqual(self.store.save_event('agg-1', 'ITEM_UPDATED', {})['position'], 2)
+
+    def test_backwards_pages_and_events_by_type(self):
+        self.store.save_events([(f'agg-{i}', 'ITEM_CREATED', {'i': i}) for i in range(3)])
+        for i in range(3, 11):
+            self.store.save_event(f'agg-{i}', 'ITEM_DELETED' if i % 2 else 'ITEM_CREATED', {'i': i})
+
+        pages = []
+        before = None
+        while True:
+            events, before = self.store.read_all_backwards(before, limit=4)
+            pages.append([e['position'] for e in events])
+            if before is None:
+                break
+        self.assertEqual(pages, [[11, 10, 9, 8], [7, 6, 5, 4], [3, 2, 1]])
+
+        events, cursor = self.store.read_all_backwards(limit=2, event_types=['ITEM_DELETED'])
+        self.assertEqual([e['data']['i'] for e in events], [9, 7])
+        with self.assertRaises(ValueError):
+            self.store.read_all(None, limit=0)
+
+        deleted = self.store.get_events_by_type('ITEM_DELETED', limit=3)
+        self.assertEqual([e['data']['i'] for e in deleted], [3, 5, 7])
+        self.assertEqual(self.store.get_events_by_type(since=deleted[-1]['timestamp_us'], limit=100)[0]['data'],
+                         {'i': 7})
+
+    def test_reads_apply_upcasters(self):
+        saved = self.store.save_event('user-1', 'USER_CREATED', {'name': 'Ana', 'google_id': 'g1'})
+        self.assertEqual(saved['data']['auth_type'], 'google')
+
+        for event in (self.store.get_events('user-1')[0], self.store.get_events()[0],
+                      self.store.read_all()[0][0], self.store.read_all_backwards()[0][0],
+                      self.store.get_events_by_type('USER_CREATED')[0]):
+            self.assertEqual(event['schema_version'], 2)
+            self.assertEqual((event['data']['auth_type'], event['data']['username']), ('google', None))
+
+    def test_snapshots_survive_reopen(self):
+        state = {'title': 'A'}
+        self.store.save_snapshot('item-1', 3, state)
+        self.store.save_snapshot('item-1', 2, {'title': 'antigo'})
+        state['title'] = 'alterado depois'
+        self.assertEqual(self.store.get_snapshot('item-1')['state'], {'title': 'A'})
+        self.store.close()
+
+        self.store = LogEventStore(self.tmp_dir, segment_size=512, index_interval=4, fsync=False)
+        snapshot = self.store.get_snapshot('item-1')
+        self.assertEqual((snapshot['version'], snapshot['state']), (3, {'title': 'A'}))
+        self.assertIsNone(self.store.get_snapshot('item-2'))
+        self.assertEqual(self.store.get_events(), [])
+
+if __name__ == '__main__':
+    unittest.main()
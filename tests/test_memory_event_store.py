@@ -0,0 +1,58 @@
+import unittest
+from aggregates import AggregateLoader
+from event_store import ConcurrencyError
+from event_handlers import EventHandlers
+from memory_event_store import InMemoryEventStore
+from read_model import InMemoryReadModel
+
+class TestInMemoryEventStore(unittest.TestCase):
+    def setUp(self):
+        self.store = InMemoryEventStore()
+
+    def test_same_semantics_as_sqlite_store(self):
+        for i in range(10):
+            self.store.save_event(f'agg-{i % 2}', 'ITEM_UPDATED', {'i': i})
+
+        self.assertEqual([e['data']['i'] for e in self.store.get_events()], list(range(10)))
+        self.assertEqual([e['version'] for e in self.store.get_events('agg-1')], [1, 2, 3, 4, 5])
+        self.assertEqual([e['version'] for e in self.store.iter_events('agg-0', from_version=4)], [4, 5])
+
+        events, cursor = self.store.read_all(after_position=2, limit=3)
+        self.assertEqual([e['position'] for e in events], [3, 4, 5])
+        self.assertEqual(cursor, 5)
+        events, cursor = self.store.read_all_backwards(limit=4)
+        self.assertEqual([e['position'] for e in events], [10, 9, 8, 7])
+        self.assertEqual(cursor, 7)
+        events, cursor = self.store.read_all_backwards(before_position=3)
+        self.assertEqual([e['position'] for e in events], [2, 1])
+        self.assertIsNone(cursor)
+
+        with self.assertRaises(ConcurrencyError):
+            self.store.save_event('agg-0', 'ITEM_UPDATED', {}, expected_version=3)
+
+    def test_save_events_is_atomic(self):
+        self.store.save_event('agg-1', 'ITEM_CREATED', {})
+        with self.assertRaises(ValueError):
+            self.store.save_events([('agg-1', 'ITEM_UPDATED', {}), ('agg-2', 'ITEM_CREATED')])
+        self.assertEqual(len(self.store.get_events()), 1)
+        self.assertEqual(self.store.save_event('agg-1', 'ITEM_UPDATED', {})['version'], 2)
+
+    def test_loader_and_read_model_in_memory(self):
+        loader = AggregateLoader(self.store, snapshot_every=2)
+        self.store.register_append_handler(loader.record)
+        self.store.save_event('item-1', 'ITEM_CREATED', {'title': 'A'})
+        self.store.save_event('item-1', 'ITEM_UPDATED', {'title': 'B'})
+        loader.snapshot('item-1')
+        self.assertEqual(self.store.get_snapshot('item-1')['version'], 2)
+        self.assertEqual(loader.load('item-1'), (2, {'title': 'B', 'id': 'item-1'}))
+
+        read_model = InMemoryReadModel()
+        handlers = EventHandlers(read_model)
+        handlers.handle_item_created({
+            'aggregate_id': 'item-1',
+            'data': {'title': 'A', 'user_id': 'user-1'}
+        })
+        self.assertEqual(read_model.get_items('user-1')[0]['id'], 'item-1')
+
+if __name__ == '__main__':
+    unittest.main()
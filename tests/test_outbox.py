@@ -0,0 +1,169 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from event_store import EventStore
+from item_service import ItemService
+from outbox import OutboxRelay
+from sharded_event_store import ShardedEventStore
+
+class FakeEventBus:
+    def __init__(self, fail=0):
+        self.batches = []
+        self.fail = fail
+
+    def publish_many(self, events):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("Redis indisponível")
+        self.batches.append(events)
+
+    @property
+    def published(self):
+        return [event for batch in self.batches for event in batch]
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.event_store = EventStore(os.path.join(self.tmp_dir, 'events.db'), outbox=True)
+
+    def tearDown(self):
+        self.event_store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_event_and_outbox_row_written_together(self):
+        event = self.event_store.save_event('item-1', 'ITEM_CREATED', {'title': 'A'})
+
+        pending = self.event_store.fetch_outbox()
+        self.assertEqual([e['id'] for e in pending], [event['id']])
+        self.assertEqual(pending[0]['position'], event['position'])
+        self.assertEqual(self.event_store.outbox_stats()['pending'], 1)
+
+    def test_idempotent_retry_is_not_queued_twice(self):
+        self.event_store.save_event('item-1', 'ITEM_CREATED', {'title': 'A'}, idempotency_key='k1')
+        self.event_store.save_event('item-2', 'ITEM_CREATED', {'title': 'A'}, idempotency_key='k1')
+
+        self.assertEqual(len(self.event_store.fetch_outbox()), 1)
+
+    def test_relay_publishes_in_batches_and_marks_sent(self):
+        self.event_store.save_events([(f'item-{i}', 'ITEM_CREATED', {'title': str(i)}) for i in range(5)])
+        event_bus = FakeEventBus()
+        relay = OutboxRelay(self.event_store, event_bus, batch_size=2)
+
+        self.assertEqual(relay.relay_once(), 2)
+        self.assertEqual(relay.relay_once(), 2)
+        self.assertEqual(relay.relay_once(), 1)
+        self.assertEqual(relay.relay_once(), 0)
+
+        self.assertEqual([len(batch) for batch in event_bus.batches], [2, 2, 1])
+        positions = [event['position'] for event in event_bus.published]
+        self.assertEqual(positions, sorted(positions))
+        stats = relay.get_stats()
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['last_sent_position'], positions[-1])
+        self.assertEqual(stats['lag_seconds'], 0.0)
+
+    def test_lag_reports_oldest_pending_event(self):
+        event = self.event_store.save_event('item-1', 'ITEM_CREATED', {'title': 'A'})
+        later = datetime.utcnow() + timedelta(seconds=30)
+
+        stats = self.event_store.outbox_stats(now=later)
+        self.assertEqual(stats['oldest_pending_position'], event['position'])
+        self.assertGreaterEqual(stats['lag_seconds'], 29)
+
+    def test_purge_removes_only_old_sent_rows(self):
+        first = self.event_store.save_event('item-1', 'ITEM_CREATED', {'title': 'A'})
+        self.event_store.save_event('item-2', 'ITEM_CREATED', {'title': 'B'})
+        self.event_store.mark_outbox_sent([first['position']])
+
+        self.assertEqual(self.event_store.purge_outbox(3600), 0)
+        later = datetime.utcnow() + timedelta(hours=2)
+        self.assertEqual(self.event_store.purge_outbox(3600, now=later), 1)
+        self.assertEqual(self.event_store.outbox_stats()['pending'], 1)
+
+    def test_background_relay_delivers_service_events(self):
+        event_bus = FakeEventBus(fail=1)
+        relay = OutboxRelay(self.event_store, event_bus, interval=0.05)
+        item_service = ItemService(self.event_store, relay, None)
+        relay.start()
+        try:
+            item_id = item_service.create_item({'title': 'Item', 'description': 'Descrição', 'user_id': 'user-1'})
+            deadline = time.time() + 5
+            while not event_bus.published and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            relay.stop()
+
+        # A primeira tentativa falhou e o lote foi publicado de novo
+        self.assertEqual(relay.errors, 1)
+        self.assertEqual([event['aggregate_id'] for event in event_bus.published], [item_id])
+        self.assertEqual(self.event_store.outbox_stats()['pending'], 0)
+
+    def test_only_one_relay_publishes(self):
+        self.event_store.save_events([(f'item-{i}', 'ITEM_CREATED', {'title': str(i)}) for i in range(3)])
+        first_bus, second_bus = FakeEventBus(), FakeEventBus()
+        first = OutboxRelay(self.event_store, first_bus)
+        second = OutboxRelay(self.event_store, second_bus)
+
+        self.assertEqual(first.relay_once(), 3)
+        self.event_store.save_event('item-3', 'ITEM_CREATED', {'title': '3'})
+        self.assertEqual(second.relay_once(), 0)
+        self.assertEqual(first.relay_once(), 1)
+        self.assertEqual(second_bus.published, [])
+
+        # Quando o dono para, o outro relay assume
+        first.stop()
+        self.event_store.save_event('item-4', 'ITEM_CREATED', {'title': '4'})
+        self.assertEqual(second.relay_once(), 1)
+        self.assertEqual([e['aggregate_id'] for e in second_bus.published], ['item-4'])
+
+    def test_expired_lease_is_taken_over(self):
+        self.assertTrue(self.event_store.acquire_outbox_lease('a', lease=30))
+        self.assertFalse(self.event_store.acquire_outbox_lease('b', lease=30))
+        self.assertTrue(self.event_store.acquire_outbox_lease('a', lease=30))
+        later = datetime.utcnow() + timedelta(seconds=31)
+        self.assertTrue(self.event_store.acquire_outbox_lease('b', lease=30, now=later))
+        self.assertFalse(self.event_store.acquire_outbox_lease('a', lease=30, now=later))
+
+    def test_segment_purge_keeps_pending_outbox_events(self):
+        store = EventStore(os.path.join(self.tmp_dir, 'seg.db'), outbox=True,
+                           segment_period='day', segment_grace=0)
+        try:
+            saved = [store.save_event(f'item-{i}', 'ITEM_CREATED', {'title': str(i)}) for i in range(3)]
+            store.mark_outbox_sent([saved[0]['position']])
+            tomorrow = datetime.utcnow() + timedelta(days=1)
+            store.roll_segments(now=tomorrow)
+
+            # Só a linha já publicada sai do banco principal
+            self.assertEqual(store.purge_sealed_events(now=tomorrow), 1)
+            self.assertEqual([e['id'] for e in store.fetch_outbox()], [e['id'] for e in saved[1:]])
+
+            store.mark_outbox_sent([e['position'] for e in saved[1:]])
+            self.assertEqual(store.purge_sealed_events(now=tomorrow), 2)
+            self.assertEqual(len(store.get_events()), 3)
+        finally:
+            store.close()
+
+    def test_sharded_outbox_uses_global_positions(self):
+        store = ShardedEventStore(os.path.join(self.tmp_dir, 'sharded.db'), shards=3, outbox=True)
+        try:
+            saved = [store.save_event(f'item-{i}', 'ITEM_CREATED', {'title': str(i)}) for i in range(6)]
+            event_bus = FakeEventBus()
+            relay = OutboxRelay(store, event_bus, batch_size=4)
+            while relay.relay_once():
+                pass
+
+            self.assertEqual(
+                sorted(event['position'] for event in event_bus.published),
+                sorted(event['position'] for event in saved)
+            )
+            stats = store.outbox_stats()
+            self.assertEqual(stats['pending'], 0)
+            self.assertEqual(stats['last_sent_position'], max(event['position'] for event in saved))
+        finally:
+            store.close()
+
+if __name__ == '__main__':
+    unittest.main()
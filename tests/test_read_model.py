@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+from read_model import ReadModel, InMemoryReadModel
+
+class TestReadModelIndexes(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'readmodel.json')
+        self.read_model = ReadModel(self.path)
+
+    def tearDown(self):
+        self.read_model.db.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_indexes_follow_saves_and_deletes(self):
+        self.read_model.save_user({'id': 'u1', 'username': 'ana', 'email': 'ana@example.com'})
+        self.read_model.save_user({'id': 'u2', 'username': 'bia', 'email': 'bia@example.com'})
+
+        self.read_model.save_user({'id': 'u1', 'username': 'ana.maria', 'name': 'Ana'})
+        self.assertIsNone(self.read_model.get_user_by_username('ana'))
+        self.assertEqual(self.read_model.get_user_by_username('ana.maria'),
+                         {'id': 'u1', 'username': 'ana.maria', 'email': 'ana@example.com', 'name': 'Ana'})
+        self.assertEqual(self.read_model.get_user_by_email('ana@example.com')['id'], 'u1')
+
+        self.read_model.delete_user('u2')
+        self.assertIsNone(self.read_model.get_user('u2'))
+        self.assertIsNone(self.read_model.get_user_by_email('bia@example.com'))
+        self.assertEqual([u['id'] for u in self.read_model.get_users()], ['u1'])
+
+    def test_returned_documents_are_copies(self):
+        self.read_model.save_item({'id': 'i1', 'title': 'A', 'user_id': 'u1'})
+        self.read_model.get_item('i1')['title'] = 'Alterado fora do Read Model'
+        self.assertEqual(self.read_model.get_item('i1')['title'], 'A')
+
+        self.read_model.save_item({'id': 'i1', 'title': 'B'})
+        self.read_model.delete_item('i2')
+        self.assertEqual(self.read_model.get_item('i1'), {'id': 'i1', 'title': 'B', 'user_id': 'u1'})
+        self.read_model.delete_item('i1')
+        self.assertIsNone(self.read_model.get_item('i1'))
+        self.assertEqual(self.read_model.get_items(), [])
+
+    def test_indexes_rebuilt_on_open_and_first_duplicate_wins(self):
+        self.read_model.save_user({'id': 'u1', 'username': 'ana', 'email': 'ana@example.com'})
+        self.read_model.save_user({'id': 'u2', 'username': 'ana', 'email': 'outra@example.com'})
+        self.read_model.save_item({'id': 'i1', 'title': 'A'})
+        self.read_model.db.close()
+
+        reopened = ReadModel(self.path)
+        self.assertEqual(reopened.get_user_by_username('ana')['id'], 'u1')
+        self.assertEqual(reopened.get_item('i1')['title'], 'A')
+        # Removido o primeiro, o índice passa a apontar para o outro usuário com o mesmo username
+        reopened.delete_user('u1')
+        self.assertEqual(reopened.get_user_by_username('ana')['id'], 'u2')
+        reopened.db.close()
+
+    def test_in_memory_read_model_has_indexes(self):
+        read_model = InMemoryReadModel()
+        read_model.save_user({'id': 'u1', 'username': 'ana', 'email': 'ana@example.com'})
+        self.assertEqual(read_model.get_user_by_email('ana@example.com')['username'], 'ana')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from event_store import ConcurrencyError
+from event_store_verify import verify
+from sharded_event_store import ShardedEventStore
+
+class TestShardedEventStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'events.db')
+        self.store = ShardedEventStore(self.db_path, shards=3)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_aggregates_stay_on_one_shard(self):
+        for i in range(30):
+            self.store.save_event(f'agg-{i % 6}', 'ITEM_UPDATED', {'i': i})
+
+        self.assertGreater(len({self.store.shard_index(f'agg-{i}') for i in range(6)}), 1)
+        events = self.store.get_events('agg-4')
+        self.assertEqual([e['version'] for e in events], [1, 2, 3, 4, 5])
+        self.assertEqual([e['data']['i'] for e in events], [4, 10, 16, 22, 28])
+        with self.assertRaises(ConcurrencyError):
+            self.store.save_event('agg-4', 'ITEM_UPDATED', {}, expected_version=2)
+
+    def test_global_reads_merge_shards(self):
+        saved = self.store.save_events([(f'agg-{i}', 'ITEM_CREATED', {'i': i}) for i in range(20)])
+        self.assertEqual([e['data']['i'] for e in saved], list(range(20)))
+        positions = sorted(e['position'] for e in saved)
+        self.assertEqual(len(set(positions)), 20)
+
+        self.assertEqual([e['position'] for e in self.store.iter_events()], positions)
+        self.assertEqual([e['position'] for e in self.store.iter_events(from_position=positions[7])],
+                         positions[7:])
+
+        paged, cursor = [], None
+        while True:
+            events, cursor = self.store.read_all(after_position=cursor, limit=6)
+            paged.extend(e['position'] for e in events)
+            if cursor is None:
+                break
+        self.assertEqual(paged, positions)
+
+        paged, cursor = [], None
+        while True:
+            events, cursor = self.store.read_all_backwards(before_position=cursor, limit=7)
+            paged.extend(e['position'] for e in events)
+            if cursor is None:
+                break
+        self.assertEqual(paged, positions[::-1])
+
+        by_time = self.store.get_events_by_type('ITEM_CREATED', limit=5)
+        earliest = sorted(saved, key=lambda e: (e['timestamp_us'], e['position']))[:5]
+        self.assertEqual([e['id'] for e in by_time], [e['id'] for e in earliest])
+
+    def test_quiet_shard_event_after_cursor_is_not_missed(self):
+        quiet = next(f'agg-{i}' for i in range(1, 100)
+                     if self.store.shard_index(f'agg-{i}') != self.store.shard_index('agg-0'))
+        self.store.save_event(quiet, 'ITEM_CREATED', {})
+        for i in range(10):
+            self.store.save_event('agg-0', 'ITEM_UPDATED', {'i': i})
+
+        # O leitor já passou do fim do shard quieto
+        events, _ = self.store.read_all(None, limit=100)
+        cursor = events[-1]['position']
+        event = self.store.save_event(quiet, 'ITEM_UPDATED', {})
+
+        self.assertGreater(event['position'], cursor)
+        self.assertEqual([e['id'] for e in self.store.read_all(cursor)[0]], [event['id']])
+        self.assertEqual([e['id'] for e in self.store.iter_events(from_position=cursor + 1)], [event['id']])
+
+    def test_reads_wait_for_transactions_in_progress(self):
+        first = self.store.save_event('agg-1', 'ITEM_CREATED', {})
+        shard = self.store._shard_for('agg-2')
+        assign = shard.position_sequence
+        assigned, release = threading.Event(), threading.Event()
+
+        def slow_position(cursor):
+            # Transação do shard com position já atribuída, ainda sem commit
+            position = assign(cursor)
+            assigned.set()
+            release.wait(5)
+            return position
+
+        shard.position_sequence = slow_position
+        pending = []
+        writer = threading.Thread(target=lambda: pending.append(self.store.save_event('agg-2', 'ITEM_CREATED', {})))
+        writer.start()
+        self.assertTrue(assigned.wait(5))
+        shard.position_sequence = assign
+        other = next(f'agg-{i}' for i in range(3, 100)
+                     if self.store.shard_index(f'agg-{i}') != self.store.shard_index('agg-2'))
+        later = self.store.save_event(other, 'ITEM_CREATED', {})
+
+        pages = []
+        reader = threading.Thread(target=lambda: pages.append(self.store.read_all()[0]))
+        reader.start()
+        reader.join(0.2)
+        self.assertTrue(reader.is_alive())
+
+        release.set()
+        writer.join()
+        reader.join()
+        self.assertLess(pending[0]['position'], later['position'])
+        self.assertEqual([e['id'] for e in pages[0]], [first['id'], pending[0]['id'], later['id']])
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requer os.fork')
+    def test_forked_child_uses_its_own_connections(self):
+        first = self.store.save_event('agg-1', 'ITEM_CREATED', {})
+        self.assertGreaterEqual(self.store.visible_position(), first['position'])
+
+        pid = os.fork()
+        if pid == 0:
+            # Processo filho (como um worker do gunicorn --preload): grava e lê pelo mesmo objeto
+            try:
+                event = self.store.save_event('agg-2', 'ITEM_CREATED', {})
+                ok = [e['id'] for e in self.store.read_all()[0]][-1] == event['id']
+            except Exception:
+                ok = False
+            os._exit(0 if ok else 1)
+
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertEqual(len(self.store.get_events()), 2)
+        self.store.save_event('agg-3', 'ITEM_CREATED', {})
+        self.assertEqual(len(self.store.get_events()), 3)
+
+    def test_verify_shard_files(self):
+        for i in range(30):
+            self.store.save_event(f'agg-{i % 7}', 'ITEM_UPDATED', {'i': i})
+
+        for shard in self.store.shards:
+            count = len(shard.get_events())
+            report = verify(shard.db_path, workers=1, block_size=4)
+            self.assertTrue(report['ok'])
+            self.assertEqual(report['events'], count)
+            # Positions esparsas: os blocos seguem a quantidade de eventos
+            self.assertEqual(report['blocks'], -(-count // 4))
+
+    def test_parallel_writers_and_shard_count_check(self):
+        def write(n):
+            for i in range(20):
+                self.store.save_event(f'writer-{n}', 'ITEM_UPDATED', {'i': i})
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.store.get_events()), 120)
+        self.store.close()
+
+        with self.assertRaises(ValueError):
+            ShardedEventStore(self.db_path, shards=2)
+        self.store = ShardedEventStore(self.db_path, shards=3)
+        self.assertEqual(len(self.store.get_events('writer-5')), 20)
+
+if __name__ == '__main__':
+    unittest.main()
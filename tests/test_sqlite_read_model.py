@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+from event_handlers import EventHandlers
+from read_model import ReadModel
+from sqlite_read_model import SQLiteReadModel
+
+class TestSQLiteReadModel(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.read_model = SQLiteReadModel(os.path.join(self.tmp_dir, 'readmodel.db'))
+
+    def tearDown(self):
+        self.read_model.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_user_lookups_and_partial_update(self):
+        self.read_model.save_user({'id': 'u1', 'username': 'ana', 'email': 'ana@example.com', 'name': 'Ana'})
+        self.read_model.save_user({'id': 'u2', 'username': None, 'email': 'bia@example.com', 'google_id': 'g2'})
+        self.read_model.save_user({'id': 'u3', 'username': None, 'email': 'caio@example.com', 'google_id': 'g3'})
+
+        # Como no TinyDB, atualizar um usuário mescla os campos recebidos
+        self.read_model.save_user({'id': 'u1', 'name': 'Ana Maria'})
+        self.assertEqual(self.read_model.get_user('u1'),
+                         {'id': 'u1', 'username': 'ana', 'email': 'ana@example.com', 'name': 'Ana Maria'})
+        self.assertEqual(self.read_model.get_user_by_username('ana')['id'], 'u1')
+        self.assertEqual(self.read_model.get_user_by_email('bia@example.com')['id'], 'u2')
+        self.assertIsNone(self.read_model.get_user_by_username('bia'))
+        self.assertEqual([u['id'] for u in self.read_model.get_users()], ['u1', 'u2', 'u3'])
+
+        self.read_model.delete_user('u2')
+        self.assertIsNone(self.read_model.get_user('u2'))
+
+    def test_duplicate_username_or_email_keeps_first_user(self):
+        self.read_model.save_user({'id': 'u1', 'username': 'ana', 'email': 'ana@example.com'})
+        self.assertEqual(self.read_model.save_user({'id': 'u2', 'username': 'ana', 'email': 'outra@example.com'}),
+                         ['username'])
+        self.assertEqual(self.read_model.save_user({'id': 'u3', 'username': 'bia', 'email': 'ana@example.com'}),
+                         ['email'])
+
+        # O usuário é gravado pelo id, mas as buscas continuam no primeiro
+        self.assertEqual(self.read_model.get_user('u2')['username'], 'ana')
+        self.assertEqual(self.read_model.get_user_by_username('ana')['id'], 'u1')
+        self.assertEqual(self.read_model.get_user_by_email('ana@example.com')['id'], 'u1')
+        self.assertEqual(self.read_model.get_user_by_username('bia')['id'], 'u3')
+        self.assertEqual(len(self.read_model.get_users()), 3)
+
+    def test_projection_tolerates_duplicate_username(self):
+        handlers = EventHandlers(self.read_model)
+        handlers.handle_user_created({'id': 'e1', 'event_type': 'USER_CREATED', 'aggregate_id': 'u1',
+                                      'data': {'username': 'ana', 'email': 'ana@example.com'}})
+        handlers.handle_user_created({'id': 'e2', 'event_type': 'USER_CREATED', 'aggregate_id': 'u2',
+                                      'data': {'username': 'ana', 'email': 'bia@example.com'}})
+        handlers.handle_user_updated({'id': 'e3', 'event_type': 'USER_UPDATED', 'aggregate_id': 'u2',
+                                      'data': {'name': 'Bia'}})
+        self.assertEqual(self.read_model.get_user('u2')['name'], 'Bia')
+        self.assertEqual(self.read_model.get_user_by_email('bia@example.com')['id'], 'u2')
+        self.assertEqual(self.read_model.get_user_by_username('ana')['id'], 'u1')
+
+    def test_items_and_roles(self):
+        for i in range(4):
+            self.read_model.save_item({'id': f'i{i}', 'title': f'Item {i}', 'user_id': f'u{i % 2}'})
+        self.read_model.save_item({'id': 'i0', 'title': 'Alterado'})
+        self.read_model.delete_item('i2')
+
+        self.assertEqual(self.read_model.get_item('i0'), {'id': 'i0', 'title': 'Alterado', 'user_id': 'u0'})
+        self.assertEqual([i['id'] for i in self.read_model.get_items('u0')], ['i0'])
+        self.assertEqual([i['id'] for i in self.read_model.get_items()], ['i0', 'i1', 'i3'])
+
+        self.read_model.save_role({'id': 'admin', 'name': 'Administrador'})
+        self.read_model.save_role({'id': 'admin', 'permissions': ['all']})
+        self.assertEqual(self.read_model.get_role('admin'),
+                         {'id': 'admin', 'name': 'Administrador', 'permissions': ['all']})
+        self.assertEqual(len(self.read_model.get_roles()), 1)
+
+    def test_migrates_tinydb_json_on_first_open(self):
+        json_path = os.path.join(self.tmp_dir, 'readmodel.json')
+        tinydb = ReadModel(json_path)
+        tinydb.save_role({'id': 'user', 'name': 'Usuário'})
+        tinydb.save_user({'id': 'u1', 'username': 'ana', 'email': 'ana@example.com'})
+        tinydb.save_user({'id': 'u2', 'username': 'bia', 'email': 'bia@example.com'})
+        # Duplicata aceita pelo TinyDB: ignorada na migração
+        tinydb.save_user({'id': 'u3', 'username': 'ana', 'email': 'ana2@example.com'})
+        tinydb.save_item({'id': 'i1', 'title': 'Item', 'user_id': 'u1'})
+        tinydb.db.close()
+
+        db_path = os.path.join(self.tmp_dir, 'migrated.db')
+        migrated = SQLiteReadModel(db_path, migrate_from=json_path)
+        self.assertEqual([u['id'] for u in migrated.get_users()], ['u1', 'u2'])
+        self.assertEqual(migrated.get_items('u1'), [{'id': 'i1', 'title': 'Item', 'user_id': 'u1'}])
+        self.assertEqual(migrated.get_role('user')['name'], 'Usuário')
+        migrated.delete_user('u2')
+        migrated.close()
+
+        # Um banco já populado não é migrado de novo
+        reopened = SQLiteReadModel(db_path, migrate_from=json_path)
+        self.assertEqual([u['id'] for u in reopened.get_users()], ['u1'])
+        reopened.close()
+
+if __name__ == '__main__':
+    unittest.main()
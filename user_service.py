@@ -1,50 +1,66 @@
 import uuid
 
+# Namespace dos ids derivados de chaves de idempotência (ver create_user)
+USER_ID_NAMESPACE = uuid.UUID('91ba44b1-edf2-4643-bfcd-16e683096696')
+
 class UserService:
     def __init__(self, event_store, event_bus, read_model):
         self.event_store = event_store
         self.event_bus = event_bus
         self.read_model = read_model
         
-    def create_user(self, user_data):
-        """Cria um novo usuário"""
-        user_id = str(uuid.uuid4())
+    def create_user(self, user_data, idempotency_key=None):
+        """Cria um novo usuário
+
+        Com idempotency_key, o id é derivado da chave, como em ItemService.create_item.
+        """
+        if idempotency_key is None:
+            user_id, expected_version = str(uuid.uuid4()), None
+        else:
+            user_id, expected_version = str(uuid.uuid5(USER_ID_NAMESPACE, idempotency_key)), 0
         
         # Criar e salvar o evento
         event = self.event_store.save_event(
             aggregate_id=user_id,
             event_type='USER_CREATED',
-            data=user_data
+            data=user_data,
+            expected_version=expected_version,
+            idempotency_key=idempotency_key
         )
         
-        # Publicar o evento
-        self.event_bus.publish(event)
+        # Publicar o evento (uma retentativa com a mesma chave já foi publicada)
+        if not event.get('replayed'):
+            self.event_bus.publish(event)
         
-        return user_id
+        return event['aggregate_id']
         
-    def update_user(self, user_id, user_data):
+    def update_user(self, user_id, user_data, idempotency_key=None):
         """Atualiza um usuário existente"""
         # Criar e salvar o evento
         event = self.event_store.save_event(
             aggregate_id=user_id,
             event_type='USER_UPDATED',
-            data=user_data
+            data=user_data,
+            idempotency_key=idempotency_key
         )
         
-        # Publicar o evento
-        self.event_bus.publish(event)
+        # Publicar o evento (uma retentativa com a mesma chave já foi publicada)
+        if not event.get('replayed'):
+            self.event_bus.publish(event)
         
-    def delete_user(self, user_id):
+    def delete_user(self, user_id, idempotency_key=None):
         """Remove um usuário"""
         # Criar e salvar o evento
         event = self.event_store.save_event(
             aggregate_id=user_id,
             event_type='USER_DELETED',
-            data={}
+            data={},
+            idempotency_key=idempotency_key
         )
         
-        # Publicar o evento
-        self.event_bus.publish(event)
+        # Publicar o evento (uma retentativa com a mesma chave já foi publicada)
+        if not event.get('replayed'):
+            self.event_bus.publish(event)
         
     def get_user(self, user_id):
         """Obtém um usuário pelo ID (do modelo de leitura)"""